@@ -0,0 +1,215 @@
+# async_pipeline.py
+"""
+非同步選稿流程
+抓取 → 解析 → 分群 → GPT → 寫入 → 驗證，各階段以有界佇列串接：
+某個日期還在下載時，已下載完成的日期就先進入彙整；寫入下一批資料時，同時驗證上一批。
+網路等待全部使用非同步客戶端（httpx、AsyncOpenAI、Supabase AsyncClient）。
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import Metrics, get_metrics
+from rss_fetch import DEFAULT_DEADLINE, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+from feed_sources import HostLimiter, SharedFeeds, fetch_feed_items_async
+from title_dedupe import cluster_titles
+from prompt_budget import parse_pub_date
+from news_store import DEPENDENCY, TABLE, build_rows, bulk_insert_async
+from local_store import get_local_store
+from resilience import call_async, remaining
+
+DEFAULT_QUEUE_SIZE = 4
+# 每批寫入的資料列數；批次之間寫入與驗證同時進行
+DEFAULT_PERSIST_BATCH_SIZE = 5
+
+# 佇列結束標記
+_DONE = object()
+
+SelectFn = Callable[[List[str], Dict[str, int], Dict[str, datetime]], Awaitable[object]]
+
+
+async def create_async_clients():
+    """建立 (httpx.AsyncClient, AsyncOpenAI, Supabase AsyncClient)；使用完畢請呼叫 close_async_clients"""
+    import httpx
+    from openai import AsyncOpenAI
+    from supabase import acreate_client
+
+    connect_timeout, read_timeout = DEFAULT_TIMEOUT
+    http = httpx.AsyncClient(
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        limits=httpx.Limits(max_connections=DEFAULT_POOL_SIZE),
+    )
+    openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0)
+    supabase_client = await acreate_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    return http, openai_client, supabase_client
+
+
+async def close_async_clients(http, openai_client):
+    await http.aclose()
+    await openai_client.close()
+
+
+async def _produce(http, date_str: str, queue: asyncio.Queue, limiter: HostLimiter, shared: SharedFeeds):
+    """下載並增量解析單一日期（所有來源），結果放入佇列"""
+    try:
+        items = await fetch_feed_items_async(http, date_str, limiter=limiter, shared=shared)
+        await queue.put((date_str, items, None))
+    except Exception as e:
+        await queue.put((date_str, None, e))
+
+
+async def _collect(http, target_dates: List[str], queue_size: int, deadline: float, log):
+    """依完成順序彙整各日期的標題；逾時未完成的日期記為錯誤"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    # 同一次執行的所有日期共用主機連線上限，最新內容的來源只抓一次
+    limiter = HostLimiter()
+    shared = SharedFeeds()
+    producers = [asyncio.create_task(_produce(http, date_str, queue, limiter, shared)) for date_str in target_dates]
+
+    results: Dict[str, list] = {}
+    errors: Dict[str, Exception] = {}
+    # 不超過呼叫端的截止時間
+    left = remaining()
+    if left is not None:
+        deadline = max(min(deadline, left), 0)
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + deadline
+    try:
+        while len(results) + len(errors) < len(target_dates):
+            timeout = stop_at - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                date_str, items, error = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if error is not None:
+                errors[date_str] = error
+                log(f"   ⚠️ RSS {date_str} 抓取失敗：{error}")
+            else:
+                results[date_str] = items
+                log(f"   ✅ {date_str} 取得 {len(items)} 則標題")
+    finally:
+        for task in producers:
+            task.cancel()
+        await asyncio.gather(*producers, return_exceptions=True)
+        await shared.aclose()
+
+    for date_str in target_dates:
+        if date_str not in results and date_str not in errors:
+            errors[date_str] = TimeoutError(f"超過 {deadline} 秒仍未完成")
+            log(f"   ⚠️ RSS {date_str} 抓取失敗：{errors[date_str]}")
+    return results, errors
+
+
+async def _persist(supabase_client, rows: List[dict], batch_size: int, queue: asyncio.Queue,
+                   table: str, metrics: Metrics, local_store=None) -> List[dict]:
+    """分批寫入，每批完成後把 ID 交給驗證階段，並更新本地紀錄的同步狀態"""
+    statuses = []
+    try:
+        for start in range(0, len(rows), batch_size):
+            with metrics.span("insert", rows=len(rows[start:start + batch_size])):
+                batch = await bulk_insert_async(supabase_client, rows[start:start + batch_size], table=table)
+            if local_store is not None:
+                local_store.apply_statuses(batch)
+            statuses.extend(batch)
+            ids = [status["id"] for status in batch if status["ok"]]
+            if ids:
+                await queue.put(ids)
+    finally:
+        await queue.put(_DONE)
+    return statuses
+
+
+async def _verify(supabase_client, queue: asyncio.Queue, table: str, log, metrics: Metrics) -> List[dict]:
+    """讀回已寫入的資料列；查詢失敗只記錄，不影響寫入"""
+    records = []
+    while True:
+        ids = await queue.get()
+        if ids is _DONE:
+            return records
+        try:
+            with metrics.span("verify", rows=len(ids)):
+                res = await call_async(DEPENDENCY, lambda: supabase_client.table(table).select("*").in_("id", ids).execute())
+            records.extend(res.data or [])
+        except Exception as e:
+            log(f"   ⚠️ 驗證查詢失敗：{e}")
+
+
+async def run_pipeline(
+    target_dates: List[str],
+    http,
+    supabase_client,
+    select: SelectFn,
+    save_date: Optional[str] = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    persist_batch_size: int = DEFAULT_PERSIST_BATCH_SIZE,
+    deadline: float = DEFAULT_DEADLINE,
+    table: str = TABLE,
+    log: Callable[[str], None] = print,
+    metrics: Optional[Metrics] = None,
+    prompts: Optional[List[dict]] = None,
+    source: str = "async",
+) -> dict:
+    """
+    執行完整流程並回傳各階段結果：
+    {"titles", "unique_titles", "cluster_sizes", "errors", "selection", "statuses", "records"}。
+    select 為非同步選稿函數 select(unique_titles, cluster_sizes, published_at)；
+    save_date 預設為最後一個目標日期。沒有任何標題時 selection 為 None，不寫入資料庫。
+    寫入 Supabase 前先記錄到本地儲存（含原始標題與 select 期間加入 prompts 的提示詞）。
+    """
+    save_date = save_date or target_dates[-1]
+    metrics = metrics or get_metrics()
+
+    log(f"📡 非同步抓取 RSS：{len(target_dates)} 個日期")
+    with metrics.span("fetch", dates=len(target_dates)):
+        rss_results, rss_errors = await _collect(http, target_dates, queue_size, deadline, log)
+
+    all_titles: List[str] = []
+    published_at: Dict[str, datetime] = {}
+    for date_str in target_dates:
+        for item in rss_results.get(date_str, []):
+            all_titles.append(item["title"])
+            published_at.setdefault(item["title"], parse_pub_date(item["pubDate"]))
+
+    result = {
+        "titles": all_titles,
+        "unique_titles": [],
+        "cluster_sizes": {},
+        "errors": rss_errors,
+        "selection": None,
+        "statuses": [],
+        "records": [],
+    }
+    if not all_titles:
+        return result
+
+    # 分群是純 CPU 運算，放到執行緒中避免阻塞事件迴圈
+    with metrics.span("dedupe", titles=len(all_titles)):
+        clusters = await asyncio.to_thread(cluster_titles, all_titles)
+    unique_titles = [c.representative for c in clusters]
+    cluster_sizes = {c.representative: c.size for c in clusters}
+    result["unique_titles"] = unique_titles
+    result["cluster_sizes"] = cluster_sizes
+    log(f"🧠 相似標題合併後共 {len(unique_titles)} 則（原始 {len(all_titles)} 則）")
+
+    with metrics.span("llm", titles=len(unique_titles)):
+        selection = await select(unique_titles, cluster_sizes, published_at)
+    result["selection"] = selection
+    log(f"✅ GPT 分析完成，選出 {len(selection.selections)} 則新聞")
+
+    rows = build_rows(save_date, selection)
+    local_store = get_local_store()
+    if local_store is not None:
+        local_store.record_run(save_date, rows, all_titles, prompts, source=source)
+    log(f"🚚 寫入 {len(rows)} 筆（每批 {persist_batch_size} 筆，寫入與驗證同時進行）")
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    statuses, records = await asyncio.gather(
+        _persist(supabase_client, rows, max(1, persist_batch_size), queue, table, metrics, local_store),
+        _verify(supabase_client, queue, table, log, metrics),
+    )
+    result["statuses"] = statuses
+    result["records"] = records
+    return result
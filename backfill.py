@@ -0,0 +1,237 @@
+# backfill.py
+"""
+歷史資料回補
+指定日期範圍，以工作池平行執行每一天的 抓取 → 解析 → 選稿，結果先寫入本地紀錄；
+每累積 --sync-every 天由主執行緒同步一次到 Supabase（單一寫入者，不會重複送出或誤算其他日期的資料列），
+同步成功的日期立即寫入檢查點，中斷（Ctrl-C）時取消尚未開始的日期、同步已選好的日期後結束，
+重新執行會略過已完成的日期。OpenAI 請求共用同一個速率限制器；已選好但未同步的日期重新執行時會命中 LLM 快取。
+
+用法：
+    python backfill.py --start 20240101 --end 20240331 --workers 4 --rpm 60
+"""
+
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from gpt import (
+    TOURNAMENT_THRESHOLD,
+    call_gpt_format_selection,
+    call_gpt_tournament_selection,
+    get_openai_client,
+    get_supabase_client,
+)
+from local_store import record_rows, sync_rows
+from metrics import export_from_env, get_metrics
+from news_store import build_rows
+from prompt_budget import parse_pub_date
+from rate_limit import RateLimitedClient, RateLimiter
+from feed_sources import fetch_feed_items
+from title_dedupe import cluster_titles
+
+DEFAULT_WORKERS = 4
+DEFAULT_RPM = 60
+# 每累積幾天同步一次並寫入檢查點
+DEFAULT_SYNC_EVERY = 10
+DEFAULT_CHECKPOINT = Path(__file__).resolve().parent / ".backfill_checkpoint.json"
+
+
+def date_range(start: str, end: str) -> List[str]:
+    """start 到 end（含）之間的所有日期，格式 YYYYMMDD"""
+    first = datetime.strptime(start, "%Y%m%d")
+    last = datetime.strptime(end, "%Y%m%d")
+    if last < first:
+        raise ValueError(f"結束日期 {end} 早於開始日期 {start}")
+    return [(first + timedelta(days=i)).strftime("%Y%m%d") for i in range((last - first).days + 1)]
+
+
+class Checkpoint:
+    """記錄已完成與失敗的日期（JSON 檔，每次更新都整檔原子寫入）"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.done: Dict[str, dict] = {}
+        self.failed: Dict[str, str] = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.done = data.get("done", {})
+            self.failed = data.get("failed", {})
+
+    def is_done(self, date_str: str) -> bool:
+        with self._lock:
+            return date_str in self.done
+
+    def mark_done(self, date_str: str, info: dict):
+        with self._lock:
+            self.done[date_str] = {**info, "at": datetime.now(timezone.utc).isoformat()}
+            self.failed.pop(date_str, None)
+            self._save()
+
+    def mark_failed(self, date_str: str, error: str):
+        with self._lock:
+            self.failed[date_str] = error
+            self._save()
+
+    def _save(self):
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(
+            json.dumps({"done": self.done, "failed": self.failed}, ensure_ascii=False, indent=2, sort_keys=True),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+
+def backfill_day(date_str: str, openai_client) -> Tuple[dict, List[dict]]:
+    """處理單一日期（寫入本地、尚未同步），回傳 (摘要, 待同步的資料列)"""
+    metrics = get_metrics()
+    with metrics.span("fetch", date=date_str):
+        items = fetch_feed_items(date_str)
+    titles = [item["title"] for item in items]
+    if not titles:
+        raise Exception("未取得任何新聞標題")
+    published_at = {}
+    for item in items:
+        published_at.setdefault(item["title"], parse_pub_date(item["pubDate"]))
+
+    with metrics.span("dedupe", date=date_str, titles=len(titles)):
+        clusters = cluster_titles(titles)
+    unique_titles = [c.representative for c in clusters]
+    cluster_sizes = {c.representative: c.size for c in clusters}
+
+    prompt_log: List[dict] = []
+    with metrics.span("llm", date=date_str, titles=len(unique_titles)):
+        if len(unique_titles) > TOURNAMENT_THRESHOLD:
+            selection = call_gpt_tournament_selection(unique_titles, cluster_sizes, published_at, openai_client,
+                                                      prompt_log)
+        else:
+            selection = call_gpt_format_selection(unique_titles, cluster_sizes, published_at, openai_client,
+                                                  prompt_log)
+
+    rows = build_rows(date_str, selection)
+    record_rows(date_str, rows, titles, prompt_log, source="backfill", model="gpt-4o-mini")
+    return {"titles": len(titles), "unique_titles": len(unique_titles)}, rows
+
+
+def sync_days(supabase_client, selected: Dict[str, Tuple[dict, List[dict]]]) -> Dict[str, List[dict]]:
+    """一次同步所有日期的資料列，回傳 日期 → 該日各列狀態"""
+    rows = [row for _, day_rows in selected.values() for row in day_rows]
+    if not rows:
+        return {}
+    with get_metrics().span("insert", dates=len(selected), rows=len(rows)):
+        statuses = sync_rows(supabase_client, rows)
+    by_date: Dict[str, List[dict]] = {date_str: [] for date_str in selected}
+    for row, status in zip(rows, statuses):
+        by_date[row["date"]].append(status)
+    return by_date
+
+
+def _commit_days(supabase_client, selected: Dict[str, Tuple[dict, List[dict]]], checkpoint: Checkpoint,
+                 done: Dict[str, dict], failed: Dict[str, str]):
+    """同步一批已選好的日期，依各日期的結果寫入檢查點並清空 selected"""
+    if not selected:
+        return
+    print(f"💾 同步 {len(selected)} 天的選稿結果…")
+    for date_str, statuses in sorted(sync_days(supabase_client, selected).items()):
+        errors = [status for status in statuses if not status["ok"]]
+        if errors:
+            # 任何一列儲存失敗都視為失敗，下次重新執行
+            failed[date_str] = f"{len(errors)} 筆儲存失敗：{errors[0]['error']}"
+            checkpoint.mark_failed(date_str, failed[date_str])
+            print(f"❌ {date_str} 失敗：{failed[date_str]}")
+            continue
+        info = {
+            **selected[date_str][0],
+            "saved": sum(1 for status in statuses if status["ok"] and not status["existed"]),
+            "existed": sum(1 for status in statuses if status["existed"]),
+        }
+        done[date_str] = info
+        checkpoint.mark_done(date_str, info)
+        print(f"✅ {date_str}：{info['unique_titles']}/{info['titles']} 則標題，"
+              f"新增 {info['saved']} 筆，已存在 {info['existed']} 筆")
+    selected.clear()
+
+
+def run_backfill(dates: List[str], workers: int = DEFAULT_WORKERS, rpm: float = DEFAULT_RPM,
+                 checkpoint: Optional[Checkpoint] = None, force: bool = False,
+                 openai_client=None, supabase_client=None,
+                 sync_every: int = DEFAULT_SYNC_EVERY) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """平行回補多個日期，回傳 (完成的日期摘要, 失敗原因)"""
+    checkpoint = checkpoint or Checkpoint(DEFAULT_CHECKPOINT)
+    pending = [d for d in dates if force or not checkpoint.is_done(d)]
+    skipped = len(dates) - len(pending)
+    print(f"📋 共 {len(dates)} 天，略過已完成 {skipped} 天，待處理 {len(pending)} 天（{workers} 個工作者，每分鐘最多 {rpm:g} 次 OpenAI 請求）")
+
+    limiter = RateLimiter(rpm, burst=max(1, workers))
+    openai_client = RateLimitedClient(openai_client or get_openai_client(), limiter)
+    supabase_client = supabase_client or get_supabase_client()
+
+    done: Dict[str, dict] = {}
+    failed: Dict[str, str] = {}
+    # 已選好、尚未同步的日期；只有主執行緒同步，每一天的計數只來自自己的資料列
+    selected: Dict[str, Tuple[dict, List[dict]]] = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {executor.submit(backfill_day, d, openai_client): d for d in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            date_str = futures[future]
+            try:
+                selected[date_str] = future.result()
+            except Exception as e:
+                failed[date_str] = str(e)
+                checkpoint.mark_failed(date_str, str(e))
+                print(f"❌ [{i}/{len(pending)}] {date_str} 失敗：{e}")
+                continue
+            print(f"🧠 [{i}/{len(pending)}] {date_str} 選稿完成")
+            if len(selected) >= max(1, sync_every):
+                _commit_days(supabase_client, selected, checkpoint, done, failed)
+    except KeyboardInterrupt:
+        # 不再開始新的日期；已選好的日期先同步並寫入檢查點，重新執行時從未完成的日期繼續
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"🛑 已中斷，同步已選好的 {len(selected)} 天後結束")
+        _commit_days(supabase_client, selected, checkpoint, done, failed)
+        raise
+    except BaseException:
+        # 同步失敗等非預期錯誤：已寫入檢查點的日期保留，其餘日期不再開始
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    _commit_days(supabase_client, selected, checkpoint, done, failed)
+    return done, failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="回補指定日期範圍的 selected_news")
+    parser.add_argument("--start", required=True, help="開始日期 YYYYMMDD")
+    parser.add_argument("--end", help="結束日期 YYYYMMDD（含，預設與開始日期相同）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="同時處理的天數")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_RPM, help="每分鐘最多 OpenAI 請求數")
+    parser.add_argument("--checkpoint", default=str(DEFAULT_CHECKPOINT), help="檢查點檔案")
+    parser.add_argument("--force", action="store_true", help="忽略檢查點，重新處理所有日期")
+    parser.add_argument("--sync-every", type=int, default=DEFAULT_SYNC_EVERY,
+                        help="每累積幾天同步一次並寫入檢查點")
+    args = parser.parse_args(argv)
+
+    metrics = get_metrics()
+    metrics.reset()
+    try:
+        dates = date_range(args.start, args.end or args.start)
+        _, failed = run_backfill(dates, args.workers, args.rpm, Checkpoint(args.checkpoint), args.force,
+                                 sync_every=args.sync_every)
+    finally:
+        export_from_env(metrics)
+
+    if failed:
+        print(f"⚠️ {len(failed)} 天失敗，重新執行同一指令即可只重試這些日期：{sorted(failed)}")
+        return 1
+    print("🎉 回補完成")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,277 @@
+# batch_select.py
+"""
+OpenAI Batch API 選稿
+大量回補等不急的工作：每天一行 chat completions 請求寫成 JSONL，整批送出後輪詢結果，
+再以 HeadlineSelection 驗證並寫入本地紀錄與 Supabase。費用較低，且不必為每個請求保持程序執行。
+送出後的批次資訊記錄在 manifest 檔，可以先結束程式，之後再用 collect 取回結果。
+
+用法：
+    python batch_select.py run --start 20240101 --end 20240331       # 送出、等待並寫入
+    python batch_select.py submit --start 20240101 --end 20240331    # 只送出，印出 manifest 路徑
+    python batch_select.py status batches/selection_20240101_20240331.manifest.json
+    python batch_select.py collect batches/selection_20240101_20240331.manifest.json
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backfill import date_range
+from gpt import build_selection_messages, get_openai_client, get_supabase_client, parse_selection
+from llm_cache import LLMCache, get_llm_cache
+from local_store import save_rows
+from news_models import selection_response_format
+from news_store import build_rows
+from prompt_budget import parse_pub_date
+from resilience import SINGLE_ATTEMPT, call
+from feed_sources import fetch_feed_items
+from title_dedupe import cluster_titles
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_BATCH_DIR = ROOT / "batches"
+ENDPOINT = "/v1/chat/completions"
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.3
+RESPONSE_FORMAT = selection_response_format()
+DEFAULT_POLL_INTERVAL = 30
+DEPENDENCY = "openai"
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# 專案根目錄的 requests.jsonl 是其他用途的檔案，批次輸入一律寫在 batches/ 底下
+_RESERVED_PATHS = {ROOT / "requests.jsonl"}
+
+
+def custom_id(date_str: str) -> str:
+    return f"selection-{date_str}"
+
+
+def prepare_day(date_str: str) -> Optional[dict]:
+    """抓取並分群單一日期，回傳批次請求與寫入本地紀錄所需的資料；沒有標題時回傳 None"""
+    items = fetch_feed_items(date_str)
+    titles = [item["title"] for item in items]
+    if not titles:
+        return None
+    published_at = {}
+    for item in items:
+        published_at.setdefault(item["title"], parse_pub_date(item["pubDate"]))
+    clusters = cluster_titles(titles)
+    unique_titles = [c.representative for c in clusters]
+    cluster_sizes = {c.representative: c.size for c in clusters}
+    # 批次模式一律單次選稿：提示詞已依 token 預算挑選標題，不需要淘汰賽
+    messages, limited_titles = build_selection_messages(unique_titles, cluster_sizes, published_at)
+    return {
+        "date": date_str,
+        "titles": titles,
+        "limited_titles": limited_titles,
+        "request": {
+            "custom_id": custom_id(date_str),
+            "method": "POST",
+            "url": ENDPOINT,
+            "body": {
+                "model": MODEL,
+                "messages": messages,
+                "temperature": TEMPERATURE,
+                "response_format": RESPONSE_FORMAT,
+            },
+        },
+    }
+
+
+def _prepare_or_error(date_str: str) -> Tuple[Optional[dict], Optional[str]]:
+    """prepare_day 的錯誤只影響該日期：回傳 (請求資料, None) 或 (None, 錯誤訊息)"""
+    try:
+        return prepare_day(date_str), None
+    except Exception as e:
+        return None, f"準備失敗：{e}"
+
+
+def write_batch_file(path: Path, requests: List[dict]) -> Path:
+    """每行一個請求的 JSONL（OpenAI Batch API 格式）"""
+    path = Path(path).resolve()
+    if path in _RESERVED_PATHS:
+        raise ValueError(f"不可覆寫 {path}，請改用 batches/ 目錄")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return path
+
+
+def submit(dates: List[str], client=None, batch_dir: Path = DEFAULT_BATCH_DIR, workers: int = 4) -> Path:
+    """
+    準備所有日期的請求、上傳並建立批次，回傳 manifest 路徑。
+    單一日期抓取或準備失敗時記錄在 manifest 的 failed，其餘日期照常送出。
+    """
+    client = client or get_openai_client()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        prepared = list(executor.map(_prepare_or_error, dates))
+    days = [day for day, _ in prepared if day is not None]
+    skipped = [d for d, (day, error) in zip(dates, prepared) if day is None and error is None]
+    prepare_failed = {d: error for d, (_, error) in zip(dates, prepared) if error is not None}
+    if skipped:
+        print(f"⚠️ 沒有標題，略過：{skipped}")
+    for date_str, error in prepare_failed.items():
+        print(f"❌ {date_str}：{error}")
+    if not days:
+        raise Exception("沒有任何日期可送出")
+
+    name = f"selection_{dates[0]}_{dates[-1]}"
+    input_path = write_batch_file(Path(batch_dir) / f"{name}.jsonl", [day["request"] for day in days])
+    input_file = call(DEPENDENCY, lambda: client.files.create(file=input_path, purpose="batch"))
+    # 重送可能建立兩個批次（重複計費），不自動重試
+    batch = call(DEPENDENCY, client.batches.create, policy=SINGLE_ATTEMPT,
+                 input_file_id=input_file.id,
+                 endpoint=ENDPOINT,
+                 completion_window="24h",
+                 metadata={"job": "auto_pick_news", "range": f"{dates[0]}-{dates[-1]}"})
+    print(f"📤 已送出批次 {batch.id}：{len(days)} 天（{input_path}）")
+
+    manifest_path = Path(batch_dir) / f"{name}.manifest.json"
+    manifest = {
+        "batch_id": batch.id,
+        "input_file": str(input_path),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "days": {
+            day["date"]: {
+                "titles": day["titles"],
+                "limited_titles": day["limited_titles"],
+                "messages": day["request"]["body"]["messages"],
+            }
+            for day in days
+        },
+        "failed": prepare_failed,
+    }
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    return manifest_path
+
+
+def wait_for_batch(batch_id: str, client=None, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                   timeout: Optional[float] = None):
+    """輪詢直到批次結束；間隔從 1 秒開始倍增到 poll_interval"""
+    client = client or get_openai_client()
+    started = time.monotonic()
+    delay = min(1.0, poll_interval)
+    while True:
+        batch = call(DEPENDENCY, client.batches.retrieve, batch_id)
+        if batch.status in FINAL_STATUSES:
+            return batch
+        counts = batch.request_counts
+        progress = f"{counts.completed}/{counts.total}" if counts else "?"
+        print(f"⏳ 批次 {batch_id}：{batch.status}（{progress}）")
+        if timeout is not None and time.monotonic() - started + delay > timeout:
+            raise TimeoutError(f"批次 {batch_id} 超過 {timeout} 秒仍未完成（{batch.status}）")
+        time.sleep(delay)
+        delay = min(delay * 2, poll_interval)
+
+
+def _read_jsonl(client, file_id: Optional[str]) -> List[dict]:
+    if not file_id:
+        return []
+    text = call(DEPENDENCY, client.files.content, file_id).text
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def parse_results(lines: List[dict]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """把輸出檔轉成 (custom_id → 回應內容, custom_id → 錯誤)"""
+    contents, errors = {}, {}
+    for line in lines:
+        cid = line.get("custom_id")
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            errors[cid] = json.dumps(line.get("error") or response.get("body"), ensure_ascii=False)
+            continue
+        try:
+            contents[cid] = response["body"]["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            errors[cid] = f"回應格式錯誤：{e}"
+    return contents, errors
+
+
+def collect(manifest_path: Path, client=None, supabase_client=None) -> Tuple[Dict[str, List[dict]], Dict[str, str]]:
+    """取回已完成批次的結果，驗證後寫入；回傳 (每天的儲存狀態, 失敗原因)"""
+    client = client or get_openai_client()
+    manifest = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    batch = call(DEPENDENCY, client.batches.retrieve, manifest["batch_id"])
+    if batch.status != "completed":
+        raise Exception(f"批次 {batch.id} 狀態為 {batch.status}，無法取回結果")
+
+    contents, errors = parse_results(_read_jsonl(client, batch.output_file_id))
+    _, error_lines = parse_results(_read_jsonl(client, batch.error_file_id))
+    errors.update(error_lines)
+
+    supabase_client = supabase_client or get_supabase_client()
+    cache = get_llm_cache()
+    saved: Dict[str, List[dict]] = {}
+    # 送出前就準備失敗的日期不在批次中，一併回報
+    failed: Dict[str, str] = dict(manifest.get("failed", {}))
+    for date_str, day in manifest["days"].items():
+        cid = custom_id(date_str)
+        if cid not in contents:
+            failed[date_str] = errors.get(cid, "批次輸出中沒有此日期")
+            continue
+        content = contents[cid]
+        try:
+            selection = parse_selection(content)
+        except Exception as e:
+            failed[date_str] = f"驗證失敗：{e}"
+            continue
+        if cache is not None:
+            # 與即時呼叫相同的快取鍵，之後用同樣提示詞重跑時直接命中
+            key = LLMCache.make_key(MODEL, day["messages"], TEMPERATURE, RESPONSE_FORMAT, day["limited_titles"])
+            cache.put(key, content, MODEL)
+        prompts = [{"model": MODEL, "messages": day["messages"], "batch_id": batch.id}]
+        statuses = save_rows(supabase_client, date_str, build_rows(date_str, selection), day["titles"], prompts,
+                             source="batch", model=MODEL)
+        saved[date_str] = statuses
+        bad = [status for status in statuses if not status["ok"]]
+        if bad:
+            failed[date_str] = f"{len(bad)} 筆儲存失敗：{bad[0]['error']}"
+    return saved, failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="OpenAI Batch API 選稿")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("run", "submit"):
+        p = sub.add_parser(name)
+        p.add_argument("--start", required=True, help="開始日期 YYYYMMDD")
+        p.add_argument("--end", help="結束日期 YYYYMMDD（含）")
+        p.add_argument("--batch-dir", type=Path, default=DEFAULT_BATCH_DIR)
+        p.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    for name in ("status", "collect"):
+        p = sub.add_parser(name)
+        p.add_argument("manifest", type=Path)
+    args = parser.parse_args(argv)
+
+    client = get_openai_client()
+    if args.command in ("run", "submit"):
+        manifest_path = submit(date_range(args.start, args.end or args.start), client, args.batch_dir)
+        print(f"📝 manifest：{manifest_path}")
+        if args.command == "submit":
+            return 0
+        batch = wait_for_batch(json.loads(manifest_path.read_text(encoding="utf-8"))["batch_id"], client,
+                               args.poll_interval)
+        if batch.status != "completed":
+            print(f"❌ 批次結束狀態：{batch.status}")
+            return 1
+    else:
+        manifest_path = args.manifest
+        if args.command == "status":
+            batch = client.batches.retrieve(json.loads(manifest_path.read_text(encoding="utf-8"))["batch_id"])
+            print(f"📊 {batch.id}：{batch.status}，{batch.request_counts}")
+            return 0
+
+    saved, failed = collect(manifest_path, client)
+    for date_str in sorted(saved):
+        if date_str not in failed:
+            print(f"✅ {date_str} 已儲存 {len(saved[date_str])} 則")
+    for date_str, error in sorted(failed.items()):
+        print(f"❌ {date_str}：{error}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
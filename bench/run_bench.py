@@ -0,0 +1,344 @@
+# bench/run_bench.py
+"""
+離線基準測試
+啟動本地替身服務（RSS、OpenAI、Supabase、ollama），重複執行 gpt.main、Netlify handler
+與 in-complute/main.main，並量測各階段的 p50 / p95 延遲與吞吐量，結果寫入 bench_output.txt。
+
+用法：
+    python bench/run_bench.py --runs 5 --items 2000 --llm-latency 200
+    python bench/run_bench.py --json bench.json                 # 另存結果供比較
+    python bench/run_bench.py --baseline bench.json --tolerance 0.2   # p95 退步超過 20% 時回傳非 0
+"""
+
+import argparse
+import contextlib
+import functools
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.stubs import StubServer, StubState, synthetic_feed  # noqa: E402
+
+DEFAULT_OUTPUT = ROOT / "bench_output.txt"
+ALL_TARGETS = ["stages", "gpt", "handler", "handler_async", "incomplete"]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """線性內插的百分位數"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class Recorder:
+    """記錄每個階段每次執行的耗時（秒）與處理筆數"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.items: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float, items: int = 0):
+        self.samples.setdefault(stage, []).append(seconds)
+        self.items[stage] = self.items.get(stage, 0) + items
+
+    def fail(self, stage: str):
+        self.failures[stage] = self.failures.get(stage, 0) + 1
+
+    def timed(self, stage: str, fn: Callable, count_items: Optional[Callable] = None):
+        """包裝函數並記錄耗時；count_items(args, result) 回傳處理筆數"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            items = count_items(args, result) if count_items else 0
+            self.add(stage, time.perf_counter() - started, items)
+            return result
+        return wrapper
+
+    def summary(self) -> Dict[str, dict]:
+        result = {}
+        for stage, values in self.samples.items():
+            total = sum(values)
+            items = self.items.get(stage, 0)
+            result[stage] = {
+                "runs": len(values),
+                "failures": self.failures.get(stage, 0),
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "mean_ms": total / len(values) * 1000,
+                "throughput": (items if items else len(values)) / total if total else 0.0,
+                "unit": "items/s" if items else "runs/s",
+            }
+        return result
+
+
+@contextlib.contextmanager
+def instrumented(module, recorder: Recorder, prefix: str, stages: Dict[str, Optional[Callable]]):
+    """暫時把模組中的函數換成計時版本，結束後還原"""
+    originals = {name: getattr(module, name) for name in stages if hasattr(module, name)}
+    for name, fn in originals.items():
+        setattr(module, name, recorder.timed(f"{prefix}.{name}", fn, stages[name]))
+    try:
+        yield
+    finally:
+        for name, fn in originals.items():
+            setattr(module, name, fn)
+
+
+def _run_quietly(fn, *args):
+    """執行時隱藏程式本身的輸出，只保留基準測試報告"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+
+def _len_result(args, result):
+    return len(result) if result is not None else 0
+
+
+def _len_first_arg(args, result):
+    return len(args[0]) if args else 0
+
+
+def bench_stages(recorder: Recorder, runs: int, items: int):
+    """不經網路的純運算階段：解析、過濾、分群、預排序、token 預算"""
+    from rss_parse import CHUNK_SIZE, iter_rss_items, filter_items
+    from title_filter import TitleFilter, get_title_filter
+    from title_dedupe import cluster_titles
+    from prompt_budget import pack_titles, parse_pub_date
+    from prerank import rank_titles
+
+    feed = synthetic_feed("20240101", items)
+    chunks = [feed[i:i + CHUNK_SIZE] for i in range(0, len(feed), CHUNK_SIZE)]
+    rules = get_title_filter().rules
+
+    for _ in range(runs):
+        started = time.perf_counter()
+        parsed = list(iter_rss_items(chunks))
+        recorder.add("stage.parse", time.perf_counter() - started, len(parsed))
+
+        title_filter = TitleFilter(rules)
+        started = time.perf_counter()
+        kept = list(filter_items(parsed, title_filter))
+        recorder.add("stage.filter", time.perf_counter() - started, len(parsed))
+
+        titles = [item["title"] for item in kept]
+        started = time.perf_counter()
+        clusters = cluster_titles(titles)
+        recorder.add("stage.cluster", time.perf_counter() - started, len(titles))
+
+        unique = [c.representative for c in clusters]
+        sizes = {c.representative: c.size for c in clusters}
+        published_at = {item["title"]: parse_pub_date(item["pubDate"]) for item in kept}
+        started = time.perf_counter()
+        ranking = rank_titles(unique, sizes)
+        recorder.add("stage.prerank", time.perf_counter() - started, len(unique))
+
+        started = time.perf_counter()
+        _run_quietly(lambda: pack_titles(ranking.top(), cluster_sizes=sizes, published_at=published_at,
+                                         scores=ranking.score_map()))
+        recorder.add("stage.pack", time.perf_counter() - started, len(unique))
+
+
+def bench_gpt(recorder: Recorder, runs: int):
+    import gpt
+
+    stages = {
+        "fetch_feeds_many": lambda args, result: sum(len(items) for items in result[0].values()),
+        "cluster_titles": _len_first_arg,
+        "call_gpt_format_selection": None,
+        "call_gpt_tournament_selection": None,
+        "save_to_supabase": None,
+        "check_database": None,
+    }
+    with instrumented(gpt, recorder, "gpt", stages):
+        for _ in range(runs):
+            started = time.perf_counter()
+            try:
+                _run_quietly(gpt.main)
+            except Exception:
+                recorder.fail("gpt.main")
+            recorder.add("gpt.main", time.perf_counter() - started)
+
+
+def _load_handler_module():
+    sys.path.insert(0, str(ROOT / "netlify" / "functions"))
+    import back
+    back._load_pipeline()
+    return back
+
+
+def bench_handler(recorder: Recorder, runs: int, use_async: bool = False):
+    back = _load_handler_module()
+    name = "handler_async" if use_async else "handler"
+    event = {"httpMethod": "POST", "body": json.dumps({"async": use_async})}
+
+    stages = {
+        "fetch_feed_items": _len_result,
+        "cluster_titles": _len_first_arg,
+        "analyze_with_gpt": None,
+        "save_to_database": None,
+    }
+    with instrumented(back, recorder, name, {} if use_async else stages):
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = _run_quietly(back.handler, event, {})
+            if response["statusCode"] != 200:
+                recorder.fail(f"{name}.total")
+            recorder.add(f"{name}.total", time.perf_counter() - started)
+
+
+def bench_incomplete(recorder: Recorder, runs: int) -> Optional[str]:
+    """
+    in-complute/main.py 透過 HTTP 呼叫替身服務的 ollama API（模型檢查與選稿）。
+    回傳寫入報告的說明：無法載入，或有執行沒有走完整個流程（main 沒有標題時會提早結束而不拋出例外）。
+    """
+    spec = importlib.util.spec_from_file_location("incomplete_main", ROOT / "in-complute" / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    try:
+        _run_quietly(spec.loader.exec_module, module)
+    except Exception as e:
+        return f"無法載入 in-complute/main.py，略過：{e}"
+
+    stages = {
+        "ensure_llama_model": None,
+        "fetch_feeds_many": lambda args, result: sum(len(items) for items in result[0].values()),
+        "analyze_titles": _len_first_arg,
+        "store_to_supabase": None,
+        "send_webhook": None,
+    }
+    problems = []
+    with instrumented(module, recorder, "incomplete", stages):
+        for _ in range(runs):
+            # 走到最後一個階段（送出通知）才算完整的一次執行
+            finished = len(recorder.samples.get("incomplete.send_webhook", []))
+            started = time.perf_counter()
+            try:
+                _run_quietly(module.main)
+            except Exception as e:
+                problems.append(f"{type(e).__name__}: {e}")
+            else:
+                if len(recorder.samples.get("incomplete.send_webhook", [])) == finished:
+                    problems.append("未執行到 send_webhook")
+            recorder.add("incomplete.main", time.perf_counter() - started)
+    for _ in problems:
+        recorder.fail("incomplete.main")
+    if problems:
+        return f"in-complute/main.main 有 {len(problems)}/{runs} 次未完整執行（{problems[-1]}）"
+    return None
+
+
+def format_report(summary: Dict[str, dict], args, notes: List[str], requests: Dict[str, int]) -> str:
+    lines = [
+        f"# 基準測試 {time.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"# runs={args.runs} items/feed={args.items} llm_latency={args.llm_latency}ms "
+        f"db_latency={args.db_latency}ms warm_cache={args.warm_cache}",
+        "",
+        f"{'stage':<45}{'runs':>6}{'fail':>6}{'p50 ms':>11}{'p95 ms':>11}{'mean ms':>11}{'throughput':>14}  unit",
+    ]
+    for stage, row in summary.items():
+        lines.append(
+            f"{stage:<45}{row['runs']:>6}{row['failures']:>6}{row['p50_ms']:>11.1f}{row['p95_ms']:>11.1f}"
+            f"{row['mean_ms']:>11.1f}{row['throughput']:>14.1f}  {row['unit']}"
+        )
+    lines.append("")
+    lines.append(f"替身服務請求數：{json.dumps(requests, ensure_ascii=False, sort_keys=True)}")
+    lines.extend(f"⚠️ {note}" for note in notes)
+    return "\n".join(lines) + "\n"
+
+
+def compare_baseline(summary: Dict[str, dict], baseline_path: Path, tolerance: float) -> List[str]:
+    """回傳 p95 比基準值慢超過 tolerance 的階段"""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    regressions = []
+    for stage, row in summary.items():
+        before = baseline.get(stage, {}).get("p95_ms")
+        if before and row["p95_ms"] > before * (1 + tolerance):
+            regressions.append(f"{stage}: p95 {before:.1f} → {row['p95_ms']:.1f} ms")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="離線基準測試")
+    parser.add_argument("--runs", type=int, default=5, help="每個目標重複執行次數")
+    parser.add_argument("--items", type=int, default=2000, help="每個日期的合成 RSS 標題數")
+    parser.add_argument("--llm-latency", type=float, default=200, help="OpenAI / ollama 替身回應延遲（毫秒）")
+    parser.add_argument("--db-latency", type=float, default=20, help="Supabase 替身回應延遲（毫秒）")
+    parser.add_argument("--targets", default=",".join(ALL_TARGETS), help=f"逗號分隔：{','.join(ALL_TARGETS)}")
+    parser.add_argument("--warm-cache", action="store_true", help="保留 RSS / LLM 快取（預設停用，量測實際呼叫）")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--json", type=Path, help="另存各階段結果（JSON）")
+    parser.add_argument("--baseline", type=Path, help="與先前 --json 的結果比較 p95")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允許的 p95 退步比例")
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    state = StubState(items_per_feed=args.items, llm_latency=args.llm_latency / 1000,
+                      db_latency=args.db_latency / 1000)
+    recorder = Recorder()
+    notes = []
+
+    with StubServer(state) as server, tempfile.TemporaryDirectory() as tmp:
+        # 必須在匯入專案模組前設定，RSS_URL 等設定在匯入時讀取
+        os.environ.update(server.env())
+        os.environ["RSS_CACHE_DIR"] = str(Path(tmp) / "rss_cache")
+        os.environ["LLM_CACHE_PATH"] = str(Path(tmp) / "llm_cache.sqlite")
+        os.environ["LOCAL_STORE_PATH"] = str(Path(tmp) / "news_selection_log.db")
+        if not args.warm_cache:
+            os.environ["RSS_CACHE"] = "off"
+            os.environ["LLM_CACHE"] = "off"
+            # 每次都量測完整的選稿，不略過前一次已處理的標題
+            os.environ["INCREMENTAL"] = "off"
+
+        print(f"🧪 替身服務：{server.url}，目標：{targets}")
+        if "stages" in targets:
+            bench_stages(recorder, args.runs, args.items)
+        if "gpt" in targets:
+            bench_gpt(recorder, args.runs)
+        if "handler" in targets:
+            bench_handler(recorder, args.runs)
+        if "handler_async" in targets:
+            if importlib.util.find_spec("httpx") is None:
+                notes.append("未安裝 httpx，略過 handler_async")
+            else:
+                bench_handler(recorder, args.runs, use_async=True)
+        if "incomplete" in targets:
+            note = bench_incomplete(recorder, args.runs)
+            if note:
+                notes.append(note)
+        requests_seen = dict(state.requests)
+
+    summary = recorder.summary()
+    report = format_report(summary, args, notes, requests_seen)
+    print(report)
+    args.output.write_text(report, encoding="utf-8")
+    print(f"📝 報告已寫入 {args.output}")
+
+    if args.json:
+        args.json.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.baseline:
+        regressions = compare_baseline(summary, args.baseline, args.tolerance)
+        if regressions:
+            print("❌ 效能退步：")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print("✅ 沒有超過容許範圍的退步")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,553 @@
+# bench/stubs.py
+"""
+離線基準測試用的本地替身服務
+單一 HTTP 伺服器同時扮演：RSS 來源、OpenAI chat completions 與 Batch API（files / batches）、
+Supabase REST（PostgREST）、ollama 與 Webhook。
+RSS 依日期產生固定內容的合成日文標題；OpenAI / ollama 依設定的延遲回應，從提示詞中的標題挑選結果。
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+JST = timezone(timedelta(hours=9))
+
+# 合成標題的素材
+_SUBJECTS = ["岸田首相", "日銀", "防衛省", "外務省", "トヨタ", "ソニー", "東京都", "経団連",
+             "自民党", "立憲民主党", "台湾外相", "米国務長官", "中国外務省", "韓国大統領", "半導体大手"]
+_ACTIONS = ["方針を発表", "会談を実施", "予算案を決定", "規制強化を検討", "新工場を建設",
+            "共同声明を発表", "利上げを決定", "訪問を調整", "制裁を表明", "協力で合意"]
+_TOPICS = ["台湾海峡", "円安", "半導体", "日米同盟", "少子化対策", "原発再稼働", "インバウンド",
+           "南シナ海", "サプライチェーン", "生成AI", "防衛費", "日中関係"]
+_SOURCES = ["NHK", "共同通信", "朝日新聞", "読売新聞", "日本経済新聞", "時事通信"]
+# 部分標題會命中排除規則
+_NOISE = ["Yahoo Japan ニュース", "地震情報 震度3"]
+
+_TITLES_SECTION = re.compile(r"新聞標題：\n(.*)", re.S)
+_MARKER = re.compile(r"［相似報導 \d+ 則］$")
+# 一般提示詞以「- 」列出標題，in-complute 的精簡提示詞以「編號 標題」列出
+_BULLET = re.compile(r"^(?:- |\d+ )")
+
+
+def synthetic_titles(date_str: str, count: int, duplicate_ratio: float = 0.3) -> List[str]:
+    """依日期產生可重現的標題，其中一部分是同一事件的不同媒體版本"""
+    rng = random.Random(f"{date_str}:{count}")
+    titles = []
+    for i in range(count):
+        if titles and rng.random() < duplicate_ratio:
+            base = rng.choice(titles).split("（")[0]
+            titles.append(f"{base}（{rng.choice(_SOURCES)}）")
+        elif rng.random() < 0.02:
+            titles.append(f"{rng.choice(_NOISE)} {i}")
+        else:
+            titles.append(
+                f"{rng.choice(_SUBJECTS)}、{rng.choice(_TOPICS)}で{rng.choice(_ACTIONS)} 第{i}報（{rng.choice(_SOURCES)}）"
+            )
+    return titles
+
+
+def synthetic_feed(date_str: str, count: int) -> bytes:
+    day = datetime.strptime(date_str, "%Y%m%d").replace(tzinfo=JST)
+    items = []
+    for i, title in enumerate(synthetic_titles(date_str, count)):
+        published = day + timedelta(seconds=i * 86400 // max(count, 1))
+        items.append(
+            "<item><title>{}</title><link>https://example.jp/{}/{}</link><pubDate>{}</pubDate></item>".format(
+                title.replace("&", "&amp;").replace("<", "&lt;"), date_str, i, format_datetime(published)
+            )
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>bench</title>'
+        + "".join(items) + "</channel></rss>"
+    ).encode("utf-8")
+
+
+def _prompt_titles(messages: List[dict]) -> List[str]:
+    """從提示詞中取出標題清單"""
+    for message in reversed(messages):
+        content = message.get("content") or ""
+        m = _TITLES_SECTION.search(content)
+        if m:
+            return [_BULLET.sub("", _MARKER.sub("", line).strip()) for line in m.group(1).splitlines() if line.strip()]
+    return []
+
+
+def fake_selection(messages: List[dict], count: int = 5) -> str:
+    """模擬 GPT 回應：初選提示詞回傳 shortlist，補選追問回傳缺少的數量，其餘回傳 count 則 selections"""
+    titles = _prompt_titles(messages) or [f"新聞 {i + 1}" for i in range(count)]
+    prompt = "\n".join(message.get("content") or "" for message in messages)
+    if '"shortlist"' in prompt:
+        m = re.search(r"最值得向台灣讀者報導的 (\d+) 則", prompt)
+        k = int(m.group(1)) if m else 10
+        return json.dumps({"shortlist": titles[:k]}, ensure_ascii=False)
+    if '"ids"' in prompt:
+        m = re.search(r"最值得報導的 (\d+) 則", prompt)
+        return json.dumps({"ids": list(range(1, min(int(m.group(1)) if m else 5, len(titles)) + 1))})
+    if '"id": 編號' in prompt:
+        return json.dumps(
+            {
+                "selections": [
+                    {"id": i + 1, "reason": "基準測試用理由", "writing_direction": "基準測試用撰寫角度"}
+                    for i in range(min(count, len(titles)))
+                ]
+            },
+            ensure_ascii=False,
+        )
+    m = re.search(r"再選出 (\d+) 則", messages[-1].get("content") or "")
+    if m:
+        chosen = "\n".join(message.get("content") or "" for message in messages if message.get("role") == "assistant")
+        titles = [title for title in titles if title not in chosen] or titles
+        count = int(m.group(1))
+    picked = (titles * count)[:count]
+    return json.dumps(
+        {
+            "selections": [
+                {"title": title, "reason": "基準測試用理由", "writing_direction": "基準測試用撰寫角度"}
+                for title in picked
+            ]
+        },
+        ensure_ascii=False,
+    )
+
+
+def _approximate_usage(messages: List[dict], content: str) -> dict:
+    """以字元數粗估 token 用量（日文約每 1.5 字一個 token）"""
+    prompt_tokens = int(sum(len(message.get("content") or "") for message in messages) / 1.5)
+    completion_tokens = int(len(content) / 1.5)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+class StubState:
+    """替身服務的設定與狀態（執行緒安全）"""
+
+    def __init__(self, items_per_feed: int = 2000, llm_latency: float = 0.2,
+                 db_latency: float = 0.02, rss_latency: float = 0.0, batch_latency: float = 1.0):
+        self.items_per_feed = items_per_feed
+        self.llm_latency = llm_latency
+        self.db_latency = db_latency
+        self.rss_latency = rss_latency
+        # 批次建立後經過多久才完成（秒）
+        self.batch_latency = batch_latency
+        self.tables: Dict[str, Dict[str, dict]] = {}
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, dict] = {}
+        self.requests: Dict[str, int] = {}
+        # 各服務接下來要以 503 回應的請求數（容錯測試用）
+        self.failures: Dict[str, int] = {}
+        # 接下來幾次 chat completions 只回傳部分項目：(剩餘次數, 項目數, 是否在下一個項目中途截斷)
+        self.short_responses = (0, 5, False)
+        self._feeds: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def count(self, route: str):
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def inject_failures(self, service: str, count: int):
+        """讓 service（rss / openai / supabase）接下來 count 個請求回應 503；count 為 -1 時持續失敗"""
+        with self._lock:
+            self.failures[service] = count
+
+    def inject_short_responses(self, items: int, count: int = 1, truncate: bool = False):
+        """讓接下來 count 次 chat completions 只回傳 items 則；truncate 時再附上一段不完整的 JSON"""
+        with self._lock:
+            self.short_responses = (count, items, truncate)
+
+    def take_short_response(self):
+        with self._lock:
+            count, items, truncate = self.short_responses
+            if count <= 0:
+                return None
+            self.short_responses = (count - 1, items, truncate)
+            return items, truncate
+
+    def take_failure(self, service: str) -> bool:
+        with self._lock:
+            left = self.failures.get(service, 0)
+            if left == 0:
+                return False
+            if left > 0:
+                self.failures[service] = left - 1
+            self.requests[f"{service}_failed"] = self.requests.get(f"{service}_failed", 0) + 1
+            return True
+
+    def feed(self, date_str: str) -> bytes:
+        with self._lock:
+            if date_str not in self._feeds:
+                self._feeds[date_str] = synthetic_feed(date_str, self.items_per_feed)
+            return self._feeds[date_str]
+
+    def reset(self):
+        with self._lock:
+            self.tables.clear()
+            self.requests.clear()
+            self.files.clear()
+            self.batches.clear()
+            self.failures.clear()
+            self.short_responses = (0, 5, False)
+
+
+def _parse_filters(query: Dict[str, List[str]]):
+    """把 PostgREST 查詢參數轉成 (篩選條件, 排序欄位, 是否遞減, 筆數上限)"""
+    filters, order, desc, limit = [], None, False, None
+    for key, values in query.items():
+        value = values[-1]
+        if key in ("select", "columns", "on_conflict"):
+            continue
+        if key == "order":
+            order, _, direction = value.partition(".")
+            desc = direction.startswith("desc")
+        elif key == "limit":
+            limit = int(value)
+        elif value.startswith("eq."):
+            filters.append((key, {value[3:]}))
+        elif value.startswith("in.("):
+            filters.append((key, {v.strip('"') for v in value[4:-1].split(",")}))
+    return filters, order, desc, limit
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json",
+              headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    def _injected_failure(self, path: str) -> bool:
+        """依路徑判斷服務，有待注入的失敗時回應 503"""
+        if path == "/rss":
+            service = "rss"
+        elif path.startswith("/rest/v1/"):
+            service = "supabase"
+        elif path.endswith("/chat/completions"):
+            service = "openai"
+        else:
+            return False
+        if not self.state.take_failure(service):
+            return False
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._send_json(503, {"error": {"message": f"{service} unavailable (injected)"}})
+        return True
+
+    # --- 路由 ---
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if self._injected_failure(url.path):
+            return
+        if url.path == "/rss":
+            return self._rss(query)
+        if url.path.startswith("/rest/v1/"):
+            return self._rest_select(url.path[len("/rest/v1/"):], query)
+        if url.path.startswith("/v1/batches/"):
+            return self._batch_retrieve(url.path.rsplit("/", 1)[-1])
+        if url.path.startswith("/v1/files/") and url.path.endswith("/content"):
+            return self._file_content(url.path.split("/")[3])
+        if url.path == "/v1/models":
+            return self._send_json(200, {"object": "list", "data": [{"id": "llama4:128x17b", "object": "model"}]})
+        if url.path == "/api/tags":
+            self.state.count("ollama_tags")
+            return self._send_json(200, {"models": [{"name": "llama4:128x17b", "model": "llama4:128x17b"}]})
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if self._injected_failure(url.path):
+            return
+        if url.path.endswith("/chat/completions"):
+            return self._chat_completions()
+        if url.path == "/v1/files":
+            return self._file_upload()
+        if url.path == "/v1/batches":
+            return self._batch_create()
+        if url.path.startswith("/rest/v1/"):
+            return self._rest_insert(url.path[len("/rest/v1/"):], parse_qs(url.query))
+        if url.path == "/api/chat":
+            return self._ollama_chat()
+        if url.path == "/api/pull":
+            self.state.count("ollama_pull")
+            self._read_json()
+            return self._send_json(200, {"status": "success"})
+        if url.path == "/webhook":
+            self.state.count("webhook")
+            self._read_json()
+            return self._send_json(200, {"ok": True})
+        self._send_json(404, {"error": "not found"})
+
+    def _rss(self, query):
+        self.state.count("rss")
+        if self.state.rss_latency:
+            time.sleep(self.state.rss_latency)
+        body = self.state.feed(query.get("date", ["20240101"])[0])
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers={"ETag": etag})
+        self._send(200, body, "application/rss+xml; charset=utf-8", {"ETag": etag})
+
+    def _chat_completions(self):
+        self.state.count("openai")
+        request = self._read_json()
+        messages = request.get("messages", [])
+        short = self.state.take_short_response()
+        if short:
+            items, truncate = short
+            content = fake_selection(messages, items)
+            if truncate:
+                # 下一個項目只送出一半，模擬輸出被截斷
+                content = content[:-2] + ', {"title": "被截斷的標'
+        else:
+            content = fake_selection(messages)
+        if request.get("stream"):
+            return self._stream_completion(request, content)
+        time.sleep(self.state.llm_latency)
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": _approximate_usage(request.get("messages", []), content),
+        })
+
+    def _stream_completion(self, request: dict, content: str, pieces: int = 20):
+        """以 SSE 分段送出（chunked），總延遲與非串流相同"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        def send_event(payload):
+            data = ("data: " + (payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False))
+                    + "\n\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta: dict, finish_reason=None, usage=None):
+            return {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                "usage": usage,
+            }
+
+        size = max(1, -(-len(content) // pieces))
+        for start in range(0, len(content), size):
+            time.sleep(self.state.llm_latency / pieces)
+            send_event(chunk({"content": content[start:start + size]}))
+        send_event(chunk({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send_event(chunk({}, usage=_approximate_usage(request.get("messages", []), content)))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # --- Batch API ---
+
+    def _file_upload(self):
+        self.state.count("openai_files")
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        message = BytesParser(policy=HTTP).parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+        )
+        content, filename, purpose = b"", "upload.jsonl", "batch"
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                content = part.get_payload(decode=True)
+                filename = part.get_filename() or filename
+            elif name == "purpose":
+                purpose = part.get_content().strip()
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        with self.state._lock:
+            self.state.files[file_id] = content
+        self._send_json(200, {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        })
+
+    def _file_content(self, file_id: str):
+        with self.state._lock:
+            content = self.state.files.get(file_id)
+        if content is None:
+            return self._send_json(404, {"error": {"message": "file not found"}})
+        self._send(200, content, "application/octet-stream")
+
+    def _batch_create(self):
+        self.state.count("openai_batches")
+        request = self._read_json()
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+            "status": "validating", "created_at": int(time.time()), "metadata": request.get("metadata"),
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        with self.state._lock:
+            self.state.batches[batch_id] = batch
+        self._send_json(200, batch)
+
+    def _batch_retrieve(self, batch_id: str):
+        with self.state._lock:
+            batch = self.state.batches.get(batch_id)
+            if batch is None:
+                return self._send_json(404, {"error": {"message": "batch not found"}})
+            if batch["status"] != "completed":
+                if time.time() - batch["created_at"] >= self.state.batch_latency:
+                    self._complete_batch(batch)
+                else:
+                    batch["status"] = "in_progress"
+            payload = dict(batch)
+        self._send_json(200, payload)
+
+    def _complete_batch(self, batch: dict):
+        """依輸入檔逐行產生回應（呼叫前需持有鎖）"""
+        lines = [json.loads(line) for line in self.state.files[batch["input_file_id"]].decode("utf-8").splitlines()
+                 if line.strip()]
+        output = []
+        for line in lines:
+            body = line["body"]
+            content = fake_selection(body.get("messages", []))
+            output.append({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": line["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": {
+                        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                     "finish_reason": "stop"}],
+                        "usage": _approximate_usage(body.get("messages", []), content),
+                    },
+                },
+                "error": None,
+            })
+        output_id = f"file-{uuid.uuid4().hex[:12]}"
+        self.state.files[output_id] = "".join(json.dumps(o, ensure_ascii=False) + "\n" for o in output).encode("utf-8")
+        batch.update({
+            "status": "completed", "output_file_id": output_id, "completed_at": int(time.time()),
+            "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+        })
+
+    def _ollama_chat(self):
+        self.state.count("ollama")
+        request = self._read_json()
+        time.sleep(self.state.llm_latency)
+        self._send_json(200, {
+            "model": request.get("model"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": fake_selection(request.get("messages", []))},
+            "done": True,
+        })
+
+    def _rest_insert(self, table: str, query):
+        self.state.count("supabase_write")
+        payload = self._read_json()
+        rows = payload if isinstance(payload, list) else [payload]
+        time.sleep(self.state.db_latency)
+        ignore_duplicates = "ignore-duplicates" in (self.headers.get("Prefer") or "")
+        rows = [dict(row, id=row.get("id") or str(uuid.uuid4())) for row in rows]
+        with self.state._lock:
+            store = self.state.tables.setdefault(table, {})
+            conflict = not ignore_duplicates and any(row["id"] in store for row in rows)
+            inserted = [] if conflict else [row for row in rows if row["id"] not in store]
+            for row in inserted:
+                store[row["id"]] = row
+        if conflict:
+            return self._send_json(409, {"code": "23505", "message": "duplicate key value"})
+        self._send_json(201, inserted)
+
+    def _rest_select(self, table: str, query):
+        self.state.count("supabase_read")
+        time.sleep(self.state.db_latency)
+        filters, order, desc, limit = _parse_filters(query)
+        with self.state._lock:
+            rows = list(self.state.tables.get(table, {}).values())
+        rows = [row for row in rows if all(str(row.get(key)) in values for key, values in filters)]
+        if order:
+            rows.sort(key=lambda row: str(row.get(order)), reverse=desc)
+        if limit is not None:
+            rows = rows[:limit]
+        self._send_json(200, rows)
+
+
+class StubServer:
+    """在背景執行緒啟動替身服務；可作為 context manager 使用"""
+
+    def __init__(self, state: Optional[StubState] = None, host: str = "127.0.0.1", port: int = 0):
+        self.state = state or StubState()
+        handler = type("BoundStubHandler", (StubHandler,), {"state": self.state})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """讓各程式連到替身服務的環境變數"""
+        return {
+            "RSS_URL": f"{self.url}/rss",
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "SUPABASE_URL": self.url,
+            "SUPABASE_KEY": "bench-key",
+            "OLLAMA_HOST": self.url,
+            "WEBHOOK_URL": f"{self.url}/webhook",
+        }
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,330 @@
+# cascade.py
+"""
+模型級聯選稿
+先以本地線性分類器（以本地紀錄中的歷史選稿訓練的 logistic regression）估計每則標題被選中的機率，
+前 5 則都夠有把握、且與第 6 則差距夠大時直接採用本地結果，不呼叫 gpt-4o-mini；
+沒有模型或信心不足時才交給原本的 GPT 選稿。本地選出的 5 則預設依最相近的主題以範本填寫理由與撰寫方向，
+理由以 LOCAL_REASON_PREFIX 開頭，與 GPT 撰寫的結果一樣寫入 Supabase 的 selected_news（讀者可由前綴辨識）；
+CASCADE_LLM_TEXT=on 時改由 GPT 只為這 5 則撰寫理由與方向（提示詞只含這 5 則）。
+每次由哪一層回答記錄在 cascade_tier 指標與本地紀錄的 model 欄位。
+
+特徵沿用 prerank：字元 n-gram（雜湊到固定維度）、各主題相似度、關鍵字權重與相似報導數量，
+訓練與預測都以 NumPy 的稀疏運算完成，不需要額外套件。
+
+用法：
+    python cascade.py train                 # 以本地紀錄訓練並寫入 CASCADE_MODEL_PATH
+    python cascade.py score --date 20240101 # 以模型為該日的標題評分，顯示是否會由本地回答
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from metrics import get_metrics
+from news_models import EXPECTED_SELECTIONS, HeadlineSelection
+from prerank import TOPIC_NAMES, Ranking, ngram_codes, rank_titles
+from title_dedupe import cluster_titles, normalize_title, normalize_titles
+
+DEFAULT_MODEL_PATH = Path(__file__).resolve().parent / "cascade_model.npz"
+# 開啟級聯選稿（gpt.py 也可用 --cascade）
+CASCADE = os.environ.get("CASCADE", "off").lower() in ("1", "on", "true")
+# 本地選出的標題交給 GPT 撰寫理由與方向（預設 off：以範本填寫，有把握的日子完全不呼叫 GPT）
+LLM_TEXT = os.environ.get("CASCADE_LLM_TEXT", "off").lower() in ("1", "on", "true")
+# 範本填寫的理由開頭，selected_news 的讀者據此辨識本地模型選出的結果
+LOCAL_REASON_PREFIX = "【本地模型】"
+# 第 5 則的機率至少要有 CONFIDENCE，且比第 6 則高 MARGIN 以上才由本地回答
+CONFIDENCE = float(os.environ.get("CASCADE_CONFIDENCE", "0.7"))
+MARGIN = float(os.environ.get("CASCADE_MARGIN", "0.2"))
+# 歷史執行少於此數量時不儲存模型（一律交給 GPT）
+MIN_TRAINING_RUNS = 20
+
+TIER_LOCAL = "local"
+TIER_LOCAL_TEXT = "local+llm"
+TIER_LLM = "llm"
+# 各層寫入本地紀錄的 model 欄位；由本地模型選出的執行不納入訓練
+TIER_MODELS = {TIER_LOCAL: "local-linear", TIER_LOCAL_TEXT: "local-linear+gpt-4o-mini", TIER_LLM: "gpt-4o-mini"}
+LOCAL_MODELS = (TIER_MODELS[TIER_LOCAL], TIER_MODELS[TIER_LOCAL_TEXT])
+
+# n-gram 雜湊的位元數（2^14 個特徵）
+HASH_BITS = 14
+HASH_DIM = 1 << HASH_BITS
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+# 主題相似度、關鍵字權重與相似報導數量
+DENSE_FEATURES = len(TOPIC_NAMES) + 2
+# 每次執行抽樣的未選中標題數（預測時以抽樣比例修正截距）
+NEGATIVES_PER_RUN = 200
+EPOCHS = 300
+LEARNING_RATE = 0.5
+L2 = 1e-4
+
+TOPIC_LABELS = {
+    "politics": "日本政治",
+    "diplomacy": "日本外交",
+    "economy": "日本經濟",
+    "china_policy": "對中政策",
+    "regional_security": "區域安全",
+}
+
+
+class LinearModel(NamedTuple):
+    weights: np.ndarray
+    bias: float
+    runs: int
+    trained_at: str
+
+    def logits(self, rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, n: int) -> np.ndarray:
+        return np.bincount(rows, self.weights[cols] * vals, minlength=n) + self.bias
+
+    def predict(self, titles: List[str], cluster_sizes: Optional[Dict[str, int]] = None,
+                ranking: Optional[Ranking] = None) -> np.ndarray:
+        """每則標題被選中的機率（順序與 titles 相同）"""
+        if not titles:
+            return np.zeros(0)
+        ranking = ranking or rank_titles(titles, cluster_sizes)
+        rows, cols, vals = design(titles, dense_features(ranking, cluster_sizes))
+        return 1 / (1 + np.exp(-self.logits(rows, cols, vals, len(titles))))
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        np.savez(path, weights=self.weights, bias=self.bias, runs=self.runs, trained_at=self.trained_at)
+        return path
+
+    @classmethod
+    def load(cls, path) -> "LinearModel":
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]), int(data["runs"]), str(data["trained_at"]))
+
+
+def dense_features(ranking: Ranking, cluster_sizes: Optional[Dict[str, int]] = None) -> np.ndarray:
+    """(標題數, DENSE_FEATURES)：各主題相似度、關鍵字權重與 log2(相似報導數)，縮放到相近的尺度"""
+    cluster_sizes = cluster_sizes or {}
+    sizes = np.fromiter((max(cluster_sizes.get(title, 1), 1) for title in ranking.titles), dtype=float,
+                        count=len(ranking.titles))
+    return np.column_stack([ranking.topic_scores * 5, ranking.keyword_scores / 10, np.log2(sizes) / 3])
+
+
+def design(titles: List[str], dense: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """稀疏特徵矩陣 (列, 欄, 值)：n-gram 雜湊為 0/1 並依列正規化，密集特徵接在 HASH_DIM 之後"""
+    n = len(titles)
+    rows, codes = ngram_codes(normalize_titles(titles))
+    cols = ((codes.astype(np.uint64) * _HASH_MULTIPLIER) >> np.uint64(64 - HASH_BITS)).astype(np.int64)
+    pairs = np.unique(rows * HASH_DIM + cols)
+    rows, cols = np.divmod(pairs, HASH_DIM)
+    counts = np.bincount(rows, minlength=n)
+    vals = 1 / np.sqrt(np.maximum(counts[rows], 1))
+
+    dense_rows = np.repeat(np.arange(n), DENSE_FEATURES)
+    dense_cols = np.tile(np.arange(HASH_DIM, HASH_DIM + DENSE_FEATURES), n)
+    return (np.concatenate([rows, dense_rows]), np.concatenate([cols, dense_cols]),
+            np.concatenate([vals, dense.ravel()]))
+
+
+def training_examples(runs: List[Tuple[List[str], List[str]]], negatives_per_run: int = NEGATIVES_PER_RUN,
+                      seed: int = 0) -> Tuple[List[str], np.ndarray, np.ndarray, float]:
+    """
+    與預測時相同的流程（分群、預排序）整理每次執行的代表標題，選中的為正例、其餘抽樣為負例。
+    回傳 (標題, 密集特徵, 標籤, 負例抽樣比例)。
+    """
+    rng = np.random.default_rng(seed)
+    titles: List[str] = []
+    dense, labels = [], []
+    sampled = total = 0
+    for raw_titles, picked in runs:
+        clusters = cluster_titles(raw_titles)
+        reps = [c.representative for c in clusters]
+        sizes = {c.representative: c.size for c in clusters}
+        picked_keys = {normalize_title(title) for title in picked}
+        positive = np.array([any(normalize_title(m) in picked_keys for m in c.members) for c in clusters])
+        if not positive.any():
+            continue
+        negatives = np.flatnonzero(~positive)
+        keep = rng.choice(negatives, min(negatives_per_run, len(negatives)), replace=False)
+        chosen = np.concatenate([np.flatnonzero(positive), keep])
+        sampled += len(keep)
+        total += len(negatives)
+
+        run_dense = dense_features(rank_titles(reps, sizes), sizes)
+        titles.extend(reps[i] for i in chosen)
+        dense.append(run_dense[chosen])
+        labels.append(positive[chosen].astype(float))
+    if not titles:
+        return [], np.zeros((0, DENSE_FEATURES)), np.zeros(0), 1.0
+    return titles, np.vstack(dense), np.concatenate(labels), sampled / max(total, 1)
+
+
+def train(runs: List[Tuple[List[str], List[str]]], epochs: int = EPOCHS, learning_rate: float = LEARNING_RATE,
+          l2: float = L2) -> Optional[LinearModel]:
+    """以 AdaGrad 全批次梯度下降訓練 logistic regression；沒有可用的正例時回傳 None"""
+    titles, dense, labels, sample_rate = training_examples(runs)
+    if not len(labels) or labels.all():
+        return None
+    n = len(titles)
+    rows, cols, vals = design(titles, dense)
+    size = HASH_DIM + DENSE_FEATURES
+    weights = np.zeros(size)
+    prior = labels.mean()
+    bias = math.log(prior / (1 - prior))
+    squared = np.full(size, 1e-8)
+    bias_squared = 1e-8
+    for _ in range(epochs):
+        z = np.bincount(rows, weights[cols] * vals, minlength=n) + bias
+        error = 1 / (1 + np.exp(-z)) - labels
+        grad = np.bincount(cols, error[rows] * vals, minlength=size) / n + l2 * weights
+        squared += grad ** 2
+        weights -= learning_rate * grad / np.sqrt(squared)
+        bias_grad = error.mean()
+        bias_squared += bias_grad ** 2
+        bias -= learning_rate * bias_grad / math.sqrt(bias_squared)
+    # 負例只抽樣了一部分，預測時所有標題都會評分，截距依抽樣比例修正機率
+    return LinearModel(weights, bias + math.log(sample_rate), len(runs), datetime.now(timezone.utc).isoformat())
+
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+def get_model() -> Optional[LinearModel]:
+    """載入 CASCADE_MODEL_PATH（預設 cascade_model.npz）；尚未訓練時回傳 None"""
+    global _model, _model_loaded
+    with _model_lock:
+        if not _model_loaded:
+            _model_loaded = True
+            path = Path(os.environ.get("CASCADE_MODEL_PATH", DEFAULT_MODEL_PATH))
+            if path.exists():
+                try:
+                    _model = LinearModel.load(path)
+                except Exception as e:
+                    print(f"⚠️ 無法載入本地選稿模型，一律交給 GPT：{e}")
+    return _model
+
+
+def is_confident(probabilities: np.ndarray, k: int = EXPECTED_SELECTIONS, confidence: float = CONFIDENCE,
+                 margin: float = MARGIN) -> bool:
+    """第 k 則的機率夠高，且與第 k+1 則明顯拉開"""
+    if len(probabilities) < k:
+        return False
+    ordered = np.sort(probabilities)[::-1]
+    runner_up = ordered[k] if len(ordered) > k else 0.0
+    return bool(ordered[k - 1] >= confidence and ordered[k - 1] - runner_up >= margin)
+
+
+def local_selection(titles: List[str], probabilities: np.ndarray, ranking: Ranking,
+                    k: int = EXPECTED_SELECTIONS) -> HeadlineSelection:
+    """機率最高的 k 則，理由與方向依最相近的主題填入"""
+    selections = []
+    for i in np.argsort(-probabilities, kind="stable")[:k]:
+        topic = TOPIC_LABELS[TOPIC_NAMES[int(np.argmax(ranking.topic_scores[i]))]]
+        selections.append({
+            "title": titles[i],
+            "reason": f"{LOCAL_REASON_PREFIX}判定為{topic}相關的重要新聞（被選機率 {probabilities[i]:.0%}）",
+            "writing_direction": f"從{topic}的角度說明這則新聞對台灣的意義",
+        })
+    return HeadlineSelection.model_validate({"selections": selections})
+
+
+class CascadeResult(NamedTuple):
+    selection: object
+    tier: str
+    confidence: Optional[float]
+
+
+def cascade_select(titles: List[str], llm_select: Callable[[List[str]], object],
+                   cluster_sizes: Optional[Dict[str, int]] = None, llm_text: bool = LLM_TEXT,
+                   model: Optional[LinearModel] = None) -> CascadeResult:
+    """
+    級聯選稿：本地模型有把握時由本地回答（llm_text 時只把選出的標題交給 llm_select 撰寫理由），
+    否則以 llm_select 處理全部標題。llm_select 通常是 gpt.call_gpt_format_selection。
+    """
+    metrics = get_metrics()
+    model = model or get_model()
+    confidence = None
+    if model is not None and len(titles) > EXPECTED_SELECTIONS:
+        started = time.perf_counter()
+        ranking = rank_titles(titles, cluster_sizes)
+        probabilities = model.predict(titles, cluster_sizes, ranking)
+        metrics.observe("cascade_local_seconds", time.perf_counter() - started)
+        confidence = float(np.sort(probabilities)[::-1][EXPECTED_SELECTIONS - 1])
+        metrics.observe("cascade_confidence", confidence)
+        if is_confident(probabilities):
+            local = local_selection(titles, probabilities, ranking)
+            if llm_text:
+                tier = TIER_LOCAL_TEXT
+                selection = llm_select([item.title for item in local.selections])
+            else:
+                tier, selection = TIER_LOCAL, local
+            metrics.incr("cascade_tier", tier=tier)
+            print(f"🪜 本地模型有把握（第 5 則機率 {confidence:.0%}），由 {tier} 回答")
+            return CascadeResult(selection, tier, confidence)
+        print(f"🪜 本地模型信心不足（第 5 則機率 {confidence:.0%}），交給 GPT")
+    metrics.incr("cascade_tier", tier=TIER_LLM)
+    return CascadeResult(llm_select(titles), TIER_LLM, confidence)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="級聯選稿的本地模型")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_parser = sub.add_parser("train", help="以本地紀錄的歷史選稿訓練模型")
+    train_parser.add_argument("--runs", type=int, default=500, help="最多使用最近幾次執行")
+    train_parser.add_argument("--output", default=os.environ.get("CASCADE_MODEL_PATH", str(DEFAULT_MODEL_PATH)))
+    score_parser = sub.add_parser("score", help="為某一天的標題評分")
+    score_parser.add_argument("--date", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        from local_store import LocalStore
+        store = LocalStore(os.environ.get("LOCAL_STORE_PATH"))
+        runs = store.training_runs(args.runs, exclude_models=LOCAL_MODELS)
+        if len(runs) < MIN_TRAINING_RUNS:
+            print(f"❌ 歷史執行只有 {len(runs)} 次，至少需要 {MIN_TRAINING_RUNS} 次")
+            return 1
+        # 最新的 20% 留作驗證：本地前 5 則命中實際選稿的比例，以及會由本地回答的比例
+        held_out = runs[:max(1, len(runs) // 5)]
+        started = time.perf_counter()
+        trial = train(runs[len(held_out):])
+        if trial is not None:
+            hits, confident = [], 0
+            for raw_titles, picked in held_out:
+                clusters = cluster_titles(raw_titles)
+                reps = [c.representative for c in clusters]
+                sizes = {c.representative: c.size for c in clusters}
+                probabilities = trial.predict(reps, sizes)
+                top = {normalize_title(reps[i]) for i in np.argsort(-probabilities)[:EXPECTED_SELECTIONS]}
+                hits.append(len(top & {normalize_title(t) for t in picked}) / len(picked))
+                confident += is_confident(probabilities)
+            print(f"🧪 驗證 {len(held_out)} 次：前 5 則命中率 {np.mean(hits):.0%}，"
+                  f"本地回答 {confident} 次（門檻 {CONFIDENCE:.0%}／差距 {MARGIN:.0%}）")
+        model = train(runs)
+        if model is None:
+            print("❌ 歷史紀錄中沒有可用的正例")
+            return 1
+        path = model.save(args.output)
+        print(f"✅ 以 {len(runs)} 次執行訓練完成（{time.perf_counter() - started:.1f} 秒），已寫入 {path}")
+        return 0
+
+    model = get_model()
+    if model is None:
+        print("❌ 尚未訓練模型，請先執行 python cascade.py train")
+        return 1
+    from feed_sources import fetch_feed_items
+    titles = [item["title"] for item in fetch_feed_items(args.date)]
+    clusters = cluster_titles(titles)
+    reps = [c.representative for c in clusters]
+    sizes = {c.representative: c.size for c in clusters}
+    probabilities = model.predict(reps, sizes)
+    for i in np.argsort(-probabilities)[:EXPECTED_SELECTIONS + 3]:
+        print(f"{probabilities[i]:6.1%}  {reps[i]}")
+    print(json.dumps({"confident": is_confident(probabilities), "titles": len(reps)}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
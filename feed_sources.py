@@ -0,0 +1,364 @@
+# feed_sources.py
+"""
+多來源 RSS 抓取
+來源清單（FEED_SOURCES 指定的檔案 → feed_sources.json → 內建的單一來源）中的所有來源同時抓取，
+共用 rss_fetch 的連線池；同一主機的同時連線數有上限，每個來源有各自的逾時與時限，
+慢的來源超過時限只記為該來源失敗，不會拖住整次執行。各來源的項目合併後交給原本的分群與選稿流程。
+
+網址含 {date} 的來源依日期抓取並有各自的快取；其他來源只提供最新內容，依 pubDate（日本時間）分配到日期。
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from metrics import get_metrics
+from prompt_budget import parse_pub_date
+from resilience import deadline_scope, remaining
+from rss_cache import JST, RSSCache
+from rss_fetch import (DEFAULT_DEADLINE, DEFAULT_MAX_WORKERS, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, DEPENDENCY,
+                       feed_url, fetch_rss_items, fetch_rss_items_async, get_cache, get_session)
+
+DEFAULT_SOURCES_PATH = Path(__file__).resolve().parent / "feed_sources.json"
+# 內建來源（原本的 RSS_URL）的名稱，沿用 rss 的斷路器與快取
+DEFAULT_SOURCE = "default"
+# 每個主機的同時連線數上限（來源可用 max_connections 覆寫）
+DEFAULT_HOST_LIMIT = int(os.environ.get("FEED_HOST_LIMIT", "2"))
+# 未設定 deadline 的來源，整個來源（含排隊與重試）的時限秒數
+DEFAULT_SOURCE_DEADLINE = 30
+
+
+class FeedSource(NamedTuple):
+    name: str
+    url: str
+    timeout: Tuple[float, float] = DEFAULT_TIMEOUT
+    deadline: float = DEFAULT_SOURCE_DEADLINE
+    max_connections: Optional[int] = None
+
+    @property
+    def dated(self) -> bool:
+        return "{date}" in self.url
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.url).netloc
+
+    @property
+    def dependency(self) -> str:
+        """斷路器名稱：每個來源各自計算，單一來源故障不影響其他來源"""
+        return DEPENDENCY if self.name == DEFAULT_SOURCE else f"{DEPENDENCY}:{self.name}"
+
+    def url_for(self, date_str: str) -> str:
+        return self.url.replace("{date}", date_str)
+
+
+def builtin_sources() -> List[FeedSource]:
+    """找不到來源清單時只抓原本的 RSS_URL（與單一來源時的行為相同）"""
+    return [FeedSource(DEFAULT_SOURCE, feed_url("{date}"), deadline=DEFAULT_DEADLINE,
+                       max_connections=DEFAULT_MAX_WORKERS)]
+
+
+def parse_sources(config: dict) -> List[FeedSource]:
+    """解析 {"sources": [{"name", "url", "timeout", "deadline", "max_connections", "enabled"}]}"""
+    sources = []
+    for entry in config["sources"]:
+        if not entry.get("enabled", True):
+            continue
+        if entry["name"] == DEFAULT_SOURCE and "url" not in entry:
+            source = builtin_sources()[0]
+        else:
+            source = FeedSource(entry["name"], entry["url"])
+        timeout = entry.get("timeout", source.timeout)
+        sources.append(source._replace(
+            timeout=tuple(timeout) if isinstance(timeout, list) else timeout,
+            deadline=entry.get("deadline", source.deadline),
+            max_connections=entry.get("max_connections", source.max_connections),
+        ))
+    names = [source.name for source in sources]
+    if len(set(names)) != len(names):
+        raise ValueError(f"來源名稱重複：{names}")
+    return sources
+
+
+def load_sources(path) -> List[FeedSource]:
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_sources(json.load(f))
+
+
+_sources = None
+_sources_lock = threading.Lock()
+
+
+def get_sources() -> List[FeedSource]:
+    """取得預設來源清單（FEED_SOURCES 指定的檔案 → feed_sources.json → 內建來源）"""
+    global _sources
+    with _sources_lock:
+        if _sources is None:
+            path = Path(os.environ.get("FEED_SOURCES", DEFAULT_SOURCES_PATH))
+            _sources = load_sources(path) if path.exists() else builtin_sources()
+    return _sources
+
+
+class HostLimiter:
+    """
+    每個主機的同時連線上限。同步抓取共用 get_host_limiter()；
+    asyncio 的 Semaphore 不能跨事件迴圈使用，非同步流程每次執行建立自己的 HostLimiter。
+    """
+
+    def __init__(self, default_limit: int = DEFAULT_HOST_LIMIT):
+        self.default_limit = default_limit
+        self._lock = threading.Lock()
+        self._semaphores: Dict[Tuple[str, bool], object] = {}
+
+    def _semaphore(self, source: FeedSource, is_async: bool):
+        key = (source.host, is_async)
+        with self._lock:
+            if key not in self._semaphores:
+                # 同一主機以第一個來源的設定為準
+                limit = max(1, source.max_connections or self.default_limit)
+                self._semaphores[key] = asyncio.Semaphore(limit) if is_async else threading.BoundedSemaphore(limit)
+            return self._semaphores[key]
+
+    def slot(self, source: FeedSource) -> threading.BoundedSemaphore:
+        return self._semaphore(source, False)
+
+    def async_slot(self, source: FeedSource) -> asyncio.Semaphore:
+        return self._semaphore(source, True)
+
+
+_limiter = HostLimiter()
+
+
+def get_host_limiter() -> HostLimiter:
+    return _limiter
+
+
+_caches: Dict[str, Optional[RSSCache]] = {}
+_caches_lock = threading.Lock()
+
+
+def source_cache(source: FeedSource) -> Optional[RSSCache]:
+    """內建來源沿用預設快取；其他依日期抓取的來源放在快取目錄下各自的子目錄，最新內容的來源不快取"""
+    cache = get_cache()
+    if cache is None or source.name == DEFAULT_SOURCE:
+        return cache
+    if not source.dated:
+        return None
+    with _caches_lock:
+        if source.name not in _caches:
+            _caches[source.name] = RSSCache(cache.cache_dir / source.name, ttl=cache.ttl)
+        return _caches[source.name]
+
+
+def _on_date(item: dict, date_str: str, today: str) -> bool:
+    """最新內容的來源：依 pubDate（日本時間）判斷日期；沒有 pubDate 的項目只算在今天"""
+    published = parse_pub_date(item.get("pubDate"))
+    if published is None:
+        return date_str == today
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=JST)
+    return published.astimezone(JST).strftime("%Y%m%d") == date_str
+
+
+def _label(source: FeedSource, date_str: str, items: List[dict]) -> List[dict]:
+    """標上來源名稱並篩選日期"""
+    if not source.dated:
+        today = datetime.now(JST).strftime("%Y%m%d")
+        items = [item for item in items if _on_date(item, date_str, today)]
+    return [dict(item, feed=source.name) for item in items]
+
+
+def _record(source: FeedSource, started: float, count: int):
+    metrics = get_metrics()
+    metrics.observe("feed_seconds", time.perf_counter() - started, source=source.name)
+    metrics.incr("feed_items", count, source=source.name)
+
+
+def _finish(source: FeedSource, date_str: str, items: List[dict], started: float) -> List[dict]:
+    """標上來源名稱、篩選日期並記錄量測"""
+    items = _label(source, date_str, items)
+    _record(source, started, len(items))
+    return items
+
+
+def _fetch_raw(source: FeedSource, date_str: str, session, limiter: Optional[HostLimiter]) -> List[dict]:
+    """排隊等待連線的時間也計入該來源的時限"""
+    limiter = limiter or get_host_limiter()
+    with deadline_scope(source.deadline), limiter.slot(source):
+        return fetch_rss_items(date_str, session=session or get_session(), timeout=source.timeout,
+                               cache=source_cache(source), url=source.url_for(date_str),
+                               dependency=source.dependency)
+
+
+def fetch_source(source: FeedSource, date_str: str, session=None,
+                 limiter: Optional[HostLimiter] = None) -> List[dict]:
+    """抓取單一來源的單一日期"""
+    started = time.perf_counter()
+    return _finish(source, date_str, _fetch_raw(source, date_str, session, limiter), started)
+
+
+def fetch_source_dates(source: FeedSource, date_strs: List[str], session=None,
+                       limiter: Optional[HostLimiter] = None) -> Dict[str, List[dict]]:
+    """最新內容的來源（網址不含日期）只抓一次，再依 pubDate 分到各日期"""
+    started = time.perf_counter()
+    items = _fetch_raw(source, date_strs[0], session, limiter)
+    by_date = {date_str: _label(source, date_str, items) for date_str in date_strs}
+    _record(source, started, sum(len(day_items) for day_items in by_date.values()))
+    return by_date
+
+
+def _merge(date_strs: List[str], sources: List[FeedSource], outcomes: Dict[Tuple[str, str], object]
+           ) -> Tuple[Dict[str, List[dict]], Dict[str, Exception]]:
+    """依日期合併各來源的結果；只有所有來源都失敗的日期才算失敗"""
+    metrics = get_metrics()
+    results: Dict[str, List[dict]] = {}
+    errors: Dict[str, Exception] = {}
+    for date_str in date_strs:
+        items, failures = [], []
+        for source in sources:
+            outcome = outcomes[(source.name, date_str)]
+            if isinstance(outcome, Exception):
+                failures.append((source, outcome))
+            else:
+                items.extend(outcome)
+        if len(failures) == len(sources):
+            errors[date_str] = failures[0][1]
+            continue
+        for source, error in failures:
+            metrics.incr("feed_errors", source=source.name)
+            print(f"   ⚠️ 來源 {source.name} {date_str} 抓取失敗：{error}")
+        results[date_str] = items
+    return results, errors
+
+
+def fetch_feeds_many(
+    date_strs: List[str],
+    sources: Optional[List[FeedSource]] = None,
+    max_workers: int = DEFAULT_POOL_SIZE,
+    deadline: float = DEFAULT_DEADLINE,
+) -> Tuple[Dict[str, List[dict]], Dict[str, Exception]]:
+    """
+    並行抓取所有來源的多個日期，回傳值與 rss_fetch.fetch_rss_many 相同：(成功結果, 失敗原因)，皆以日期為鍵。
+    每個來源在自己的 deadline 內完成，整體不超過 deadline（或呼叫端截止時間）；
+    未完成的來源記為逾時，不等待它結束。
+    """
+    sources = sources if sources is not None else get_sources()
+    if not date_strs or not sources:
+        return {}, {}
+    left = remaining()
+    if left is not None:
+        deadline = max(min(deadline, left), 0)
+    deadline = min(deadline, max(source.deadline for source in sources))
+
+    session = get_session()
+    # 網址含日期的來源每個日期各抓一次；最新內容的來源只抓一次（date_str 為 None），再依 pubDate 分到各日期
+    tasks = [(source, date_str, fetch_source, date_str) for source in sources if source.dated for date_str in date_strs]
+    tasks += [(source, None, fetch_source_dates, date_strs) for source in sources if not source.dated]
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks))))
+    # 工作執行緒沿用呼叫端的 contextvars，截止時間才會傳到每個請求
+    futures = {
+        executor.submit(contextvars.copy_context().run, fn, source, arg, session): (source, date_str)
+        for source, date_str, fn, arg in tasks
+    }
+    done, _ = wait(futures, timeout=deadline)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    outcomes: Dict[Tuple[str, str], object] = {}
+    for future, (source, date_str) in futures.items():
+        if future not in done:
+            outcome = TimeoutError(f"超過時限 {min(deadline, source.deadline)} 秒")
+        elif future.exception() is not None:
+            outcome = future.exception()
+        else:
+            outcome = future.result()
+        if date_str is not None:
+            outcomes[(source.name, date_str)] = outcome
+            continue
+        for day in date_strs:
+            outcomes[(source.name, day)] = outcome[day] if isinstance(outcome, dict) else outcome
+    return _merge(date_strs, sources, outcomes)
+
+
+def fetch_feed_items(date_str: str, sources: Optional[List[FeedSource]] = None) -> List[dict]:
+    """單一日期所有來源的項目（取代 fetch_rss_items）；所有來源都失敗時拋出第一個錯誤"""
+    results, errors = fetch_feeds_many([date_str], sources)
+    if date_str in errors:
+        raise errors[date_str]
+    return results[date_str]
+
+
+class SharedFeeds:
+    """
+    非同步流程中同一次執行的所有日期共用：最新內容的來源（網址不含日期）只抓一次，
+    第一個需要的日期開始抓取，其他日期等待同一個結果後再依 pubDate 篩選（同 fetch_source_dates）。
+    與 HostLimiter 一樣每次執行建立一個，結束時以 aclose 取消尚未完成的抓取。
+    """
+
+    def __init__(self):
+        self._fetches: Dict[str, asyncio.Future] = {}
+
+    def fetch(self, source: FeedSource, start: Callable[[], Awaitable[List[dict]]]) -> Awaitable[List[dict]]:
+        if source.name not in self._fetches:
+            self._fetches[source.name] = asyncio.ensure_future(start())
+        # 單一日期逾時或被取消時，不取消其他日期也在等待的抓取
+        return asyncio.shield(self._fetches[source.name])
+
+    async def aclose(self):
+        for future in self._fetches.values():
+            future.cancel()
+        await asyncio.gather(*self._fetches.values(), return_exceptions=True)
+
+
+async def fetch_feed_items_async(http, date_str: str, sources: Optional[List[FeedSource]] = None,
+                                 limiter: Optional[HostLimiter] = None,
+                                 shared: Optional[SharedFeeds] = None) -> List[dict]:
+    """
+    fetch_feed_items 的非同步版本，http 為 httpx.AsyncClient。
+    limiter 與 shared 應由同一次執行的所有呼叫共用（預設每次呼叫各自建立，最新內容的來源每個日期各抓一次）。
+    """
+    sources = sources if sources is not None else get_sources()
+    limiter = limiter or HostLimiter()
+
+    async def fetch_raw(source: FeedSource) -> List[dict]:
+        with deadline_scope(source.deadline):
+            async with limiter.async_slot(source):
+                return await asyncio.wait_for(
+                    fetch_rss_items_async(http, date_str, cache=source_cache(source),
+                                          url=source.url_for(date_str), dependency=source.dependency),
+                    max(source.deadline if remaining() is None else remaining(), 0.01),
+                )
+
+    async def fetch_latest(source: FeedSource) -> List[dict]:
+        started = time.perf_counter()
+        items = await fetch_raw(source)
+        _record(source, started, len(items))
+        return items
+
+    async def fetch_one(source: FeedSource):
+        started = time.perf_counter()
+        try:
+            if shared is not None and not source.dated:
+                return _label(source, date_str, await shared.fetch(source, lambda: fetch_latest(source)))
+            items = await fetch_raw(source)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"超過時限 {source.deadline} 秒")
+        return _finish(source, date_str, items, started)
+    outcomes = await asyncio.gather(*(fetch_one(source) for source in sources), return_exceptions=True)
+    # return_exceptions 也會收下 CancelledError 等非 Exception 的例外，這些必須往外拋，不能當成來源失敗
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+            raise outcome
+    results, errors = _merge([date_str], sources, {
+        (source.name, date_str): outcome for source, outcome in zip(sources, outcomes)
+    })
+    if date_str in errors:
+        raise errors[date_str]
+    return results[date_str]
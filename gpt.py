@@ -1,108 +1,60 @@
 import os
 import json
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
-from typing import List, Any
+from typing import Callable, Dict, List, Optional, Tuple
 from uuid import uuid4
 
-import requests
-from pydantic import BaseModel, field_validator, model_validator
-from openai import OpenAI
 from dotenv import load_dotenv
-from supabase import create_client, Client
+
+from feed_sources import fetch_feeds_many
+from title_filter import get_title_filter
+from title_dedupe import cluster_titles, format_title_line, strip_cluster_marker
+from prompt_budget import pack_titles, parse_pub_date
+from prerank import DEFAULT_TOP_K, rank_titles
+from tournament import tournament_select
+from llm_cache import cached_chat_completion, cached_chat_completion_async, get_llm_cache
+from news_store import DEPENDENCY as SUPABASE, build_rows
+from local_store import get_local_store, save_rows
+from metrics import Metrics, export_from_env, get_metrics
+from resilience import call
+from selection_stream import stream_selection
+from cascade import CASCADE, TIER_LLM, TIER_LOCAL, TIER_MODELS, cascade_select
+from news_models import (HeadlineSelection, SelectedHeadline, STRUCTURED_OUTPUTS, check_selection, load_selection,
+                         selection_from_items, selection_response_format)
 
 # 載入環境變數
 load_dotenv()
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-supabase: Client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+# 去重後標題超過此數量時改用分組淘汰賽選稿
+TOURNAMENT_THRESHOLD = int(os.environ.get("TOURNAMENT_THRESHOLD", "300"))
+# LLM_STREAM=on 時以串流選稿，每則結果通過驗證就先寫入本地紀錄
+STREAM_SELECTION = os.environ.get("LLM_STREAM", "off").lower() in ("1", "on", "true")
+# 增量模式：只把尚未處理過的標題與上次選出的候選送進選稿（需要本地紀錄；INCREMENTAL=on 或 --incremental 啟用）
+INCREMENTAL = os.environ.get("INCREMENTAL", "off").lower() in ("1", "on", "true")
 
-# Pydantic Schema - 彈性版本
-class SelectedHeadline(BaseModel):
-    title: str
-    reason: str
-    writing_direction: str
+# 客戶端在第一次使用時才建立，之後重複使用（匯入本模組不會連線）
+_openai_client = None
+_supabase_client = None
 
-class HeadlineSelection(BaseModel):
-    selections: List[SelectedHeadline]
-    
-    @model_validator(mode='before')
-    @classmethod
-    def extract_selections(cls, data: Any) -> Any:
-        """自動從不同的鍵名中提取選項陣列"""
-        if isinstance(data, dict):
-            # 按優先順序檢查可能的鍵名
-            possible_keys = [
-                'selections',
-                'selected_articles', 
-                'articles',
-                'news',
-                'selected_news',
-                'items',
-                'results'
-            ]
-            
-            for key in possible_keys:
-                if key in data and isinstance(data[key], list):
-                    print(f"🔧 使用鍵名：{key}")
-                    selections_data = data[key]
-                    
-                    # 驗證陣列不為空
-                    if len(selections_data) == 0:
-                        raise ValueError('選項陣列不能為空')
-                    
-                    # 簡單清理資料，確保每個項目都有必要的欄位
-                    cleaned_selections = []
-                    for i, item in enumerate(selections_data):
-                        if isinstance(item, dict):
-                            cleaned_item = {
-                                'title': item.get('title', f'新聞 {i+1}'),
-                                'reason': item.get('reason', '未提供理由'),
-                                'writing_direction': item.get('writing_direction', '未提供建議')
-                            }
-                            cleaned_selections.append(cleaned_item)
-                    
-                    print(f"✅ 成功處理 {len(cleaned_selections)} 則新聞")
-                    return {'selections': cleaned_selections}
-            
-            # 如果找不到預期的鍵，嘗試找任何陣列
-            for key, value in data.items():
-                if isinstance(value, list) and len(value) > 0:
-                    # 檢查陣列第一個元素是否看起來像新聞項目
-                    first_item = value[0]
-                    if isinstance(first_item, dict) and any(k in first_item for k in ['title', 'reason']):
-                        print(f"🔧 自動檢測到陣列：{key}")
-                        return {'selections': value}
-        
-        return data
-
-# 抓取 RSS XML
-def fetch_rss(date_str):
-    url = f"https://japan-news-get.netlify.app/rss?date={date_str}"
-    res = requests.get(url)
-    if res.status_code != 200:
-        raise Exception(f"RSS 錯誤：{res.status_code}")
-    return res.text
-
-# 解析 XML 標題
-def parse_rss_titles(rss_xml):
-    root = ET.fromstring(rss_xml)
-    items = root.findall(".//item")
-    titles = []
-    for item in items:
-        title_element = item.find("title")
-        if title_element is not None and title_element.text:
-            title = title_element.text.strip()
-            if any(skip in title for skip in ["Yahoo Japan", "地震情報"]):
-                continue
-            titles.append(title)
-    return titles
+def get_openai_client():
+    """取得 OpenAI 客戶端"""
+    global _openai_client
+    if _openai_client is None:
+        from openai import OpenAI
+        # 重試由 resilience 統一處理（含退避、重試預算與截止時間），SDK 本身不再重試
+        _openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0)
+    return _openai_client
 
-# 呼叫 GPT 並解析 - 簡化版
-def call_gpt_format_selection(titles: List[str]) -> HeadlineSelection:
-    prompt = f"""
-你是台灣的國際新聞編輯，以下是日本新聞標題，請從中選出 5 則新聞，並說明選擇理由與建議撰寫角度。
+def get_supabase_client():
+    """取得 Supabase 客戶端"""
+    global _supabase_client
+    if _supabase_client is None:
+        from supabase import create_client
+        _supabase_client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
+    return _supabase_client
 
-**重要指示：無論如何都必須選出正好 5 則新聞，即使標題看起來不夠有趣或不完全符合條件，也要從現有標題中選出最相關的 5 則。**
+# 選稿方針（結構化輸出與 JSON 模式共用）
+SELECTION_GUIDE = """
+你是台灣的國際新聞編輯，以下是日本新聞標題，請從中選出 5 則新聞，並說明選擇理由與建議撰寫角度。
 
 優先條件（盡量符合，但不是必須）：
 1. 有助台灣理解日本政治、外交、經濟、文化
@@ -114,65 +66,116 @@ def call_gpt_format_selection(titles: List[str]) -> HeadlineSelection:
 3. 日本科技、產業發展
 4. 任何具有新聞價值的日本相關新聞
 
+標題後方的「［相似報導 N 則］」代表有 N 家媒體報導同一事件，可作為重要性參考；回傳 title 時請只填寫標題本身，不要包含這個標記。
+
+"""
+# JSON 模式（LLM_STRUCTURED=off）才需要的格式說明與範例
+SELECTION_FORMAT = """
+**重要指示：無論如何都必須選出正好 5 則新聞，即使標題看起來不夠有趣或不完全符合條件，也要從現有標題中選出最相關的 5 則。**
+
 **強制要求：**
 - 必須選出正好 5 則新聞，不可以選少於 5 則
 - 即使標題質量不理想，也要從給定的標題中選出最好的 5 則
 - 不可以回傳空陣列或少於 5 個項目的陣列
 
 請嚴格按照以下格式回傳，務必包含 5 則新聞：
-{{
+{
   "selections": [
-    {{
+    {
       "title": "新聞標題",
       "reason": "選擇理由", 
       "writing_direction": "建議撰寫角度"
-    }},
-    {{
+    },
+    {
       "title": "新聞標題2",
       "reason": "選擇理由2", 
       "writing_direction": "建議撰寫角度2"
-    }},
-    {{
+    },
+    {
       "title": "新聞標題3",
       "reason": "選擇理由3", 
       "writing_direction": "建議撰寫角度3"
-    }},
-    {{
+    },
+    {
       "title": "新聞標題4",
       "reason": "選擇理由4", 
       "writing_direction": "建議撰寫角度4"
-    }},
-    {{
+    },
+    {
       "title": "新聞標題5",
       "reason": "選擇理由5", 
       "writing_direction": "建議撰寫角度5"
-    }}
+    }
   ]
-}}
+}
 
 **再次強調：陣列中必須有正好 5 個新聞物件，絕對不可以是空陣列或少於 5 個項目。**
 """
+SYSTEM_PROMPT = "你是專業的新聞編輯，依選稿方針從標題中選出正好 5 則新聞。"
+JSON_SYSTEM_PROMPT = "你是專業的新聞編輯。**最重要的規則：無論如何都必須選出正好5則新聞，即使標題質量不理想也要選出最好的5則。絕對不可以回傳少於5個項目的陣列。** 請嚴格按照指定的JSON格式回傳結果。"
+
+# 組出選稿提示詞，回傳 (messages, 實際送出的標題)
+def build_selection_messages(titles: List[str], cluster_sizes: Optional[Dict[str, int]] = None,
+                             published_at: Optional[Dict[str, datetime]] = None,
+                             structured: Optional[bool] = None) -> Tuple[List[dict], List[str]]:
+    cluster_sizes = cluster_sizes or {}
+    structured = STRUCTURED_OUTPUTS if structured is None else structured
+    # 結構化輸出由 JSON schema 保證格式與數量，提示詞只需要選稿方針
+    prompt = SELECTION_GUIDE if structured else SELECTION_GUIDE + SELECTION_FORMAT
     
-    # 限制標題數量避免 token 過多
-    limited_titles = titles[:100]
+    # 先在本地以主題相似度預排序，只留 top-K（維持原本順序），再依 token 預算放入
+    ranking = rank_titles(titles, cluster_sizes)
+    top = set(ranking.top(DEFAULT_TOP_K))
+    packed = pack_titles(
+        [title for title in titles if title in top],
+        render_line=lambda title: format_title_line(title, cluster_sizes.get(title)),
+        cluster_sizes=cluster_sizes,
+        published_at=published_at,
+        scores=ranking.score_map(),
+    )
+    limited_titles = packed.titles
     
-    print(f"📝 發送給 GPT 的標題數量：{len(limited_titles)}")
+    print(f"📝 發送給 GPT 的標題數量：{len(limited_titles)}（使用 {packed.used_tokens}/{packed.budget} tokens，捨棄 {packed.dropped} 則）")
     
     messages = [
-        {"role": "system", "content": "你是專業的新聞編輯。**最重要的規則：無論如何都必須選出正好5則新聞，即使標題質量不理想也要選出最好的5則。絕對不可以回傳少於5個項目的陣列。** 請嚴格按照指定的JSON格式回傳結果。"},
-        {"role": "user", "content": prompt + "\n\n新聞標題：\n" + "\n".join([f"- {title}" for title in limited_titles])}
+        {"role": "system", "content": SYSTEM_PROMPT if structured else JSON_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt + "\n\n新聞標題：\n" + "\n".join([format_title_line(title, cluster_sizes.get(title)) for title in limited_titles])}
     ]
+    return messages, limited_titles
+
+# 解析 GPT 回應
+def parse_selection(content: str) -> HeadlineSelection:
+    # 結構化輸出時依 schema 嚴格驗證，JSON 模式才交給 HeadlineSelection 寬鬆解析；兩者都記錄驗證失敗率
+    parsed = load_selection(content)
+    for item in parsed.selections:
+        item.title = strip_cluster_marker(item.title)
+    return parsed
+
+# 呼叫 GPT 並解析 - 簡化版
+def call_gpt_format_selection(titles: List[str], cluster_sizes: Optional[Dict[str, int]] = None,
+                              published_at: Optional[Dict[str, datetime]] = None, client=None,
+                              prompt_log: Optional[List[dict]] = None, stream: bool = False,
+                              on_item: Optional[Callable[[SelectedHeadline], None]] = None) -> HeadlineSelection:
+    messages, limited_titles = build_selection_messages(titles, cluster_sizes, published_at)
+    if prompt_log is not None:
+        prompt_log.append({"model": "gpt-4o-mini", "messages": messages})
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            response_format={"type": "json_object"},
-            temperature=0.3
-        )
-        
-        # 直接使用 model_validate_json，讓 Pydantic 處理格式轉換
-        parsed = HeadlineSelection.model_validate_json(response.choices[0].message.content)
+        if stream:
+            # 串流模式：每則結果通過驗證就交給 on_item，不足 5 則時只追問缺少的部分
+            parsed = stream_selection(client or get_openai_client(), messages, limited_titles, on_item, prompt_log)
+        else:
+            # 相同提示詞直接讀取本地快取，不重複付費呼叫
+            content = cached_chat_completion(
+                client or get_openai_client(),
+                model="gpt-4o-mini",
+                messages=messages,
+                response_format=selection_response_format(),
+                temperature=0.3,
+                titles=limited_titles,
+                validate=check_selection,
+            )
+            parsed = parse_selection(content)
         print(f"✅ GPT 分析成功，選出 {len(parsed.selections)} 則新聞")
         
         return parsed
@@ -183,46 +186,66 @@ def call_gpt_format_selection(titles: List[str]) -> HeadlineSelection:
         traceback.print_exc()
         raise
 
-# 改進的儲存函數
-def save_to_supabase(date_str: str, selection: HeadlineSelection):
+# call_gpt_format_selection 的非同步版本（AsyncOpenAI）
+async def call_gpt_format_selection_async(client, titles: List[str], cluster_sizes: Optional[Dict[str, int]] = None,
+                                          published_at: Optional[Dict[str, datetime]] = None,
+                                          prompt_log: Optional[List[dict]] = None) -> HeadlineSelection:
+    messages, limited_titles = build_selection_messages(titles, cluster_sizes, published_at)
+    if prompt_log is not None:
+        prompt_log.append({"model": "gpt-4o-mini", "messages": messages})
+    content = await cached_chat_completion_async(
+        client,
+        model="gpt-4o-mini",
+        messages=messages,
+        response_format=selection_response_format(),
+        temperature=0.3,
+        titles=limited_titles,
+        validate=check_selection,
+    )
+    return parse_selection(content)
+
+# 標題過多時：分組平行初選，再由 call_gpt_format_selection 決選
+def call_gpt_tournament_selection(titles: List[str], cluster_sizes: Optional[Dict[str, int]] = None,
+                                  published_at: Optional[Dict[str, datetime]] = None, client=None,
+                                  prompt_log: Optional[List[dict]] = None) -> HeadlineSelection:
+    client = client or get_openai_client()
+    return tournament_select(
+        titles,
+        client,
+        reduce_fn=lambda candidates: call_gpt_format_selection(candidates, cluster_sizes, published_at, client, prompt_log),
+        cluster_sizes=cluster_sizes,
+    )
+
+# 改進的儲存函數：先寫入本地 news_selection_log.db，再同步到 Supabase
+def save_to_supabase(date_str: str, selection: HeadlineSelection, titles: Optional[List[str]] = None,
+                     prompts: Optional[List[dict]] = None, run_id: Optional[str] = None,
+                     model: str = "gpt-4o-mini"):
     print(f"\n📊 準備儲存 {len(selection.selections)} 則選中的新聞到 Supabase")
     print(f"📅 日期：{date_str}")
     print(f"🗄️ 表格：selected_news")
     print("-" * 50)
     
-    success_count = 0
-    error_count = 0
-    
+    rows = build_rows(date_str, selection)
     for i, item in enumerate(selection.selections, 1):
-        try:
-            data = {
-                "id": str(uuid4()),
-                "date": date_str,
-                "title": item.title,
-                "reason": item.reason,
-                "writing_direction": item.writing_direction,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            print(f"\n📝 第 {i} 則新聞：")
-            print(f"   標題：{item.title[:60]}{'...' if len(item.title) > 60 else ''}")
-            print(f"   理由：{item.reason[:60]}{'...' if len(item.reason) > 60 else ''}")
-            print(f"   方向：{item.writing_direction[:60]}{'...' if len(item.writing_direction) > 60 else ''}")
-            
-            # 執行插入
-            res = supabase.table("selected_news").insert(data).execute()
-            
-            # Supabase 成功插入時檢查 data 是否存在
-            if hasattr(res, 'data') and res.data:
-                print(f"   ✅ 儲存成功！ID: {data['id'][:8]}...")
-                success_count += 1
-            else:
-                print(f"   ⚠️ 儲存可能失敗，回應：{res}")
-                error_count += 1
-                
-        except Exception as e:
-            print(f"   ❌ 儲存失敗：{e}")
-            error_count += 1
+        print(f"\n📝 第 {i} 則新聞：")
+        print(f"   標題：{item.title[:60]}{'...' if len(item.title) > 60 else ''}")
+        print(f"   理由：{item.reason[:60]}{'...' if len(item.reason) > 60 else ''}")
+        print(f"   方向：{item.writing_direction[:60]}{'...' if len(item.writing_direction) > 60 else ''}")
+    
+    # 整批一次送出，只重試失敗的資料列；同步失敗的資料列留在本地，下次執行或 local_store.py sync 時重送
+    print(f"\n🚚 批次寫入 {len(rows)} 筆...")
+    statuses = save_rows(get_supabase_client(), date_str, rows, titles, prompts, source="gpt", model=model,
+                         run_id=run_id)
+    for i, status in enumerate(statuses, 1):
+        if status["existed"]:
+            print(f"   ♻️ 第 {i} 則先前已儲存，略過。ID: {status['id'][:8]}...")
+        elif status["ok"]:
+            print(f"   ✅ 第 {i} 則儲存成功！ID: {status['id'][:8]}...")
+        else:
+            print(f"   ❌ 第 {i} 則儲存失敗（嘗試 {status['attempts']} 次）：{status['error']}")
+    
+    success_count = sum(1 for status in statuses if status["ok"])
+    error_count = len(statuses) - success_count
     
     print("-" * 50)
     print(f"📈 儲存結果：成功 {success_count} 則，失敗 {error_count} 則")
@@ -230,6 +253,22 @@ def save_to_supabase(date_str: str, selection: HeadlineSelection):
     if success_count > 0:
         print(f"🎉 資料已儲存到 Supabase 表格 'selected_news'")
         print(f"📅 可以在資料庫中查詢日期 '{date_str}' 的記錄")
+    
+    return statuses
+
+def carry_prior_selection(local_store, date_str: str, titles: Optional[List[str]] = None):
+    """增量模式沒有新標題時，把最近一次的選稿結果沿用為 date_str 的結果（該日已有結果時不重複寫入）"""
+    if local_store.history(date_str, limit=1):
+        print(f"✅ 沒有新標題，{date_str} 已有選稿結果")
+        return None
+    prior = local_store.latest_selection()
+    if prior is None:
+        print("⚠️ 沒有新標題，也沒有先前的選稿結果可沿用")
+        return None
+    model, items = prior
+    print(f"✅ 沒有新標題，沿用先前的選稿結果作為 {date_str} 的結果")
+    selection = selection_from_items([SelectedHeadline(**item) for item in items])
+    return save_to_supabase(date_str, selection, titles, [], model=model or "gpt-4o-mini")
 
 # 查詢資料庫函數
 def check_database(date_str=None):
@@ -239,11 +278,11 @@ def check_database(date_str=None):
     try:
         if date_str:
             # 查詢特定日期
-            res = supabase.table("selected_news").select("*").eq("date", date_str).execute()
+            res = call(SUPABASE, get_supabase_client().table("selected_news").select("*").eq("date", date_str).execute)
             print(f"📅 查詢日期：{date_str}")
         else:
             # 查詢最近的資料
-            res = supabase.table("selected_news").select("*").order("created_at", desc=True).limit(10).execute()
+            res = call(SUPABASE, get_supabase_client().table("selected_news").select("*").order("created_at", desc=True).limit(10).execute)
             print("📅 查詢最近 10 筆資料")
         
         if res.data:
@@ -260,8 +299,8 @@ def check_database(date_str=None):
     except Exception as e:
         print(f"❌ 查詢資料庫失敗：{e}")
 
-# 主流程
-def main():
+# 依日本時間決定要分析的日期
+def get_target_dates() -> List[str]:
     JST = timezone(timedelta(hours=9))
     now = datetime.now(JST)
     hour_now = now.hour
@@ -280,34 +319,99 @@ def main():
             now.strftime('%Y%m%d')
         ]
         print("🌆 下午3點後，分析昨天和今天的新聞")
-    
+    return target_dates
+
+# 主流程（每次執行重新計量，結束時依 METRICS_EXPORT 輸出）
+def main():
+    metrics = get_metrics()
+    metrics.reset()
+    try:
+        _run(metrics)
+    finally:
+        export_from_env(metrics)
+
+def _run(metrics: Metrics):
+    # 排除規則的統計是整個程序共用的，每次執行重新計算
+    get_title_filter().reset_stats()
+    target_dates = get_target_dates()
     print(f"📋 目標日期：{target_dates}")
 
     all_titles = []
+    published_at = {}
     latest_date = target_dates[-1]
 
+    # 所有日期同時下載，共用同一個連線池；每個日期邊下載邊解析
+    print(f"\n📡 並行抓取 RSS：{len(target_dates)} 個日期")
+    with metrics.span("fetch", dates=len(target_dates)):
+        rss_results, rss_errors = fetch_feeds_many(target_dates)
+
     for date_str in target_dates:
-        try:
-            print(f"\n📡 抓取 RSS：{date_str}")
-            rss_xml = fetch_rss(date_str)
-            titles = parse_rss_titles(rss_xml)
-            all_titles.extend(titles)
-            print(f"   ✅ 取得 {len(titles)} 則標題")
-        except Exception as e:
-            print(f"   ⚠️ RSS {date_str} 抓取失敗：{e}")
+        if date_str in rss_errors:
+            print(f"   ⚠️ RSS {date_str} 抓取失敗：{rss_errors[date_str]}")
+            continue
+        titles = [item["title"] for item in rss_results[date_str]]
+        all_titles.extend(titles)
+        for item in rss_results[date_str]:
+            published_at.setdefault(item["title"], parse_pub_date(item["pubDate"]))
+        print(f"   ✅ {date_str} 取得 {len(titles)} 則標題")
+
+    skipped = get_title_filter().report()
+    if skipped:
+        print(f"   🚫 排除規則命中：{skipped}")
 
     if not all_titles:
         print("❌ 無新聞標題可分析")
         return
 
-    # 去重複
-    unique_titles = list(dict.fromkeys(all_titles))
-    print(f"\n🧠 開始分析，去重後共 {len(unique_titles)} 則")
+    # 相似標題分群，每群只送代表標題
+    with metrics.span("dedupe", titles=len(all_titles)):
+        clusters = cluster_titles(all_titles)
+    print(f"\n🧠 相似標題合併後共 {len(clusters)} 則（原始 {len(all_titles)} 則）")
+
+    # 前後兩次執行的日期範圍大多重疊，已處理過的標題不再送進選稿
+    local_store = get_local_store()
+    incremental = INCREMENTAL and local_store is not None
+    if incremental:
+        total = len(clusters)
+        clusters, fresh, carried = local_store.filter_seen(clusters)
+        metrics.incr("titles_new", fresh)
+        metrics.incr("titles_skipped", total - len(clusters))
+        print(f"🆕 增量模式：新標題 {fresh} 則、沿用候選 {carried} 則，略過已處理 {total - len(clusters)} 則")
+        if not fresh:
+            carry_prior_selection(local_store, latest_date, all_titles)
+            return
+
+    unique_titles = [c.representative for c in clusters]
+    cluster_sizes = {c.representative: c.size for c in clusters}
+    print(f"\n🧠 開始分析 {len(unique_titles)} 則標題")
     print(f"📊 將選出 5 則重要新聞")
     
     try:
-        result = call_gpt_format_selection(unique_titles)
-        print(f"\n✅ GPT 分析完成！選出 {len(result.selections)} 則新聞")
+        tournament = len(unique_titles) > TOURNAMENT_THRESHOLD
+        prompt_log: List[dict] = []
+        run_id = str(uuid4())
+
+        def persist_early(item):
+            print(f"   ⚡ 收到：{item.title[:50]}")
+            if local_store is not None:
+                local_store.add_rows(run_id, latest_date, build_rows(latest_date, [item]), source="gpt",
+                                     model="gpt-4o-mini")
+
+        def gpt_select(titles):
+            if len(titles) > TOURNAMENT_THRESHOLD:
+                return call_gpt_tournament_selection(titles, cluster_sizes, published_at, prompt_log=prompt_log)
+            return call_gpt_format_selection(titles, cluster_sizes, published_at, prompt_log=prompt_log,
+                                             stream=STREAM_SELECTION, on_item=persist_early)
+
+        with metrics.span("llm", titles=len(unique_titles), tournament=tournament, stream=STREAM_SELECTION,
+                          cascade=CASCADE):
+            if CASCADE:
+                # 本地模型有把握時不呼叫 GPT（CASCADE_LLM_TEXT=on 時只請 GPT 為選出的 5 則撰寫理由）
+                cascaded = cascade_select(unique_titles, gpt_select, cluster_sizes)
+                result, tier = cascaded.selection, cascaded.tier
+            else:
+                result, tier = gpt_select(unique_titles), TIER_LLM
+        print(f"\n✅ {'本地模型' if tier == TIER_LOCAL else 'GPT '}分析完成！選出 {len(result.selections)} 則新聞")
         
         # 顯示選中的新聞列表
         print("\n📋 選中的新聞：")
@@ -315,16 +419,114 @@ def main():
             print(f"{i}. {item.title}")
         
         # 儲存到資料庫
-        save_to_supabase(latest_date, result)
+        with metrics.span("insert", rows=len(result.selections)):
+            # 本地模型以範本填寫的理由以 LOCAL_REASON_PREFIX 開頭，runs.model 記錄回答的層級
+            save_to_supabase(latest_date, result, all_titles, prompt_log, run_id, TIER_MODELS[tier])
+        if incremental:
+            # 結果已寫入本地紀錄後才標記，選稿失敗時下次仍會重新處理這些標題
+            local_store.mark_seen([t for c in clusters for t in c.members], [item.title for item in result.selections])
         
         # 執行完畢後檢查資料庫
         print("\n" + "="*60)
-        check_database(latest_date)
+        with metrics.span("verify"):
+            check_database(latest_date)
+
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            print(f"\n💾 LLM 快取：{llm_cache.stats()}")
+        if local_store is not None:
+            print(f"🗃️ 本地紀錄：{local_store.stats()}")
         
     except Exception as e:
         print(f"❌ GPT 或儲存階段錯誤：{e}")
         import traceback
         traceback.print_exc()
 
+# 非同步主流程：抓取、GPT、寫入與驗證都不阻塞彼此
+async def main_async():
+    metrics = get_metrics()
+    metrics.reset()
+    try:
+        await _run_async(metrics)
+    finally:
+        export_from_env(metrics)
+
+async def _run_async(metrics: Metrics):
+    import asyncio
+    from async_pipeline import close_async_clients, create_async_clients, run_pipeline
+
+    target_dates = get_target_dates()
+    print(f"📋 目標日期：{target_dates}")
+
+    http, openai_client, supabase_client = await create_async_clients()
+
+    prompt_log: List[dict] = []
+
+    async def select(titles, cluster_sizes, published_at):
+        if len(titles) > TOURNAMENT_THRESHOLD:
+            # 淘汰賽本身已平行呼叫，放到執行緒中沿用同步版本
+            return await asyncio.to_thread(call_gpt_tournament_selection, titles, cluster_sizes, published_at,
+                                           prompt_log=prompt_log)
+        return await call_gpt_format_selection_async(openai_client, titles, cluster_sizes, published_at, prompt_log)
+
+    try:
+        result = await run_pipeline(target_dates, http, supabase_client, select, metrics=metrics,
+                                    prompts=prompt_log, source="gpt")
+    except Exception as e:
+        print(f"❌ GPT 或儲存階段錯誤：{e}")
+        import traceback
+        traceback.print_exc()
+        return
+    finally:
+        await close_async_clients(http, openai_client)
+
+    if result["selection"] is None:
+        print("❌ 無新聞標題可分析")
+        return
+
+    print("\n📋 選中的新聞：")
+    for i, item in enumerate(result["selection"].selections, 1):
+        print(f"{i}. {item.title}")
+
+    for i, status in enumerate(result["statuses"], 1):
+        if status["existed"]:
+            print(f"   ♻️ 第 {i} 則先前已儲存，略過。ID: {status['id'][:8]}...")
+        elif status["ok"]:
+            print(f"   ✅ 第 {i} 則儲存成功！ID: {status['id'][:8]}...")
+        else:
+            print(f"   ❌ 第 {i} 則儲存失敗（嘗試 {status['attempts']} 次）：{status['error']}")
+    print(f"🔍 驗證：資料庫中讀回 {len(result['records'])} 筆記錄")
+
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        print(f"\n💾 LLM 快取：{llm_cache.stats()}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="日本新聞選稿")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="使用非同步流程")
+    parser.add_argument("--stream", action="store_true", help="串流選稿（同 LLM_STREAM=on）")
+    parser.add_argument("--incremental", action="store_true", help="只送新標題與上次的候選（同 INCREMENTAL=on）")
+    parser.add_argument("--full", action="store_true", help="重新處理所有標題（覆蓋 INCREMENTAL=on）")
+    parser.add_argument("--cascade", action="store_true", help="本地模型有把握時不呼叫 GPT（同 CASCADE=on）")
+    parser.add_argument("--metrics", choices=["prometheus", "jsonl"], help="執行結束後輸出量測結果")
+    parser.add_argument("--metrics-out", help="量測結果附加寫入的檔案（預設輸出到終端機）")
+    args = parser.parse_args()
+    if args.metrics:
+        os.environ["METRICS_EXPORT"] = args.metrics
+    if args.metrics_out:
+        os.environ["METRICS_OUT"] = args.metrics_out
+    if args.stream:
+        STREAM_SELECTION = True
+    if args.incremental:
+        INCREMENTAL = True
+    if args.full:
+        INCREMENTAL = False
+    if args.cascade:
+        CASCADE = True
+
+    if args.use_async:
+        import asyncio
+        asyncio.run(main_async())
+    else:
+        main()
\ No newline at end of file
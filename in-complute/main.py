@@ -4,88 +4,164 @@ from dotenv import load_dotenv
 # 載入 .env 檔案中的環境變數
 load_dotenv()
 import sys
-import subprocess
 import requests
-import xml.etree.ElementTree as ET
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from supabase import create_client, Client
-
-# 🛠️ 自動安裝所需套件
-def ensure_package(pkg):
-    try:
-        __import__(pkg)
-    except ImportError:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", pkg])
-
-for p in ['ollama', 'supabase']:
-    ensure_package(p)
-
-import ollama
-from supabase import create_client
+from pathlib import Path
+
+# 共用模組位於專案根目錄
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from feed_sources import fetch_feeds_many
+from metrics import export_from_env, get_metrics
+from resilience import RETRYABLE_STATUSES, RetryableStatus, SINGLE_ATTEMPT, call, clamp_timeout
+from title_dedupe import cluster_titles
+
+# 🧠 本地模型設定
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+LOCAL_MODEL = os.getenv("LOCAL_MODEL", "llama4:128x17b")
+# 模型在兩次執行之間常駐記憶體的時間（ollama keep_alive 格式，例如 30m；-1 表示不卸載）
+KEEP_ALIVE = os.getenv("LOCAL_KEEP_ALIVE", "30m")
+# 設定後改用 OpenAI 相容的本地服務（llama.cpp server、vLLM、ollama 的 /v1 等）
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL")
+LOCAL_LLM_TIMEOUT = float(os.getenv("LOCAL_LLM_TIMEOUT", "300"))
+# 標題超過 SHARD_SIZE 則時分組平行初選，每組選出 SHORTLIST_SIZE 則後再決選
+SHARD_SIZE = int(os.getenv("LOCAL_SHARD_SIZE", "100"))
+SHORTLIST_SIZE = int(os.getenv("LOCAL_SHORTLIST_SIZE", "5"))
+MAX_CONCURRENCY = int(os.getenv("LOCAL_CONCURRENCY", "4"))
+DEPENDENCY = "ollama"
+
+# 說明放在標題之前，各組請求共用相同開頭，本地服務可重用提示詞快取
+SYSTEM_PROMPT = (
+    "你是為台灣製作國際新聞的日本觀察站編輯。選稿標準：增進台灣對日本政治、經濟、外交與文化的理解；"
+    "對美中台關係有參考價值；有助於在台海情勢中建立對日認知。只回傳 JSON。"
+)
+SHORTLIST_PROMPT = '從下列標題選出最值得報導的 {k} 則，回傳 {{"ids": [編號, ...]}}。\n新聞標題：\n'
+SELECTION_PROMPT = (
+    '從下列標題選出最值得報導的 5 則，回傳 '
+    '{"selections": [{"id": 編號, "reason": "選擇原因", "writing_direction": "寫作方向與角度"}]}。\n新聞標題：\n'
+)
+
+_session = requests.Session()
+_openai_client = None
+_supabase = None
+
+# 🔐 Supabase 在第一次寫入時才建立連線
+def get_supabase():
+    global _supabase
+    if _supabase is None:
+        from supabase import create_client
+        _supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    return _supabase
+
+def _get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        from openai import OpenAI
+        _openai_client = OpenAI(base_url=LOCAL_LLM_BASE_URL, api_key=os.getenv("LOCAL_LLM_API_KEY", "local"),
+                                max_retries=0)
+    return _openai_client
+
+def _request(method, path, timeout, **kwargs):
+    res = _session.request(method, f"{OLLAMA_HOST}{path}", timeout=clamp_timeout(timeout), **kwargs)
+    if res.status_code in RETRYABLE_STATUSES:
+        raise RetryableStatus(res.status_code, f"ollama 錯誤：{res.status_code}")
+    res.raise_for_status()
+    return res.json()
 
-# 🧠 確保 llama4 模型存在
+# 🧠 透過 API 確認模型存在（不啟動 ollama CLI），缺少時才下載
 def ensure_llama_model():
-    result = subprocess.run(["ollama", "list"], capture_output=True, text=True)
-    if "llama4:128x17b" not in result.stdout:
-        print("⬇️ Pull llama4:128x17b...")
-        subprocess.run(["ollama", "pull", "llama4:128x17b"], check=True)
-
-# 🔐 Supabase 初始化
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# 🌐 抓取 RSS
-def fetch_rss(date_str):
-    url = f"https://japan-news-get.netlify.app/rss?date={date_str}"
-    res = requests.get(url)
-    res.raise_for_status()
-    return res.text
+    if LOCAL_LLM_BASE_URL:
+        models = call(DEPENDENCY, lambda: _get_openai_client().models.list())
+        if LOCAL_MODEL not in {m.id for m in models.data}:
+            print(f"⚠️ 本地服務未列出 {LOCAL_MODEL}，仍嘗試呼叫")
+        return
+    tags = call(DEPENDENCY, _request, "GET", "/api/tags", 5)
+    if LOCAL_MODEL not in {m.get("name") for m in tags.get("models", [])}:
+        print(f"⬇️ Pull {LOCAL_MODEL}...")
+        call(DEPENDENCY, _request, "POST", "/api/pull", None, json={"model": LOCAL_MODEL, "stream": False},
+             policy=SINGLE_ATTEMPT)
+
+# 🤖 呼叫 LLM（ollama 原生 API 附上 keep_alive，模型留在記憶體供下次執行使用）
+def chat(prompt):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+    if LOCAL_LLM_BASE_URL:
+        res = call(DEPENDENCY, lambda: _get_openai_client().chat.completions.create(
+            model=LOCAL_MODEL, messages=messages, temperature=0.3,
+            response_format={"type": "json_object"}, timeout=clamp_timeout(LOCAL_LLM_TIMEOUT)))
+        return res.choices[0].message.content
+    res = call(DEPENDENCY, _request, "POST", "/api/chat", LOCAL_LLM_TIMEOUT, json={
+        "model": LOCAL_MODEL,
+        "messages": messages,
+        "stream": False,
+        "format": "json",
+        "keep_alive": KEEP_ALIVE,
+        "options": {"temperature": 0.3},
+    })
+    return res["message"]["content"]
 
-def parse_titles(rss_xml):
-    root = ET.fromstring(rss_xml)
-    items = root.findall(".//item")
-    titles = []
-    for item in items:
-        title = item.find("title").text.strip()
-        if any(skip in title for skip in ["Yahoo Japan トップニュース", "地震情報"]):
-            continue
-        titles.append(title)
-    return titles
-
-# 🤖 呼叫 LLM
+# 📝 精簡提示詞：一行一則、以編號代替標題，回應只需要編號
+def numbered(titles):
+    return "\n".join(f"{i} {title}" for i, title in enumerate(titles, 1))
+
+def _pick(value, titles):
+    try:
+        index = int(value)
+    except (TypeError, ValueError):
+        return None
+    return titles[index - 1] if 1 <= index <= len(titles) else None
+
+def shortlist(titles, k=SHORTLIST_SIZE):
+    data = json.loads(chat(SHORTLIST_PROMPT.format(k=k) + numbered(titles)))
+    picked = [_pick(i, titles) for i in (data.get("ids", []) if isinstance(data, dict) else [])]
+    picked = list(dict.fromkeys(t for t in picked if t))
+    if not picked:
+        raise ValueError("初選回應中沒有任何有效編號")
+    return picked[:k]
+
+def select(titles):
+    data = json.loads(chat(SELECTION_PROMPT + numbered(titles)))
+    selections = []
+    for item in (data.get("selections", []) if isinstance(data, dict) else []):
+        title = _pick(item.get("id"), titles) if isinstance(item, dict) else None
+        if title and title not in {s["title"] for s in selections}:
+            selections.append({
+                "title": title,
+                "reason": item.get("reason", ""),
+                "writing_direction": item.get("writing_direction", ""),
+            })
+    if not selections:
+        raise ValueError("決選回應中沒有任何有效編號")
+    return {"selections": selections[:5]}
+
+# 🏆 標題多時分組平行初選，再從候選中決選
 def analyze_titles(titles):
-    prompt = f"""
-你是一位為臺灣製作國際新聞的日本觀察站新聞編輯。請從下列日本新聞標題中選出最值得報導的5則：
-
-標題如下：
-{json.dumps(titles, ensure_ascii=False, indent=2)}
-
-選擇標準如下：
-- 增進台灣人對日本的政治、經濟、外交與文化理解
-- 對於理解美中台關係有參考價值
-- 在可能的台海衝突中，有助於建立對日認知與因應策略
-
-請輸出 JSON 格式，包含：
-1. 選出的5個標題
-2. 為何選擇（每個簡要說明）
-3. 每則建議的寫作方向與角度
-"""
-    res = ollama.chat(
-        model="llama4:128x17b",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return res["message"]["content"]
+    candidates = [c.representative for c in cluster_titles(titles)]
+    if len(candidates) > SHARD_SIZE:
+        shard_count = -(-len(candidates) // SHARD_SIZE)
+        shards = [candidates[i::shard_count] for i in range(shard_count)]
+        print(f"🏆 {len(candidates)} 則標題分成 {shard_count} 組平行初選")
+
+        def run(shard):
+            try:
+                return shortlist(shard)
+            except Exception as e:
+                print(f"⚠️ 分組初選失敗，以前 {SHORTLIST_SIZE} 則遞補：{e}")
+                return shard[:SHORTLIST_SIZE]
+
+        with ThreadPoolExecutor(max_workers=max(1, MAX_CONCURRENCY)) as executor:
+            candidates = [t for picked in executor.map(run, shards) for t in picked]
+    return select(candidates)
 
 # 💾 寫入 Supabase
 def store_to_supabase(date_str, source, result):
-    supabase.table("rss_selection_log").insert({
+    # insert 重送可能產生重複資料，只經過斷路器與截止時間檢查，不自動重試
+    call("supabase", get_supabase().table("rss_selection_log").insert({
         "date": date_str,
         "source": source,
-        "result": json.loads(result),
+        "result": result,
         "fetched_at": datetime.utcnow().isoformat()
-    }).execute()
+    }).execute, policy=SINGLE_ATTEMPT)
 
 # 📤 發送 Webhook
 def send_webhook(result_json):
@@ -94,42 +170,55 @@ def send_webhook(result_json):
         print("⚠️ 未設定 WEBHOOK_URL")
         return
     try:
-        requests.post(webhook_url, json=result_json)
+        call("webhook", lambda: requests.post(webhook_url, json=result_json, timeout=clamp_timeout(10)),
+             policy=SINGLE_ATTEMPT)
         print("✅ Webhook 已送出")
     except Exception as e:
         print("❌ Webhook 發送錯誤：", str(e))
 
-# 🧭 主流程
+# 🧭 主流程（結束時依 METRICS_EXPORT 輸出量測結果）
 def main():
-    ensure_llama_model()
+    metrics = get_metrics()
+    metrics.reset()
+    try:
+        run(metrics)
+    finally:
+        export_from_env(metrics)
+
+def run(metrics):
+    with metrics.span("startup"):
+        ensure_llama_model()
     JST = timezone(timedelta(hours=9))
     today = datetime.now(JST).strftime('%Y%m%d')
     yesterday = (datetime.now(JST) - timedelta(days=1)).strftime('%Y%m%d')
 
     titles = []
-    for d in [yesterday, today]:
-        try:
-            xml = fetch_rss(d)
-            titles += parse_titles(xml)
-        except Exception as e:
-            print(f"⚠️ RSS {d} 讀取失敗：{e}")
+    with metrics.span("fetch", dates=2):
+        rss_results, rss_errors = fetch_feeds_many([yesterday, today])
+    for d, e in rss_errors.items():
+        print(f"⚠️ RSS {d} 讀取失敗：{e}")
+    for d, items in rss_results.items():
+        titles += [item["title"] for item in items]
 
     if not titles:
         print("❌ 沒有可用標題")
         return
 
     print("🤖 分析中...")
-    llm_result = analyze_titles(titles)
+    with metrics.span("llm", titles=len(titles)):
+        llm_result = analyze_titles(titles)
 
     print("📦 儲存中...")
-    store_to_supabase(today, "rss", llm_result)
+    with metrics.span("insert"):
+        store_to_supabase(today, "rss", llm_result)
 
     print("📡 傳送通知...")
-    send_webhook({
-        "date": today,
-        "source": "rss",
-        "llm_result": json.loads(llm_result)
-    })
+    with metrics.span("webhook"):
+        send_webhook({
+            "date": today,
+            "source": "rss",
+            "llm_result": llm_result
+        })
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,247 @@
+# llm_cache.py
+"""
+LLM 回應快取（SQLite）
+以模型、溫度、回應格式、所有訊息與標題順序的雜湊為鍵，相同提示詞直接回傳先前的結果，
+手動重新觸發或儲存失敗後重跑都不必再付費呼叫。
+支援 TTL 與筆數上限（依最近使用時間淘汰），並記錄命中 / 未命中次數。
+未命中時的 API 呼叫經由 resilience 重試，單次逾時不超過截止時間。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Iterator, List, Optional
+
+from metrics import get_metrics
+from resilience import call, call_async, clamp_timeout
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / ".llm_cache.sqlite"
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+# 單次 chat completions 請求的逾時（秒）
+DEFAULT_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", "60"))
+DEPENDENCY = "openai"
+
+# 代表「使用預設快取」的標記
+_DEFAULT_CACHE = object()
+
+
+class LLMCache:
+    """以提示詞指紋為鍵的回應快取（執行緒安全）"""
+
+    def __init__(self, path=None, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path or DEFAULT_CACHE_PATH)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: List[dict], temperature: Optional[float] = None,
+                 response_format: Optional[dict] = None, titles: Optional[List[str]] = None) -> str:
+        """提示詞指紋：模型、溫度、回應格式、所有訊息與標題順序"""
+        payload = json.dumps(
+            {
+                "model": model,
+                "temperature": temperature,
+                "response_format": response_format,
+                "messages": messages,
+                "titles": titles,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, content: str, model: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, content, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """刪除過期資料，並依最近使用時間保留 max_entries 筆（呼叫前需持有鎖）"""
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """取得預設快取；設定 LLM_CACHE=off 可停用，LLM_CACHE_PATH 指定檔案位置"""
+    global _default_cache
+    if os.environ.get("LLM_CACHE", "on").lower() in ("0", "off", "false"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(
+                os.environ.get("LLM_CACHE_PATH"),
+                ttl=float(os.environ.get("LLM_CACHE_TTL", DEFAULT_TTL)),
+            )
+    return _default_cache
+
+
+def _record_response(response, model: str, seconds: float):
+    """記錄呼叫耗時與 token 用量"""
+    metrics = get_metrics()
+    metrics.incr("llm_requests", model=model)
+    metrics.observe("llm_request_seconds", seconds, model=model)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.incr("llm_prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0, model=model)
+        metrics.incr("llm_completion_tokens", getattr(usage, "completion_tokens", 0) or 0, model=model)
+
+
+def cached_chat_completion(client, model: str, messages: List[dict], temperature: Optional[float] = None,
+                           response_format: Optional[dict] = None, titles: Optional[List[str]] = None,
+                           validate: Optional[Callable[[str], object]] = None,
+                           cache=_DEFAULT_CACHE) -> str:
+    """
+    呼叫 chat.completions.create 並回傳訊息內容，相同提示詞直接讀取快取。
+    有 validate 時，只有通過驗證的回應才會寫入快取，避免把格式錯誤的結果存起來。
+    """
+    if cache is _DEFAULT_CACHE:
+        cache = get_llm_cache()
+
+    key = LLMCache.make_key(model, messages, temperature, response_format, titles)
+    if cache is not None:
+        content = cache.get(key)
+        if content is not None:
+            get_metrics().incr("llm_cache_hits")
+            print("💾 使用 LLM 快取結果")
+            return content
+
+    kwargs = {"model": model, "messages": messages}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    started = time.perf_counter()
+    response = call(DEPENDENCY, lambda: client.chat.completions.create(
+        **kwargs, timeout=clamp_timeout(DEFAULT_REQUEST_TIMEOUT)))
+    _record_response(response, model, time.perf_counter() - started)
+    content = response.choices[0].message.content
+
+    if cache is not None:
+        if validate is not None:
+            validate(content)
+        cache.put(key, content, model)
+    return content
+
+
+async def cached_chat_completion_async(client, model: str, messages: List[dict], temperature: Optional[float] = None,
+                                       response_format: Optional[dict] = None, titles: Optional[List[str]] = None,
+                                       validate: Optional[Callable[[str], object]] = None,
+                                       cache=_DEFAULT_CACHE) -> str:
+    """cached_chat_completion 的非同步版本（AsyncOpenAI）；快取讀寫在本地 SQLite，耗時可忽略"""
+    if cache is _DEFAULT_CACHE:
+        cache = get_llm_cache()
+
+    key = LLMCache.make_key(model, messages, temperature, response_format, titles)
+    if cache is not None:
+        content = cache.get(key)
+        if content is not None:
+            get_metrics().incr("llm_cache_hits")
+            print("💾 使用 LLM 快取結果")
+            return content
+
+    kwargs = {"model": model, "messages": messages}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    started = time.perf_counter()
+    response = await call_async(DEPENDENCY, lambda: client.chat.completions.create(
+        **kwargs, timeout=clamp_timeout(DEFAULT_REQUEST_TIMEOUT)))
+    _record_response(response, model, time.perf_counter() - started)
+    content = response.choices[0].message.content
+
+    if cache is not None:
+        if validate is not None:
+            validate(content)
+        cache.put(key, content, model)
+    return content
+
+
+def stream_chat_completion(client, model: str, messages: List[dict], temperature: Optional[float] = None,
+                           response_format: Optional[dict] = None) -> Iterator[str]:
+    """
+    以串流呼叫 chat.completions.create，逐段產出回應文字（不經過快取，由呼叫端決定是否寫入）。
+    resilience 只重試建立串流的請求；串流結束或中斷時記錄耗時與 token 用量。
+    """
+    kwargs = {"model": model, "messages": messages, "stream": True, "stream_options": {"include_usage": True}}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+    started = time.perf_counter()
+    stream = call(DEPENDENCY, lambda: client.chat.completions.create(
+        **kwargs, timeout=clamp_timeout(DEFAULT_REQUEST_TIMEOUT)))
+    usage = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+        _record_response(SimpleNamespace(usage=usage), model, time.perf_counter() - started)
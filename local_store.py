@@ -0,0 +1,463 @@
+# local_store.py
+"""
+本地 SQLite 預寫儲存（news_selection_log.db，預設位於 $XDG_STATE_HOME/auto_pick_news/，LOCAL_STORE_PATH 可指定）
+每次執行先把原始標題、提示詞與選稿結果寫入本地（WAL 模式，寫入不到 1 ms），
+再由同步步驟把尚未同步的資料列分批送到 Supabase；寫入失敗時 GPT 結果不會遺失，之後重新同步即可。
+save_rows 只同步本次執行的資料列，先前失敗的資料列由 `python local_store.py sync` 重送；
+同步以鎖序列化，多個執行緒不會重複送出同一批資料列。平行回補則由工作執行緒以 record_rows 寫入本地，
+全部完成後再以 sync_rows 一次同步。
+也可以離線查詢歷史選稿，不必往返 Supabase。
+串流選稿時每則結果一通過驗證就以 add_rows 寫入，之後 save_rows 再以同一個 run_id 補上完整紀錄。
+seen_titles 記錄已送進選稿的標題（以正規化標題的雜湊為鍵），增量執行時只送新標題與上次選出的候選。
+版本庫中的 news_selection_log.db 是舊版的 selection_log 紀錄，只作為唯讀的初始資料：
+第一次開啟本地紀錄時轉入 runs / selected_news（視為已同步，不重送到 Supabase），之後不再讀取也不會寫入該檔。
+
+用法：
+    python local_store.py sync                 # 把尚未同步的資料列送到 Supabase
+    python local_store.py history --date 20240101
+    python local_store.py stats
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4, uuid5
+
+from news_store import ID_NAMESPACE, TABLE, bulk_insert, selection_id
+from title_dedupe import TitleCluster, title_hash
+
+
+def _default_db_path() -> Path:
+    """預設位置在工作目錄之外（XDG_STATE_HOME，未設定時為 ~/.local/state），避免把執行紀錄提交進版本庫"""
+    state_home = os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state"
+    return Path(state_home) / "auto_pick_news" / "news_selection_log.db"
+
+
+DEFAULT_DB_PATH = _default_db_path()
+# 舊版 selection_log 紀錄（隨版本庫提供，唯讀）
+LEGACY_DB_PATH = Path(__file__).resolve().parent / "news_selection_log.db"
+# PRAGMA user_version：1 代表已轉入舊版紀錄
+_LEGACY_MIGRATED = 1
+DEFAULT_SYNC_BATCH_SIZE = 100
+# 已處理標題保留的天數（超過目標日期範圍即可）
+SEEN_RETENTION_DAYS = int(os.environ.get("SEEN_RETENTION_DAYS", "7"))
+# 單次 IN 查詢的參數數量（低於 SQLite 的變數上限）
+_QUERY_CHUNK = 500
+
+# selected_news 的欄位（同步時送出的內容）
+ROW_COLUMNS = ("id", "date", "title", "reason", "writing_direction", "created_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    source TEXT NOT NULL,
+    model TEXT,
+    created_at TEXT NOT NULL,
+    titles_json TEXT,
+    prompts_json TEXT,
+    selection_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_date ON runs(date);
+
+CREATE TABLE IF NOT EXISTS selected_news (
+    id TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs(id),
+    date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    reason TEXT,
+    writing_direction TEXT,
+    created_at TEXT NOT NULL,
+    synced_at TEXT,
+    sync_attempts INTEGER NOT NULL DEFAULT 0,
+    sync_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_selected_news_date ON selected_news(date);
+CREATE INDEX IF NOT EXISTS idx_selected_news_title ON selected_news(title);
+CREATE INDEX IF NOT EXISTS idx_selected_news_pending ON selected_news(created_at) WHERE synced_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS seen_titles (
+    hash TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    candidate INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_seen_titles_last_seen ON seen_titles(last_seen);
+"""
+
+# 固定的 SQL 字串，sqlite3 會快取編譯後的語句重複使用
+# 同一個 run_id 先以 add_rows 建立時，完成後補上模型、標題、提示詞與完整結果
+_INSERT_RUN = (
+    "INSERT INTO runs (id, date, source, model, created_at, titles_json, prompts_json, selection_json) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET model = COALESCE(excluded.model, runs.model), "
+    "titles_json = excluded.titles_json, prompts_json = excluded.prompts_json, selection_json = excluded.selection_json"
+)
+_START_RUN = (
+    "INSERT INTO runs (id, date, source, model, created_at) VALUES (?, ?, ?, ?, ?) ON CONFLICT(id) DO NOTHING"
+)
+# 同一則新聞重跑時保留原本的同步狀態
+_INSERT_ROW = (
+    "INSERT INTO selected_news (id, run_id, date, title, reason, writing_direction, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO NOTHING"
+)
+_SELECT_PENDING = (
+    "SELECT id, date, title, reason, writing_direction, created_at FROM selected_news "
+    "WHERE synced_at IS NULL ORDER BY created_at LIMIT ?"
+)
+_MARK_SYNCED = "UPDATE selected_news SET synced_at = ?, sync_attempts = sync_attempts + 1, sync_error = NULL WHERE id = ?"
+_MARK_FAILED = "UPDATE selected_news SET sync_attempts = sync_attempts + 1, sync_error = ? WHERE id = ?"
+# candidate 只反映最近一次送進選稿時是否被選中
+_UPSERT_SEEN = (
+    "INSERT INTO seen_titles (hash, title, first_seen, last_seen, candidate) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(hash) DO UPDATE SET last_seen = excluded.last_seen, candidate = excluded.candidate"
+)
+_PRUNE_SEEN = "DELETE FROM seen_titles WHERE last_seen < ?"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_legacy_selection(selected_json: str) -> List[dict]:
+    """
+    舊版 selection_log.selected_json（可能包在 ```json 區塊中）轉成 title / reason / writing_direction 清單：
+    {"選出的標題": [...], "選擇理由": [...], "建議寫作方向與角度": [{"標題", "寫作方向"}]}
+    """
+    data = json.loads(_FENCE_RE.sub("", selected_json.strip()))
+    titles = data.get("選出的標題") or []
+    reasons = data.get("選擇理由") or []
+    directions = {entry.get("標題"): entry.get("寫作方向") for entry in data.get("建議寫作方向與角度") or []
+                  if isinstance(entry, dict)}
+    return [{"title": title, "reason": reasons[i] if i < len(reasons) else None,
+             "writing_direction": directions.get(title)}
+            for i, title in enumerate(titles) if isinstance(title, str) and title.strip()]
+
+
+class LocalStore:
+    """本地選稿紀錄（執行緒安全）"""
+
+    def __init__(self, path=None, seed=LEGACY_DB_PATH):
+        self.path = Path(path or DEFAULT_DB_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 整個同步過程（讀取待同步 → 送出 → 標記結果）持有此鎖，避免兩個執行緒送出同一批資料列
+        self._sync_lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, cached_statements=64)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 已能保證資料庫一致，只有斷電時可能遺失最後一筆交易
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._migrate_legacy(seed)
+
+    def _legacy_rows(self, seed) -> List[sqlite3.Row]:
+        """舊版紀錄：本檔案內的 selection_log（直接開啟舊檔時），否則讀取唯讀的 seed 檔"""
+        query = "SELECT id, date, fetched_at, selected_json FROM selection_log ORDER BY id"
+        has_table = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'selection_log'"
+        if self._conn.execute(has_table).fetchone():
+            return self._conn.execute(query).fetchall()
+        if not seed or not Path(seed).exists() or Path(seed).resolve() == self.path.resolve():
+            return []
+        legacy = sqlite3.connect(f"{Path(seed).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            return legacy.execute(query).fetchall() if legacy.execute(has_table).fetchone() else []
+        finally:
+            legacy.close()
+
+    def _migrate_legacy(self, seed):
+        """第一次開啟時把舊版 selection_log 轉入 runs / selected_news；以 user_version 記錄，只執行一次"""
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] >= _LEGACY_MIGRATED:
+            return
+        migrated = 0
+        with self._lock, self._conn:
+            for legacy_id, date_str, fetched_at, selected_json in self._legacy_rows(seed):
+                try:
+                    items = parse_legacy_selection(selected_json or "")
+                except ValueError as e:
+                    print(f"⚠️ 舊版紀錄 {legacy_id}（{date_str}）無法解析，略過：{e}")
+                    continue
+                run_id = str(uuid5(ID_NAMESPACE, f"selection_log:{legacy_id}"))
+                created_at = fetched_at or _now()
+                self._conn.execute(_INSERT_RUN, (run_id, date_str, "selection_log", None, created_at, None, None,
+                                                 json.dumps(items, ensure_ascii=False)))
+                # 舊紀錄是否曾寫入 Supabase 無從得知，視為已同步，避免以新的 ID 重複寫入
+                self._conn.executemany(
+                    "INSERT INTO selected_news (id, run_id, date, title, reason, writing_direction, created_at, "
+                    "synced_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO NOTHING",
+                    [(selection_id(date_str, item["title"]), run_id, date_str, item["title"], item["reason"],
+                      item["writing_direction"], created_at, created_at) for item in items],
+                )
+                migrated += 1
+            self._conn.execute(f"PRAGMA user_version = {_LEGACY_MIGRATED}")
+        if migrated:
+            print(f"📦 已轉入 {migrated} 筆舊版 selection_log 紀錄")
+
+    def record_run(self, date_str: str, rows: List[dict], titles: Optional[List[str]] = None,
+                   prompts: Optional[List[dict]] = None, source: str = "gpt",
+                   model: Optional[str] = None, run_id: Optional[str] = None) -> str:
+        """在同一筆交易中寫入執行紀錄與選稿資料列（待同步），回傳 run_id"""
+        run_id = run_id or str(uuid4())
+        selection = [{k: row.get(k) for k in ("title", "reason", "writing_direction")} for row in rows]
+        with self._lock, self._conn:
+            self._conn.execute(_INSERT_RUN, (
+                run_id, date_str, source, model, _now(),
+                json.dumps(titles, ensure_ascii=False) if titles is not None else None,
+                json.dumps(prompts, ensure_ascii=False) if prompts is not None else None,
+                json.dumps(selection, ensure_ascii=False),
+            ))
+            self._conn.executemany(_INSERT_ROW, [
+                (row["id"], run_id, row["date"], row["title"], row.get("reason"),
+                 row.get("writing_direction"), row["created_at"])
+                for row in rows
+            ])
+        return run_id
+
+    def add_rows(self, run_id: str, date_str: str, rows: List[dict], source: str = "gpt",
+                 model: Optional[str] = None):
+        """執行尚未結束時先寫入部分資料列（待同步）；結束後以同一個 run_id 呼叫 record_run"""
+        with self._lock, self._conn:
+            self._conn.execute(_START_RUN, (run_id, date_str, source, model, _now()))
+            self._conn.executemany(_INSERT_ROW, [
+                (row["id"], run_id, row["date"], row["title"], row.get("reason"),
+                 row.get("writing_direction"), row["created_at"])
+                for row in rows
+            ])
+
+    def pending(self, limit: int = DEFAULT_SYNC_BATCH_SIZE, ids: Optional[Iterable[str]] = None) -> List[dict]:
+        """尚未同步到 Supabase 的資料列（依建立時間排序）；指定 ids 時只查這些資料列"""
+        if ids is None:
+            with self._lock:
+                return [dict(row) for row in self._conn.execute(_SELECT_PENDING, (limit,))]
+        ids = list(dict.fromkeys(ids))
+        rows: List[dict] = []
+        with self._lock:
+            for start in range(0, len(ids), _QUERY_CHUNK):
+                chunk = ids[start:start + _QUERY_CHUNK]
+                sql = (f"SELECT {', '.join(ROW_COLUMNS)} FROM selected_news "
+                       f"WHERE synced_at IS NULL AND id IN ({','.join('?' * len(chunk))})")
+                rows.extend(dict(row) for row in self._conn.execute(sql, chunk))
+        rows.sort(key=lambda row: row["created_at"])
+        return rows[:limit]
+
+    def apply_statuses(self, statuses: List[dict]):
+        """依 bulk_insert 回傳的狀態更新同步結果（已存在的資料列也視為已同步）"""
+        synced_at = _now()
+        with self._lock, self._conn:
+            self._conn.executemany(_MARK_SYNCED, [(synced_at, s["id"]) for s in statuses if s["ok"]])
+            self._conn.executemany(_MARK_FAILED, [(s["error"], s["id"]) for s in statuses if not s["ok"]])
+
+    def sync(self, supabase_client, batch_size: int = DEFAULT_SYNC_BATCH_SIZE,
+             table: str = TABLE, ids: Optional[Iterable[str]] = None) -> List[dict]:
+        """
+        分批把待同步的資料列送到 Supabase，回傳所有送出資料列的狀態。
+        指定 ids 時只送出其中尚未同步的資料列（其他執行的資料列不受影響）。
+        同一次同步中失敗的資料列不會重送（留待下次同步），避免無限重試。
+        """
+        ids = None if ids is None else list(ids)
+        statuses: List[dict] = []
+        attempted = set()
+        with self._sync_lock:
+            while True:
+                limit = batch_size + len(attempted)
+                pending = self.pending(limit) if ids is None else self.pending(limit, ids)
+                batch = [row for row in pending if row["id"] not in attempted][:batch_size]
+                if not batch:
+                    return statuses
+                result = bulk_insert(supabase_client, batch, table=table)
+                self.apply_statuses(result)
+                attempted.update(row["id"] for row in batch)
+                statuses.extend(result)
+
+    def seen_titles(self, titles: Iterable[str]) -> Dict[str, bool]:
+        """已送進選稿的標題：title_hash → 是否為上次選出的候選"""
+        hashes = list({title_hash(title) for title in titles})
+        seen: Dict[str, bool] = {}
+        with self._lock:
+            for start in range(0, len(hashes), _QUERY_CHUNK):
+                chunk = hashes[start:start + _QUERY_CHUNK]
+                sql = f"SELECT hash, candidate FROM seen_titles WHERE hash IN ({','.join('?' * len(chunk))})"
+                seen.update((row[0], bool(row[1])) for row in self._conn.execute(sql, chunk))
+        return seen
+
+    def filter_seen(self, clusters: List[TitleCluster]) -> Tuple[List[TitleCluster], int, int]:
+        """
+        只保留含有新標題或上次候選的群，回傳 (保留的群, 新標題群數, 沿用候選群數)。
+        群內其他標題已處理過時，群的大小（相似報導數）仍以完整的群計算。
+        """
+        seen = self.seen_titles(title for cluster in clusters for title in cluster.members)
+        kept, fresh, carried = [], 0, 0
+        for cluster in clusters:
+            hashes = [title_hash(title) for title in cluster.members]
+            if any(h not in seen for h in hashes):
+                kept.append(cluster)
+                fresh += 1
+            elif any(seen[h] for h in hashes):
+                kept.append(cluster)
+                carried += 1
+        return kept, fresh, carried
+
+    def mark_seen(self, titles: Iterable[str], candidates: Iterable[str] = ()):
+        """記錄本次送進選稿的標題，candidates 為選出的標題；同時清除超過保留天數的紀錄"""
+        now = _now()
+        picked = {title_hash(title) for title in candidates}
+        rows = {title_hash(title): title for title in titles}
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=SEEN_RETENTION_DAYS)).isoformat()
+        with self._lock, self._conn:
+            self._conn.executemany(_UPSERT_SEEN, [(h, title, now, now, int(h in picked)) for h, title in rows.items()])
+            self._conn.execute(_PRUNE_SEEN, (cutoff,))
+
+    def history(self, date_str: Optional[str] = None, title: Optional[str] = None,
+                limit: int = 50) -> List[dict]:
+        """離線查詢選稿紀錄；title 為部分比對"""
+        sql = "SELECT id, date, title, reason, writing_direction, created_at, synced_at, sync_error FROM selected_news"
+        clauses, params = [], []
+        if date_str:
+            clauses.append("date = ?")
+            params.append(date_str)
+        if title:
+            clauses.append("title LIKE ?")
+            params.append(f"%{title}%")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def latest_selection(self) -> Optional[Tuple[Optional[str], List[dict]]]:
+        """最近一次有選稿結果的執行：(模型, [{title, reason, writing_direction}, ...])；沒有紀錄時回傳 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT model, selection_json FROM runs WHERE selection_json IS NOT NULL AND selection_json != '[]' "
+                "ORDER BY created_at DESC LIMIT 1"
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def training_runs(self, limit: int = 500, exclude_models: Iterable[str] = ()) -> List[Tuple[List[str], List[str]]]:
+        """
+        最近的執行紀錄（送進選稿的原始標題, 選出的標題），供 cascade.py 訓練本地分類器。
+        exclude_models 的執行（例如本地模型自己回答的結果）不納入，避免以自己的輸出訓練。
+        """
+        excluded = list(exclude_models)
+        sql = "SELECT titles_json, selection_json FROM runs WHERE titles_json IS NOT NULL AND selection_json IS NOT NULL"
+        if excluded:
+            sql += f" AND COALESCE(model, '') NOT IN ({','.join('?' * len(excluded))})"
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, excluded + [limit]).fetchall()
+        runs = []
+        for titles_json, selection_json in rows:
+            picked = [item["title"] for item in json.loads(selection_json) if item.get("title")]
+            if picked:
+                runs.append((json.loads(titles_json), picked))
+        return runs
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            runs = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            total, pending = self._conn.execute(
+                "SELECT COUNT(*), COUNT(*) - COUNT(synced_at) FROM selected_news"
+            ).fetchone()
+            seen = self._conn.execute("SELECT COUNT(*) FROM seen_titles").fetchone()[0]
+        return {"runs": runs, "rows": total, "pending": pending or 0, "seen_titles": seen}
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_local_store() -> Optional[LocalStore]:
+    """取得預設本地儲存；設定 LOCAL_STORE=off 可停用，LOCAL_STORE_PATH 指定檔案位置"""
+    global _default_store
+    if os.environ.get("LOCAL_STORE", "on").lower() in ("0", "off", "false"):
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = LocalStore(os.environ.get("LOCAL_STORE_PATH"))
+    return _default_store
+
+
+def record_rows(date_str: str, rows: List[dict], titles: Optional[List[str]] = None,
+                prompts: Optional[List[dict]] = None, source: str = "gpt",
+                model: Optional[str] = None, run_id: Optional[str] = None):
+    """只寫入本地（待同步），之後以 sync_rows 送出；未啟用本地儲存時不做任何事"""
+    store = get_local_store()
+    if store is not None:
+        store.record_run(date_str, rows, titles, prompts, source, model, run_id)
+
+
+def sync_rows(supabase_client, rows: List[dict]) -> List[dict]:
+    """
+    把這些資料列同步到 Supabase，回傳各列狀態（格式同 bulk_insert、順序與輸入相同）。
+    只送出其中尚未同步的資料列，先前失敗、仍待同步的其他資料列留給 `python local_store.py sync`。
+    未啟用本地儲存時直接寫入 Supabase。
+    """
+    store = get_local_store()
+    if store is None:
+        return bulk_insert(supabase_client, rows)
+    by_id = {status["id"]: status for status in store.sync(supabase_client, ids=[row["id"] for row in rows])}
+    # 本次資料列若先前已同步（本地重跑），視為已存在
+    return [
+        by_id.get(row["id"]) or {"id": row["id"], "title": row["title"], "ok": True,
+                                 "existed": True, "error": None, "attempts": 0}
+        for row in rows
+    ]
+
+
+def save_rows(supabase_client, date_str: str, rows: List[dict], titles: Optional[List[str]] = None,
+              prompts: Optional[List[dict]] = None, source: str = "gpt",
+              model: Optional[str] = None, run_id: Optional[str] = None) -> List[dict]:
+    """
+    先寫入本地再同步到 Supabase，回傳本次資料列的狀態（record_rows 加上 sync_rows）。
+    run_id 為先前 add_rows 使用的 ID（串流選稿時）。
+    """
+    record_rows(date_str, rows, titles, prompts, source, model, run_id)
+    return sync_rows(supabase_client, rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="本地選稿紀錄")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync_parser = sub.add_parser("sync", help="把尚未同步的資料列送到 Supabase")
+    sync_parser.add_argument("--batch-size", type=int, default=DEFAULT_SYNC_BATCH_SIZE)
+    history_parser = sub.add_parser("history", help="查詢選稿紀錄")
+    history_parser.add_argument("--date")
+    history_parser.add_argument("--title")
+    history_parser.add_argument("--limit", type=int, default=50)
+    sub.add_parser("stats", help="顯示本地紀錄數量")
+    args = parser.parse_args(argv)
+
+    store = LocalStore(os.environ.get("LOCAL_STORE_PATH"))
+    if args.command == "sync":
+        from gpt import get_supabase_client
+        started = time.perf_counter()
+        statuses = store.sync(get_supabase_client(), args.batch_size)
+        ok = sum(1 for status in statuses if status["ok"])
+        print(f"🔄 同步 {len(statuses)} 筆：成功 {ok} 筆，失敗 {len(statuses) - ok} 筆"
+              f"（{(time.perf_counter() - started) * 1000:.0f} ms）")
+        return 0 if ok == len(statuses) else 1
+    if args.command == "history":
+        for row in store.history(args.date, args.title, args.limit):
+            state = "✅" if row["synced_at"] else "⏳"
+            print(f"{state} {row['date']} {row['title']}")
+        return 0
+    print(json.dumps(store.stats(), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,188 @@
+# metrics.py
+"""
+輕量的執行量測
+span（計時區段）、counter（累計值）與 histogram（分布）三種指標，
+可輸出為 handler 回應中的 metrics 區塊、Prometheus 文字格式或 JSON Lines。
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# 每個 histogram 保留的最近樣本數（用於計算百分位數）
+MAX_SAMPLES = 1024
+PROMETHEUS_PREFIX = "auto_pick_news"
+SPAN_HISTOGRAM = "span_seconds"
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _label_key(name: str, labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    """單次執行的量測結果（執行緒安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.spans: List[dict] = []
+            self.counters: Dict[str, float] = {}
+            self.histograms: Dict[str, List[float]] = {}
+            self._histogram_totals: Dict[str, List[float]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = _label_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(name, labels)
+        with self._lock:
+            samples = self.histograms.setdefault(key, [])
+            samples.append(value)
+            if len(samples) > MAX_SAMPLES:
+                del samples[0]
+            totals = self._histogram_totals.setdefault(key, [0, 0.0])
+            totals[0] += 1
+            totals[1] += value
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """記錄一段程式的耗時；區段內可更新 attributes（例如處理筆數）"""
+        started = time.perf_counter()
+        error = None
+        try:
+            yield attributes
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            record = {
+                "name": name,
+                "start_ms": round((started - self.started) * 1000, 2),
+                "duration_ms": round(duration * 1000, 2),
+            }
+            if attributes:
+                record["attributes"] = dict(attributes)
+            if error:
+                record["error"] = error
+            with self._lock:
+                self.spans.append(record)
+            self.observe(SPAN_HISTOGRAM, duration, span=name)
+
+    def snapshot(self) -> dict:
+        """handler 回應用的結構化結果"""
+        with self._lock:
+            histograms = {}
+            for key, samples in self.histograms.items():
+                ordered = sorted(samples)
+                count, total = self._histogram_totals[key]
+                histograms[key] = {
+                    "count": count,
+                    "sum": round(total, 6),
+                    "min": round(ordered[0], 6),
+                    "max": round(ordered[-1], 6),
+                    "p50": round(_percentile(ordered, 50), 6),
+                    "p95": round(_percentile(ordered, 95), 6),
+                }
+            return {
+                "spans": list(self.spans),
+                "counters": dict(self.counters),
+                "histograms": histograms,
+            }
+
+    def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """Prometheus 文字格式：counter 輸出為 *_total，histogram 輸出為 summary"""
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+
+        def metric_name(key: str):
+            name, _, labels = key.partition("{")
+            name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{name}")
+            return name, ("{" + labels if labels else "")
+
+        for key, value in snapshot["counters"].items():
+            name, labels = metric_name(key)
+            if name not in declared:
+                lines.append(f"# TYPE {name}_total counter")
+                declared.add(name)
+            lines.append(f"{name}_total{labels} {value}")
+
+        for key, hist in snapshot["histograms"].items():
+            name, labels = metric_name(key)
+            if name not in declared:
+                lines.append(f"# TYPE {name} summary")
+                declared.add(name)
+            inner = labels[1:-1]
+            for quantile, field in (("0.5", "p50"), ("0.95", "p95")):
+                quantile_labels = f'{inner},quantile="{quantile}"' if inner else f'quantile="{quantile}"'
+                lines.append(f"{name}{{{quantile_labels}}} {hist[field]}")
+            lines.append(f"{name}_sum{labels} {hist['sum']}")
+            lines.append(f"{name}_count{labels} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self) -> str:
+        """每個 span、counter、histogram 各一行 JSON"""
+        snapshot = self.snapshot()
+        lines = [json.dumps({"type": "span", **span}, ensure_ascii=False) for span in snapshot["spans"]]
+        lines += [json.dumps({"type": "counter", "name": key, "value": value}, ensure_ascii=False)
+                  for key, value in snapshot["counters"].items()]
+        lines += [json.dumps({"type": "histogram", "name": key, **hist}, ensure_ascii=False)
+                  for key, hist in snapshot["histograms"].items()]
+        return "\n".join(lines) + "\n"
+
+    def export(self, fmt: str, path: Optional[str] = None):
+        """輸出為 prometheus 或 jsonl；未指定 path 時寫到標準輸出"""
+        if fmt in ("prometheus", "prom"):
+            text = self.to_prometheus()
+        elif fmt in ("jsonl", "json"):
+            text = self.to_json_lines()
+        else:
+            raise ValueError(f"未知的輸出格式：{fmt}")
+        if path:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+
+
+_default_metrics = None
+_default_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """取得共用的量測物件；每次執行開始時呼叫 reset()"""
+    global _default_metrics
+    with _default_metrics_lock:
+        if _default_metrics is None:
+            _default_metrics = Metrics()
+    return _default_metrics
+
+
+def export_from_env(metrics: Optional[Metrics] = None):
+    """依 METRICS_EXPORT（prometheus / jsonl）與 METRICS_OUT（檔案路徑，預設標準輸出）輸出"""
+    fmt = os.environ.get("METRICS_EXPORT")
+    if fmt:
+        (metrics or get_metrics()).export(fmt, os.environ.get("METRICS_OUT"))
@@ -1,108 +1,89 @@
-# netlify/functions/analyze_news.py
+# netlify/functions/back.py
 """
 日本新聞分析 Netlify Function
 每日自動分析日本新聞，選出對台灣具參考價值的重要新聞
 """
 
+import time
+
+# 冷啟動計時從模組載入開始
+_IMPORT_STARTED = time.perf_counter()
+
 import json
 import os
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
-from typing import List, Any
+from typing import Dict, List, Any, Optional
 from uuid import uuid4
 
-try:
-    import requests
-    from pydantic import BaseModel, model_validator
-    from openai import OpenAI
-    from supabase import create_client, Client
-except ImportError as e:
-    print(f"Import error: {e}")
-    # 在 Netlify 環境中，這些包應該自動安裝
+# 共用模組位於專案根目錄，部署時由 netlify.toml 的 included_files 打包到函式根目錄；Function 環境只有 /tmp 可寫入
+os.environ.setdefault("RSS_CACHE_DIR", "/tmp/rss_cache")
+os.environ.setdefault("LLM_CACHE_PATH", "/tmp/llm_cache.sqlite")
+os.environ.setdefault("LOCAL_STORE_PATH", "/tmp/news_selection_log.db")
+
+from metrics import get_metrics
+from resilience import circuit_states, deadline_scope, handler_budget
+
+# 模組載入（冷啟動）時間上限，超過時在日誌中警告
+COLD_START_BUDGET_MS = float(os.environ.get("COLD_START_BUDGET_MS", "50"))
+
+# 跨呼叫重複使用的客戶端（同一個暖機中的執行環境只建立一次）
+_openai_client = None
+_supabase_client = None
+_pipeline_loaded = False
+
+
+def _load_pipeline():
+    """延遲載入分析流程所需的模組；GET 健康檢查完全不需要這些套件"""
+    global _pipeline_loaded
+    global HeadlineSelection, fetch_feed_items, get_title_filter
+    global cluster_titles, format_title_line, strip_cluster_marker
+    global pack_titles, parse_pub_date, rank_titles, DEFAULT_TOP_K, cached_chat_completion, cached_chat_completion_async, get_llm_cache
+    global build_rows, save_rows, get_local_store, stream_selection
+    global STRUCTURED_OUTPUTS, check_selection, load_selection, selection_response_format
+    if _pipeline_loaded:
+        return
+    try:
+        from news_models import (HeadlineSelection, STRUCTURED_OUTPUTS, check_selection, load_selection,
+                                 selection_response_format)
+        from feed_sources import fetch_feed_items
+        from title_filter import get_title_filter
+        from title_dedupe import cluster_titles, format_title_line, strip_cluster_marker
+        from prompt_budget import pack_titles, parse_pub_date
+        from prerank import DEFAULT_TOP_K, rank_titles
+        from llm_cache import cached_chat_completion, cached_chat_completion_async, get_llm_cache
+        from news_store import build_rows
+        from local_store import get_local_store, save_rows
+        from selection_stream import stream_selection
+    except ImportError as e:
+        print(f"Import error: {e}")
+        # 在 Netlify 環境中，這些包應該自動安裝
+        raise
+    _pipeline_loaded = True
 
 # 初始化客戶端
 def get_clients():
-    """初始化 OpenAI 和 Supabase 客戶端"""
+    """取得 OpenAI 和 Supabase 客戶端（暖機中的執行環境直接重複使用，不重新建立連線）"""
+    global _openai_client, _supabase_client
     try:
-        openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        supabase_client = create_client(
-            os.environ["SUPABASE_URL"], 
-            os.environ["SUPABASE_KEY"]
-        )
-        return openai_client, supabase_client
+        if _openai_client is None:
+            from openai import OpenAI
+            # 重試由 resilience 統一處理，SDK 本身不再重試
+            _openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0)
+        if _supabase_client is None:
+            from supabase import create_client
+            _supabase_client = create_client(
+                os.environ["SUPABASE_URL"], 
+                os.environ["SUPABASE_KEY"]
+            )
+        return _openai_client, _supabase_client
     except Exception as e:
         print(f"Client initialization error: {e}")
         raise
 
-# Pydantic 模型
-class SelectedHeadline(BaseModel):
-    title: str
-    reason: str
-    writing_direction: str
-
-class HeadlineSelection(BaseModel):
-    selections: List[SelectedHeadline]
-    
-    @model_validator(mode='before')
-    @classmethod
-    def extract_selections(cls, data: Any) -> Any:
-        """自動從不同的鍵名中提取選項陣列"""
-        if isinstance(data, dict):
-            possible_keys = [
-                'selections', 'selected_articles', 'articles',
-                'news', 'selected_news', 'items', 'results'
-            ]
-            
-            for key in possible_keys:
-                if key in data and isinstance(data[key], list):
-                    selections_data = data[key]
-                    
-                    if len(selections_data) == 0:
-                        raise ValueError('選項陣列不能為空')
-                    
-                    cleaned_selections = []
-                    for i, item in enumerate(selections_data):
-                        if isinstance(item, dict):
-                            cleaned_item = {
-                                'title': item.get('title', f'新聞 {i+1}'),
-                                'reason': item.get('reason', '未提供理由'),
-                                'writing_direction': item.get('writing_direction', '未提供建議')
-                            }
-                            cleaned_selections.append(cleaned_item)
-                    
-                    return {'selections': cleaned_selections}
-        
-        return data
-
-def fetch_rss(date_str):
-    """抓取 RSS XML"""
-    url = f"https://japan-news-get.netlify.app/rss?date={date_str}"
-    response = requests.get(url, timeout=30)
-    if response.status_code != 200:
-        raise Exception(f"RSS 錯誤：{response.status_code}")
-    return response.text
-
-def parse_rss_titles(rss_xml):
-    """解析 XML 標題"""
-    root = ET.fromstring(rss_xml)
-    items = root.findall(".//item")
-    titles = []
-    for item in items:
-        title_element = item.find("title")
-        if title_element is not None and title_element.text:
-            title = title_element.text.strip()
-            if any(skip in title for skip in ["Yahoo Japan", "地震情報"]):
-                continue
-            titles.append(title)
-    return titles
-
-def analyze_with_gpt(titles: List[str], openai_client) -> HeadlineSelection:
-    """使用 GPT 分析新聞"""
-    prompt = """
+# 選稿方針（結構化輸出與 JSON 模式共用）
+ANALYSIS_GUIDE = """
 你是台灣的國際新聞編輯，以下是日本新聞標題，請從中選出 5 則新聞，並說明選擇理由與建議撰寫角度。
 
-**重要指示：無論如何都必須選出正好 5 則新聞，即使標題看起來不夠有趣或不完全符合條件，也要從現有標題中選出最相關的 5 則。**
-
 優先條件（盡量符合，但不是必須）：
 1. 有助台灣理解日本政治、外交、經濟、文化
 2. 能作為對中政策或區域安全參考
@@ -113,6 +94,13 @@ def analyze_with_gpt(titles: List[str], openai_client) -> HeadlineSelection:
 3. 日本科技、產業發展
 4. 任何具有新聞價值的日本相關新聞
 
+標題後方的「［相似報導 N 則］」代表有 N 家媒體報導同一事件，可作為重要性參考；回傳 title 時請只填寫標題本身，不要包含這個標記。
+
+"""
+# JSON 模式（LLM_STRUCTURED=off）才需要的格式說明與範例
+ANALYSIS_FORMAT = """
+**重要指示：無論如何都必須選出正好 5 則新聞，即使標題看起來不夠有趣或不完全符合條件，也要從現有標題中選出最相關的 5 則。**
+
 請嚴格按照以下格式回傳，務必包含 5 則新聞：
 {
   "selections": [
@@ -126,63 +114,210 @@ def analyze_with_gpt(titles: List[str], openai_client) -> HeadlineSelection:
 
 **強制要求：陣列中必須有正好 5 個新聞物件，絕對不可以是空陣列或少於 5 個項目。**
 """
+
+def build_analysis_messages(titles: List[str],
+                            cluster_sizes: Optional[Dict[str, int]] = None,
+                            published_at: Optional[Dict[str, datetime]] = None,
+                            log_messages: Optional[List[str]] = None, ranking=None,
+                            structured: Optional[bool] = None):
+    """組出分析提示詞，回傳 (messages, 實際送出的標題)；ranking 為 rank_titles 的結果，未提供時在此計算"""
+    cluster_sizes = cluster_sizes or {}
+    ranking = ranking or rank_titles(titles, cluster_sizes)
+    structured = STRUCTURED_OUTPUTS if structured is None else structured
+    # 結構化輸出由 JSON schema 保證格式與數量，提示詞只需要選稿方針
+    prompt = ANALYSIS_GUIDE if structured else ANALYSIS_GUIDE + ANALYSIS_FORMAT
     
-    # 限制標題數量避免 token 過多
-    limited_titles = titles[:50]
+    # 只留預排序的 top-K（維持原本順序），再依 token 預算放入
+    top = set(ranking.top(DEFAULT_TOP_K))
+    packed = pack_titles(
+        [title for title in titles if title in top],
+        render_line=lambda title: format_title_line(title, cluster_sizes.get(title)),
+        cluster_sizes=cluster_sizes,
+        published_at=published_at,
+        scores=ranking.score_map(),
+    )
+    limited_titles = packed.titles
+    if log_messages is not None:
+        log_messages.append(
+            f"📝 送出 {len(limited_titles)} 則標題（{packed.used_tokens}/{packed.budget} tokens，捨棄 {packed.dropped} 則）"
+        )
     
     messages = [
         {
             "role": "system", 
-            "content": "你是專業的新聞編輯。最重要的規則：無論如何都必須選出正好5則新聞。請嚴格按照JSON格式回傳結果。"
+            "content": "你是專業的新聞編輯，依選稿方針從標題中選出正好 5 則新聞。" if structured
+            else "你是專業的新聞編輯。最重要的規則：無論如何都必須選出正好5則新聞。請嚴格按照JSON格式回傳結果。"
         },
         {
             "role": "user", 
-            "content": prompt + "\n\n新聞標題：\n" + "\n".join([f"- {title}" for title in limited_titles])
+            "content": prompt + "\n\n新聞標題：\n" + "\n".join([format_title_line(title, cluster_sizes.get(title)) for title in limited_titles])
         }
     ]
     
-    response = openai_client.chat.completions.create(
+    return messages, limited_titles
+
+def parse_selection(content: str) -> "HeadlineSelection":
+    """解析 GPT 回應（結構化輸出時依 schema 嚴格驗證）並移除誤帶的相似報導標記"""
+    parsed = load_selection(content)
+    for item in parsed.selections:
+        item.title = strip_cluster_marker(item.title)
+    return parsed
+
+def analyze_with_gpt(titles: List[str], openai_client,
+                     cluster_sizes: Optional[Dict[str, int]] = None,
+                     published_at: Optional[Dict[str, datetime]] = None,
+                     log_messages: Optional[List[str]] = None,
+                     prompt_log: Optional[List[dict]] = None,
+                     stream: bool = False, on_item=None, ranking=None) -> "HeadlineSelection":
+    """
+    使用 GPT 分析新聞；cluster_sizes 為各代表標題的相似報導數量，送出的提示詞會加入 prompt_log。
+    stream 為 True 時串流接收，每則結果通過驗證就交給 on_item。
+    """
+    messages, limited_titles = build_analysis_messages(titles, cluster_sizes, published_at, log_messages, ranking)
+    if prompt_log is not None:
+        prompt_log.append({"model": "gpt-4o-mini", "messages": messages})
+    if stream:
+        return stream_selection(openai_client, messages, limited_titles, on_item, prompt_log)
+    content = cached_chat_completion(
+        openai_client,
         model="gpt-4o-mini",
         messages=messages,
-        response_format={"type": "json_object"},
-        temperature=0.3
+        response_format=selection_response_format(),
+        temperature=0.3,
+        titles=limited_titles,
+        validate=check_selection,
     )
-    
-    parsed = HeadlineSelection.model_validate_json(response.choices[0].message.content)
-    return parsed
+    return parse_selection(content)
 
-def save_to_database(date_str: str, selection: HeadlineSelection, supabase_client):
-    """儲存到 Supabase 資料庫"""
-    success_count = 0
-    errors = []
-    
-    for item in selection.selections:
-        try:
-            data = {
-                "id": str(uuid4()),
-                "date": date_str,
-                "title": item.title,
-                "reason": item.reason,
-                "writing_direction": item.writing_direction,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            res = supabase_client.table("selected_news").insert(data).execute()
-            
-            if hasattr(res, 'data') and res.data:
-                success_count += 1
-            else:
-                errors.append(f"儲存失敗：{item.title[:30]}...")
-                
-        except Exception as e:
-            errors.append(f"錯誤：{str(e)}")
-    
+async def analyze_with_gpt_async(titles: List[str], openai_client,
+                                 cluster_sizes: Optional[Dict[str, int]] = None,
+                                 published_at: Optional[Dict[str, datetime]] = None,
+                                 log_messages: Optional[List[str]] = None,
+                                 prompt_log: Optional[List[dict]] = None,
+                                 ranking=None) -> "HeadlineSelection":
+    """analyze_with_gpt 的非同步版本（AsyncOpenAI）"""
+    messages, limited_titles = build_analysis_messages(titles, cluster_sizes, published_at, log_messages, ranking)
+    if prompt_log is not None:
+        prompt_log.append({"model": "gpt-4o-mini", "messages": messages})
+    content = await cached_chat_completion_async(
+        openai_client,
+        model="gpt-4o-mini",
+        messages=messages,
+        response_format=selection_response_format(),
+        temperature=0.3,
+        titles=limited_titles,
+        validate=check_selection,
+    )
+    return parse_selection(content)
+
+def save_to_database(date_str: str, selection: "HeadlineSelection", supabase_client,
+                     titles: Optional[List[str]] = None, prompts: Optional[List[dict]] = None,
+                     run_id: Optional[str] = None):
+    """先寫入本地紀錄，再整批同步到 Supabase（只重試失敗的資料列，先前未同步的資料列一併重送）"""
+    statuses = save_rows(supabase_client, date_str, build_rows(date_str, selection), titles, prompts,
+                         source="netlify", model="gpt-4o-mini", run_id=run_id)
+    success_count = sum(1 for status in statuses if status["ok"])
+    errors = [f"儲存失敗：{status['title'][:30]}...（{status['error']}）" for status in statuses if not status["ok"]]
     return success_count, errors
 
 def lambda_handler(event, context):
     """AWS Lambda 相容的處理函數（Netlify 預設格式）"""
     return handler(event, context)
 
+def _json_response(status_code: int, payload: Dict[str, Any], indent: Optional[int] = 2):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Content-Type": "application/json",
+            "Access-Control-Allow-Origin": "*"
+        },
+        "body": json.dumps(payload, ensure_ascii=False, indent=indent)
+    }
+
+def _request_body(event) -> Dict[str, Any]:
+    """解析請求內容；不是 JSON 物件時視為空白"""
+    try:
+        body = json.loads(event.get("body") or "{}")
+    except (TypeError, ValueError):
+        return {}
+    return body if isinstance(body, dict) else {}
+
+def _use_async_pipeline(event) -> bool:
+    """環境變數 ASYNC_PIPELINE=1 或請求內容 {"async": true} 時改用非同步流程"""
+    if os.environ.get("ASYNC_PIPELINE", "0").lower() in ("1", "on", "true"):
+        return True
+    return _request_body(event).get("async") is True
+
+def _use_streaming(event) -> bool:
+    """環境變數 LLM_STREAM=on 或請求內容 {"stream": true} 時串流選稿"""
+    if os.environ.get("LLM_STREAM", "off").lower() in ("1", "on", "true"):
+        return True
+    return _request_body(event).get("stream") is True
+
+def _resolve_target_date(event) -> str:
+    """請求內容有 target_date（YYYYMMDD）時使用該日期，否則分析前一天的新聞（因為凌晨3點執行，日本時間）"""
+    target_date = _request_body(event).get("target_date")
+    if target_date:
+        target_date = str(target_date).strip()
+        try:
+            datetime.strptime(target_date, '%Y%m%d')
+        except ValueError:
+            raise ValueError(f"target_date 格式錯誤（需為 YYYYMMDD）：{target_date}")
+        return target_date
+    JST = timezone(timedelta(hours=9))
+    now_jst = datetime.now(JST)
+    return (now_jst - timedelta(days=1)).strftime('%Y%m%d')
+
+def _success_response(start_time, target_date: str, titles: List[str], unique_titles: List[str],
+                      selection: "HeadlineSelection", success_count: int, errors: List[str],
+                      log_messages: List[str], ranking=None):
+    llm_cache = get_llm_cache()
+    execution_time = (datetime.now(timezone.utc) - start_time).total_seconds()
+    
+    result = {
+        "success": True,
+        "message": f"成功分析並儲存 {success_count} 則新聞",
+        "data": {
+            "date": target_date,
+            "total_titles": len(titles),
+            "unique_titles": len(unique_titles),
+            "selected_count": len(selection.selections),
+            "saved_count": success_count,
+            "selected_news": [
+                {
+                    "title": item.title,
+                    "reason": item.reason[:100] + "..." if len(item.reason) > 100 else item.reason,
+                    "writing_direction": item.writing_direction[:100] + "..." if len(item.writing_direction) > 100 else item.writing_direction,
+                    # 預排序的分數明細（總分、關鍵字與各主題相似度）
+                    "scores": ranking.vector(item.title) if ranking else None
+                }
+                for item in selection.selections
+            ],
+            "llm_cache": llm_cache.stats() if llm_cache else None,
+            "metrics": get_metrics().snapshot(),
+            "circuits": circuit_states(),
+            "execution_time_seconds": round(execution_time, 2)
+        },
+        "logs": log_messages,
+        "errors": errors if errors else None,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+    return _json_response(200, result)
+
+def _error_response(start_time, e: Exception, log_messages: List[str]):
+    execution_time = (datetime.now(timezone.utc) - start_time).total_seconds()
+    
+    error_result = {
+        "success": False,
+        "message": f"執行失敗：{str(e)}",
+        "logs": log_messages,
+        "metrics": get_metrics().snapshot(),
+        "circuits": circuit_states(),
+        "execution_time_seconds": round(execution_time, 2),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+    return _json_response(500, error_result)
+
 def handler(event, context):
     """Netlify Function 主處理函數"""
     
@@ -196,108 +331,156 @@ def handler(event, context):
         
         # GET 請求返回健康檢查
         if http_method == 'GET':
-            return {
-                "statusCode": 200,
-                "headers": {
-                    "Content-Type": "application/json",
-                    "Access-Control-Allow-Origin": "*"
-                },
-                "body": json.dumps({
-                    "status": "healthy",
-                    "service": "Japanese News Analyzer",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "message": "Service is running normally"
-                }, ensure_ascii=False)
-            }
+            return _json_response(200, {
+                "status": "healthy",
+                "service": "Japanese News Analyzer",
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "message": "Service is running normally",
+                "cold_start_ms": round(COLD_START_MS, 1),
+                "warm": _openai_client is not None
+            }, indent=None)
         
-        # 初始化客戶端
-        openai_client, supabase_client = get_clients()
-        log_messages.append("✅ 客戶端初始化成功")
+        # 所有外部呼叫的重試與逾時都不超過函數剩餘的執行時間
+        with deadline_scope(handler_budget(context)):
+            if _use_async_pipeline(event):
+                import asyncio
+                return asyncio.run(handler_async(event, context))
         
-        # 計算目標日期（日本時間）
-        JST = timezone(timedelta(hours=9))
-        now_jst = datetime.now(JST)
+            # 每次呼叫重新計量（暖機中的執行環境會沿用同一個物件）
+            metrics = get_metrics()
+            metrics.reset()
         
-        # 總是分析前一天的新聞（因為凌晨3點執行）
-        target_date = (now_jst - timedelta(days=1)).strftime('%Y%m%d')
-        log_messages.append(f"📅 目標分析日期：{target_date}")
+            # 初始化客戶端（暖機中的執行環境會直接沿用）
+            setup_started = time.perf_counter()
+            warm = _openai_client is not None and _supabase_client is not None
+            with metrics.span("setup", warm=warm):
+                _load_pipeline()
+                openai_client, supabase_client = get_clients()
+            setup_ms = (time.perf_counter() - setup_started) * 1000
+            log_messages.append(f"✅ 客戶端{'沿用' if warm else '初始化'}成功（{setup_ms:.0f} ms）")
         
-        # 抓取新聞
-        log_messages.append(f"📡 開始抓取 {target_date} 的新聞...")
-        rss_xml = fetch_rss(target_date)
-        titles = parse_rss_titles(rss_xml)
+            # 計算目標日期（日本時間）
+            target_date = _resolve_target_date(event)
+            log_messages.append(f"📅 目標分析日期：{target_date}")
         
-        if not titles:
-            raise Exception("未取得任何新聞標題")
+            # 抓取新聞
+            log_messages.append(f"📡 開始抓取 {target_date} 的新聞...")
+            title_filter = get_title_filter()
+            title_filter.reset_stats()
+            with metrics.span("fetch", date=target_date):
+                items = fetch_feed_items(target_date)
+            titles = [item["title"] for item in items]
+            published_at = {}
+            for item in items:
+                published_at.setdefault(item["title"], parse_pub_date(item["pubDate"]))
+            skipped = title_filter.report()
+            if skipped:
+                log_messages.append(f"🚫 排除規則命中：{skipped}")
         
-        # 去重複
-        unique_titles = list(dict.fromkeys(titles))
-        log_messages.append(f"📰 取得 {len(titles)} 則標題，去重後 {len(unique_titles)} 則")
+            if not titles:
+                raise Exception("未取得任何新聞標題")
         
-        # GPT 分析
-        log_messages.append("🧠 開始 GPT 分析...")
-        selection = analyze_with_gpt(unique_titles, openai_client)
-        log_messages.append(f"✅ GPT 分析完成，選出 {len(selection.selections)} 則新聞")
+            # 相似標題分群，每群只送代表標題
+            with metrics.span("dedupe", titles=len(titles)):
+                clusters = cluster_titles(titles)
+            unique_titles = [c.representative for c in clusters]
+            cluster_sizes = {c.representative: c.size for c in clusters}
+            log_messages.append(f"📰 取得 {len(titles)} 則標題，相似標題合併後 {len(unique_titles)} 則")
         
-        # 儲存到資料庫
-        log_messages.append("💾 開始儲存到資料庫...")
-        success_count, errors = save_to_database(target_date, selection, supabase_client)
+            # GPT 分析；串流時每則結果通過驗證就先寫入本地紀錄
+            log_messages.append("🧠 開始 GPT 分析...")
+            prompt_log = []
+            stream = _use_streaming(event)
+            run_id = str(uuid4())
+            local_store = get_local_store()
+            
+            def persist_early(item):
+                log_messages.append(f"⚡ 收到：{item.title[:30]}")
+                if local_store is not None:
+                    local_store.add_rows(run_id, target_date, build_rows(target_date, [item]), source="netlify",
+                                         model="gpt-4o-mini")
+            
+            with metrics.span("prerank", titles=len(unique_titles)):
+                ranking = rank_titles(unique_titles, cluster_sizes)
+            with metrics.span("llm", titles=len(unique_titles), stream=stream):
+                selection = analyze_with_gpt(unique_titles, openai_client, cluster_sizes, published_at, log_messages,
+                                             prompt_log, stream, persist_early, ranking)
+            log_messages.append(f"✅ GPT 分析完成，選出 {len(selection.selections)} 則新聞")
         
-        # 準備回應
-        execution_time = (datetime.now(timezone.utc) - start_time).total_seconds()
+            # 儲存到資料庫
+            log_messages.append("💾 開始儲存到資料庫...")
+            with metrics.span("insert", rows=len(selection.selections)):
+                success_count, errors = save_to_database(target_date, selection, supabase_client, titles, prompt_log,
+                                                         run_id)
         
-        result = {
-            "success": True,
-            "message": f"成功分析並儲存 {success_count} 則新聞",
-            "data": {
-                "date": target_date,
-                "total_titles": len(titles),
-                "unique_titles": len(unique_titles),
-                "selected_count": len(selection.selections),
-                "saved_count": success_count,
-                "selected_news": [
-                    {
-                        "title": item.title,
-                        "reason": item.reason[:100] + "..." if len(item.reason) > 100 else item.reason,
-                        "writing_direction": item.writing_direction[:100] + "..." if len(item.writing_direction) > 100 else item.writing_direction
-                    }
-                    for item in selection.selections
-                ],
-                "execution_time_seconds": round(execution_time, 2)
-            },
-            "logs": log_messages,
-            "errors": errors if errors else None,
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
-        
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*"
-            },
-            "body": json.dumps(result, ensure_ascii=False, indent=2)
-        }
+            return _success_response(start_time, target_date, titles, unique_titles, selection,
+                                     success_count, errors, log_messages, ranking)
         
     except Exception as e:
-        execution_time = (datetime.now(timezone.utc) - start_time).total_seconds()
+        return _error_response(start_time, e, log_messages)
+
+async def handler_async(event, context):
+    """非同步版本：下載、GPT、寫入與驗證都使用非同步客戶端"""
+    start_time = datetime.now(timezone.utc)
+    log_messages = []
+    metrics = get_metrics()
+    metrics.reset()
+    
+    try:
+        with deadline_scope(handler_budget(context)):
+            # 非同步客戶端綁定在本次事件迴圈上，不跨呼叫重複使用
+            with metrics.span("setup", warm=False):
+                _load_pipeline()
+                from async_pipeline import close_async_clients, create_async_clients, run_pipeline
+                http, openai_client, supabase_client = await create_async_clients()
+            log_messages.append("✅ 非同步客戶端初始化成功")
         
-        error_result = {
-            "success": False,
-            "message": f"執行失敗：{str(e)}",
-            "logs": log_messages,
-            "execution_time_seconds": round(execution_time, 2),
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
+            target_date = _resolve_target_date(event)
+            log_messages.append(f"📅 目標分析日期：{target_date}")
         
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Content-Type": "application/json",
-                "Access-Control-Allow-Origin": "*"
-            },
-            "body": json.dumps(error_result, ensure_ascii=False, indent=2)
-        }
+            title_filter = get_title_filter()
+            title_filter.reset_stats()
+        
+            prompt_log = []
+            rankings = []
+        
+            async def select(titles, cluster_sizes, published_at):
+                with metrics.span("prerank", titles=len(titles)):
+                    rankings.append(rank_titles(titles, cluster_sizes))
+                log_messages.append("🧠 開始 GPT 分析...")
+                return await analyze_with_gpt_async(titles, openai_client, cluster_sizes, published_at, log_messages,
+                                                    prompt_log, rankings[-1])
+        
+            try:
+                result = await run_pipeline([target_date], http, supabase_client, select,
+                                            log=log_messages.append, metrics=metrics,
+                                            prompts=prompt_log, source="netlify")
+            finally:
+                await close_async_clients(http, openai_client)
+        
+            skipped = title_filter.report()
+            if skipped:
+                log_messages.append(f"🚫 排除規則命中：{skipped}")
+            if target_date in result["errors"]:
+                raise result["errors"][target_date]
+            if result["selection"] is None:
+                raise Exception("未取得任何新聞標題")
+        
+            statuses = result["statuses"]
+            success_count = sum(1 for status in statuses if status["ok"])
+            errors = [f"儲存失敗：{status['title'][:30]}...（{status['error']}）" for status in statuses if not status["ok"]]
+            log_messages.append(f"🔍 驗證：資料庫中讀回 {len(result['records'])} 筆記錄")
+        
+            return _success_response(start_time, target_date, result["titles"], result["unique_titles"],
+                                     result["selection"], success_count, errors, log_messages,
+                                     rankings[-1] if rankings else None)
+        
+    except Exception as e:
+        return _error_response(start_time, e, log_messages)
+
+COLD_START_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
+if COLD_START_MS > COLD_START_BUDGET_MS:
+    print(f"⚠️ 冷啟動 {COLD_START_MS:.1f} ms，超過預算 {COLD_START_BUDGET_MS:.0f} ms")
 
 # 為了本地測試
 if __name__ == "__main__":
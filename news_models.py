@@ -0,0 +1,160 @@
+# news_models.py
+"""
+選稿結果的 Pydantic 模型
+Netlify Function 在處理 POST 時才載入，健康檢查不需要匯入 pydantic。
+
+結構化輸出（預設，LLM_STRUCTURED=off 停用）把 JSON schema 交給 API，回應必定是正好 5 則完整項目，
+以 StrictHeadlineSelection 嚴格驗證（不經過寬鬆解析）；停用時沿用 json_object 與 HeadlineSelection 的寬鬆解析。
+"""
+
+import json
+import os
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator, model_validator
+
+from metrics import get_metrics
+
+EXPECTED_SELECTIONS = 5
+STRUCTURED_OUTPUTS = os.environ.get("LLM_STRUCTURED", "on").lower() not in ("0", "off", "false")
+JSON_OBJECT_FORMAT = {"type": "json_object"}
+
+class SelectedHeadline(BaseModel):
+    title: str
+    reason: str
+    writing_direction: str
+
+class HeadlineSelection(BaseModel):
+    selections: List[SelectedHeadline]
+    
+    @model_validator(mode='before')
+    @classmethod
+    def extract_selections(cls, data: Any) -> Any:
+        """自動從不同的鍵名中提取選項陣列"""
+        if isinstance(data, dict):
+            possible_keys = [
+                'selections', 'selected_articles', 'articles',
+                'news', 'selected_news', 'items', 'results'
+            ]
+            
+            for key in possible_keys:
+                if key in data and isinstance(data[key], list):
+                    selections_data = data[key]
+                    
+                    if len(selections_data) == 0:
+                        raise ValueError('選項陣列不能為空')
+                    
+                    cleaned_selections = []
+                    for i, item in enumerate(selections_data):
+                        if isinstance(item, dict):
+                            cleaned_item = {
+                                'title': item.get('title', f'新聞 {i+1}'),
+                                'reason': item.get('reason', '未提供理由'),
+                                'writing_direction': item.get('writing_direction', '未提供建議')
+                            }
+                            cleaned_selections.append(cleaned_item)
+                    
+                    return {'selections': cleaned_selections}
+            
+            # 找不到預期的鍵時，採用第一個看起來像新聞項目的陣列
+            for key, value in data.items():
+                if isinstance(value, list) and len(value) > 0:
+                    first_item = value[0]
+                    if isinstance(first_item, dict) and any(k in first_item for k in ['title', 'reason']):
+                        return {'selections': value}
+        
+        return data
+
+
+class StrictSelectedHeadline(BaseModel):
+    """結構化輸出的單一項目：只有三個欄位、都必須是非空字串"""
+    model_config = ConfigDict(extra="forbid", strict=True)
+
+    title: str
+    reason: str
+    writing_direction: str
+
+    @field_validator("title", "reason", "writing_direction")
+    @classmethod
+    def not_blank(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("欄位不可為空")
+        return value
+
+class StrictHeadlineSelection(BaseModel):
+    """結構化輸出的回應：只接受 selections 陣列，不猜測鍵名也不補預設文字"""
+    model_config = ConfigDict(extra="forbid", strict=True)
+
+    selections: List[StrictSelectedHeadline]
+
+
+def selection_from_items(items: List[BaseModel]) -> HeadlineSelection:
+    """把已驗證的項目組成 HeadlineSelection，不再經過寬鬆解析的 before validator"""
+    return HeadlineSelection.model_construct(
+        selections=[SelectedHeadline.model_construct(**item.model_dump()) for item in items])
+
+
+def selection_response_format(count: int = EXPECTED_SELECTIONS, structured: Optional[bool] = None) -> dict:
+    """選稿請求的 response_format：結構化輸出時為正好 count 則的 JSON schema，否則為 json_object"""
+    if not (STRUCTURED_OUTPUTS if structured is None else structured):
+        return JSON_OBJECT_FORMAT
+    item = {
+        "type": "object",
+        "properties": {name: {"type": "string"} for name in SelectedHeadline.model_fields},
+        "required": list(SelectedHeadline.model_fields),
+        "additionalProperties": False,
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "headline_selection",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"selections": {"type": "array", "items": item, "minItems": count, "maxItems": count}},
+                "required": ["selections"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def parse_strict_selection(content: Optional[str], count: int = EXPECTED_SELECTIONS) -> HeadlineSelection:
+    """
+    以 StrictHeadlineSelection 驗證：只接受 {"selections": [...]}、正好 count 則、每則三個欄位都是非空字串。
+    模型拒絕回應時 content 為 None，同樣視為驗證失敗。
+    """
+    if not content:
+        raise ValueError("回應內容為空（可能被模型拒絕）")
+    strict = StrictHeadlineSelection.model_validate_json(content)
+    if len(strict.selections) != count:
+        raise ValueError(f"回應不符合 schema：需要 {count} 則，收到 {len(strict.selections)} 則")
+    return selection_from_items(strict.selections)
+
+
+def load_selection(content: Optional[str], structured: Optional[bool] = None,
+                   record: bool = True) -> HeadlineSelection:
+    """
+    依模式驗證選稿回應；record 為 True 時記錄 llm_validations / llm_validation_failures（依 mode 分開），
+    兩者相除即為驗證失敗率。只做檢查（例如寫入快取前）時傳 record=False，避免同一回應重複計數。
+    """
+    structured = STRUCTURED_OUTPUTS if structured is None else structured
+    mode = "json_schema" if structured else "json_object"
+    try:
+        if structured:
+            parsed = parse_strict_selection(content)
+        else:
+            parsed = HeadlineSelection.model_validate_json(content or "")
+    except (ValueError, ValidationError):
+        if record:
+            get_metrics().incr("llm_validations", mode=mode)
+            get_metrics().incr("llm_validation_failures", mode=mode)
+        raise
+    if record:
+        get_metrics().incr("llm_validations", mode=mode)
+    return parsed
+
+
+def check_selection(content: Optional[str]) -> None:
+    """寫入快取前的檢查（不計入驗證失敗率）"""
+    load_selection(content, record=False)
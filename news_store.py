@@ -0,0 +1,185 @@
+# news_store.py
+"""
+selected_news 批次寫入
+一次請求送出整批選稿結果；請求失敗時以二分法找出有問題的資料列，
+只重試失敗的部分，並回傳每一列的儲存狀態。
+資料列 ID 由（日期, 正規化標題）決定，預設以 upsert 寫入，同一天重跑不會產生重複資料。
+連線錯誤等暫時性失敗不拆批，整批以退避重試；Supabase 斷路器開啟或超過截止時間時立即回報失敗。
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List
+from uuid import UUID, uuid5
+
+from metrics import get_metrics
+from resilience import (
+    SINGLE_ATTEMPT,
+    CircuitOpenError,
+    DeadlineExceeded,
+    backoff,
+    backoff_async,
+    call,
+    call_async,
+    is_transient,
+)
+from title_dedupe import normalize_title
+
+TABLE = "selected_news"
+DEPENDENCY = "supabase"
+DEFAULT_MAX_RETRIES = 2
+# 固定的命名空間，確保同一篇新聞在任何環境都得到相同 ID
+ID_NAMESPACE = UUID("6f1d3c52-8f0e-4c7a-9d55-2b7e0f4a1c93")
+
+
+def selection_id(date_str: str, title: str) -> str:
+    """由日期與正規化標題產生固定的 UUID"""
+    return str(uuid5(ID_NAMESPACE, f"{date_str}:{normalize_title(title)}"))
+
+
+def build_rows(date_str: str, selection) -> List[dict]:
+    """把 HeadlineSelection（或 SelectedHeadline 的清單）轉成 selected_news 的資料列"""
+    created_at = datetime.now(timezone.utc).isoformat()
+    rows = {}
+    for item in getattr(selection, "selections", selection):
+        row_id = selection_id(date_str, item.title)
+        # 同一次結果中重複的標題只保留第一筆
+        rows.setdefault(row_id, {
+            "id": row_id,
+            "date": date_str,
+            "title": item.title,
+            "reason": item.reason,
+            "writing_direction": item.writing_direction,
+            "created_at": created_at,
+        })
+    return list(rows.values())
+
+
+def _build_query(supabase_client, table: str, rows: List[dict], mode: str):
+    query = supabase_client.table(table)
+    if mode == "upsert":
+        # 已存在的 ID 直接略過（ON CONFLICT DO NOTHING）
+        return query.upsert(rows, on_conflict="id", ignore_duplicates=True)
+    return query.insert(rows)
+
+
+def _evaluate_response(res, rows: List[dict], mode: str) -> Dict[str, dict]:
+    """依回應內容判斷每一列是否寫入成功"""
+    returned_ids = {record.get("id") for record in (getattr(res, "data", None) or [])}
+    outcome = {}
+    for row in rows:
+        if row["id"] in returned_ids:
+            outcome[row["id"]] = {"ok": True, "existed": False, "error": None, "retryable": False}
+        elif mode == "upsert":
+            # upsert 略過的資料列代表先前已經寫入過
+            outcome[row["id"]] = {"ok": True, "existed": True, "error": None, "retryable": False}
+        else:
+            # 請求成功但回應中沒有這筆，重送可能造成重複，不自動重試
+            outcome[row["id"]] = {"ok": False, "existed": False,
+                                  "error": f"儲存可能失敗，回應中沒有此筆：{res}", "retryable": False}
+    return outcome
+
+
+def _failed(rows: List[dict], error: Exception, retryable: bool = True) -> Dict[str, dict]:
+    return {row["id"]: {"ok": False, "existed": False, "error": str(error), "retryable": retryable}
+            for row in rows}
+
+
+def _insert_batch(supabase_client, table: str, rows: List[dict], mode: str) -> Dict[str, dict]:
+    """
+    送出一批資料；資料造成的失敗拆成兩半分別重送，找出真正失敗的資料列。
+    暫時性錯誤整批標記為可重試（拆批只會對故障的服務送出更多請求）。
+    """
+    get_metrics().incr("db_requests", table=table)
+    try:
+        res = call(DEPENDENCY, _build_query(supabase_client, table, rows, mode).execute, policy=SINGLE_ATTEMPT)
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        return _failed(rows, e, retryable=False)
+    except Exception as e:
+        if len(rows) == 1 or is_transient(e):
+            # 單筆資料本身造成的錯誤重送也不會成功
+            return _failed(rows, e, retryable=is_transient(e))
+        mid = len(rows) // 2
+        outcome = _insert_batch(supabase_client, table, rows[:mid], mode)
+        outcome.update(_insert_batch(supabase_client, table, rows[mid:], mode))
+        return outcome
+    return _evaluate_response(res, rows, mode)
+
+
+async def _insert_batch_async(supabase_client, table: str, rows: List[dict], mode: str) -> Dict[str, dict]:
+    """_insert_batch 的非同步版本（supabase AsyncClient）"""
+    get_metrics().incr("db_requests", table=table)
+    try:
+        res = await call_async(DEPENDENCY, _build_query(supabase_client, table, rows, mode).execute,
+                               policy=SINGLE_ATTEMPT)
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        return _failed(rows, e, retryable=False)
+    except Exception as e:
+        if len(rows) == 1 or is_transient(e):
+            # 單筆資料本身造成的錯誤重送也不會成功
+            return _failed(rows, e, retryable=is_transient(e))
+        mid = len(rows) // 2
+        outcome = await _insert_batch_async(supabase_client, table, rows[:mid], mode)
+        outcome.update(await _insert_batch_async(supabase_client, table, rows[mid:], mode))
+        return outcome
+    return _evaluate_response(res, rows, mode)
+
+
+def _statuses(rows: List[dict], outcome: Dict[str, dict], attempts: Dict[str, int]) -> List[dict]:
+    metrics = get_metrics()
+    for row in rows:
+        result = outcome[row["id"]]
+        state = "failed" if not result["ok"] else "existed" if result["existed"] else "written"
+        metrics.incr("db_rows", state=state)
+    return [
+        {
+            "id": row["id"],
+            "title": row.get("title"),
+            "ok": outcome[row["id"]]["ok"],
+            "existed": outcome[row["id"]]["existed"],
+            "error": outcome[row["id"]]["error"],
+            "attempts": attempts[row["id"]],
+        }
+        for row in rows
+    ]
+
+
+def bulk_insert(supabase_client, rows: List[dict], table: str = TABLE,
+                max_retries: int = DEFAULT_MAX_RETRIES, mode: str = "upsert") -> List[dict]:
+    """
+    批次寫入並回傳每列狀態 [{"id", "title", "ok", "existed", "error", "attempts"}]，順序與輸入相同。
+    mode 為 "upsert"（預設，已存在的資料列視為成功且不變動）或 "insert"。
+    重試之間以指數退避等待；剩餘時間或重試預算不足時停止重試。
+    """
+    outcome: Dict[str, dict] = {}
+    attempts: Dict[str, int] = {}
+    pending = list(rows)
+
+    for attempt in range(max_retries + 1):
+        if not pending or (attempt and not backoff(DEPENDENCY, attempt)):
+            break
+        for row in pending:
+            attempts[row["id"]] = attempts.get(row["id"], 0) + 1
+        result = _insert_batch(supabase_client, table, pending, mode)
+        outcome.update(result)
+        pending = [row for row in pending if result[row["id"]]["retryable"]]
+
+    return _statuses(rows, outcome, attempts)
+
+
+async def bulk_insert_async(supabase_client, rows: List[dict], table: str = TABLE,
+                            max_retries: int = DEFAULT_MAX_RETRIES, mode: str = "upsert") -> List[dict]:
+    """bulk_insert 的非同步版本"""
+    outcome: Dict[str, dict] = {}
+    attempts: Dict[str, int] = {}
+    pending = list(rows)
+
+    for attempt in range(max_retries + 1):
+        if not pending or (attempt and not await backoff_async(DEPENDENCY, attempt)):
+            break
+        for row in pending:
+            attempts[row["id"]] = attempts.get(row["id"], 0) + 1
+        result = await _insert_batch_async(supabase_client, table, pending, mode)
+        outcome.update(result)
+        pending = [row for row in pending if result[row["id"]]["retryable"]]
+
+    return _statuses(rows, outcome, attempts)
@@ -0,0 +1,172 @@
+# prerank.py
+"""
+選稿前的本地相關性預排序
+依提示詞中的編輯方針（政治、外交、經濟、對中政策、區域安全）建立字元 n-gram 的 TF-IDF 主題向量，
+以 NumPy 一次計算所有標題與各主題的餘弦相似度，再加上關鍵字權重與相似報導數量，
+只把分數最高的 top-K 則交給 token 預算挑選。純 CPU 運算、不呼叫外部服務，五千則標題約一百毫秒以內。
+"""
+
+import math
+import os
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from metrics import get_metrics
+from prompt_budget import CLUSTER_WEIGHT, KEYWORD_WEIGHTS
+from title_dedupe import normalize_title, normalize_titles
+
+# 日文關鍵字多為 2~3 個字
+NGRAMS = (2, 3)
+# 標題超過此長度的部分不計入（標題重點多在前段）
+MAX_CHARS = 64
+DEFAULT_TOP_K = int(os.environ.get("PRERANK_TOP_K", "150"))
+# 主題相似度（0~1）換算成與關鍵字權重相近的尺度
+SIMILARITY_WEIGHT = 50.0
+
+# 各主題的代表詞組（與選稿提示詞的優先條件對應）
+TOPICS: Dict[str, List[str]] = {
+    "politics": ["首相", "内閣", "政府", "国会", "選挙", "自民党", "与党", "野党", "政権", "閣議決定", "衆院", "参院",
+                 "支持率", "総裁選", "官房長官"],
+    "diplomacy": ["外相", "外交", "首脳会談", "大使", "条約", "G7", "日米", "日韓", "日中", "訪問", "協議", "共同声明",
+                  "国連", "外務省"],
+    "economy": ["経済", "日銀", "金利", "関税", "円安", "円高", "株価", "貿易", "半導体", "TSMC", "GDP", "物価",
+                "賃上げ", "投資", "サプライチェーン"],
+    "china_policy": ["中国", "習近平", "台湾", "日中関係", "中国外務省", "輸出規制", "経済安全保障", "対中", "北京",
+                     "香港", "台湾海峡", "中国政府"],
+    "regional_security": ["防衛", "安全保障", "自衛隊", "ミサイル", "北朝鮮", "尖閣", "台湾有事", "在日米軍", "防衛費",
+                          "南シナ海", "ロシア", "中国軍", "演習", "領海"],
+}
+TOPIC_NAMES = list(TOPICS)
+
+# 長的關鍵字優先比對（例如「安全保障」不會被拆成較短的詞）
+_KEYWORD_RE = re.compile("|".join(re.escape(k) for k in sorted(KEYWORD_WEIGHTS, key=len, reverse=True)))
+
+
+def ngram_codes(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    所有文字的字元 n-gram，回傳 (所屬文字的索引, n-gram 編碼)。
+    每個字元的 Unicode 碼位佔 21 位元，n 個字元直接組成一個 int64，不需要逐字建立字串。
+    """
+    width = min(max([len(t) for t in texts] + [max(NGRAMS)]), MAX_CHARS)
+    padded = "".join(t[:width].ljust(width, "\0") for t in texts)
+    chars = np.frombuffer(padded.encode("utf-32-le"), dtype=np.uint32).reshape(len(texts), width).astype(np.int64)
+
+    rows, codes = [], []
+    for n in NGRAMS:
+        if width < n:
+            continue
+        code = np.zeros((len(texts), width - n + 1), dtype=np.int64)
+        valid = np.ones(code.shape, dtype=bool)
+        for k in range(n):
+            window = chars[:, k:width - n + 1 + k]
+            code = (code << 21) | window
+            valid &= window > 0
+        row_idx, _ = np.nonzero(valid)
+        rows.append(row_idx)
+        codes.append(code[valid])
+    return np.concatenate(rows), np.concatenate(codes)
+
+
+def _topic_grams() -> List[Tuple[np.ndarray, np.ndarray]]:
+    """每個主題的 (n-gram 編碼, 出現次數)；詞組分開計算，不產生跨詞組的 n-gram"""
+    phrases, owners = [], []
+    for t, name in enumerate(TOPIC_NAMES):
+        for phrase in TOPICS[name]:
+            phrases.append(normalize_title(phrase))
+            owners.append(t)
+    rows, codes = ngram_codes(phrases)
+    topics = np.asarray(owners)[rows]
+    return [np.unique(codes[topics == t], return_counts=True) for t in range(len(TOPIC_NAMES))]
+
+
+_TOPIC_GRAMS = _topic_grams()
+
+
+def keyword_scores(titles: List[str]) -> np.ndarray:
+    """各標題命中的關鍵字權重總和（同一關鍵字只算一次）；所有標題串成一段文字只掃描一次"""
+    lengths = np.fromiter((len(title) + 1 for title in titles), dtype=np.int64, count=len(titles))
+    starts = np.cumsum(lengths) - lengths
+    text = "\n".join(title.replace("\n", " ") for title in titles)
+    hits = {(m.group(), m.start()) for m in _KEYWORD_RE.finditer(text)}
+    scores = np.zeros(len(titles))
+    if hits:
+        words, positions = zip(*hits)
+        rows = np.searchsorted(starts, positions, side="right") - 1
+        for word, row in {(word, row) for word, row in zip(words, rows.tolist())}:
+            scores[row] += KEYWORD_WEIGHTS[word]
+    return scores
+
+
+class Ranking(NamedTuple):
+    titles: List[str]
+    scores: np.ndarray          # 總分，順序與 titles 相同
+    topic_scores: np.ndarray    # (標題數, 主題數) 的餘弦相似度
+    keyword_scores: np.ndarray
+
+    def order(self) -> np.ndarray:
+        """分數由高到低的索引（同分時維持原本順序）"""
+        return np.argsort(-self.scores, kind="stable")
+
+    def top(self, k: int = DEFAULT_TOP_K) -> List[str]:
+        return [self.titles[i] for i in self.order()[:k]]
+
+    def score_map(self) -> Dict[str, float]:
+        return {title: float(score) for title, score in zip(self.titles, self.scores)}
+
+    def vector(self, title: str) -> Optional[Dict[str, float]]:
+        """單一標題的分數明細（總分、關鍵字與各主題相似度），不在清單中時回傳 None"""
+        try:
+            i = self.titles.index(title)
+        except ValueError:
+            return None
+        detail = {"score": round(float(self.scores[i]), 4), "keyword": round(float(self.keyword_scores[i]), 4)}
+        detail.update({name: round(float(self.topic_scores[i, t]), 4) for t, name in enumerate(TOPIC_NAMES)})
+        return detail
+
+
+def rank_titles(titles: List[str], cluster_sizes: Optional[Dict[str, int]] = None) -> Ranking:
+    """
+    計算每則標題的相關性分數：
+    SIMILARITY_WEIGHT × 最相近主題的餘弦相似度 + 關鍵字權重 + CLUSTER_WEIGHT × log2(相似報導數)。
+    IDF 以這批標題本身計算，幾乎每則都有的字串（例如「日本」）權重較低。
+    """
+    started = time.perf_counter()
+    cluster_sizes = cluster_sizes or {}
+    n = len(titles)
+    if n == 0:
+        empty = np.zeros(0)
+        return Ranking([], empty, np.zeros((0, len(TOPIC_NAMES))), empty)
+
+    rows, codes = ngram_codes(normalize_titles(titles))
+    vocab, cols = np.unique(codes, return_inverse=True)
+    size = len(vocab)
+    pairs, tf = np.unique(rows * size + cols, return_counts=True)
+    pair_rows, pair_cols = np.divmod(pairs, size)
+    df = np.bincount(pair_cols, minlength=size)
+    idf = np.log((1 + n) / (1 + df)) + 1
+    # 次線性 TF：同一個 n-gram 在標題中重複出現不會過度加分
+    weights = (1 + np.log(tf)) * idf[pair_cols]
+    norms = np.sqrt(np.bincount(pair_rows, weights ** 2, minlength=n))
+    norms[norms == 0] = 1.0
+
+    unseen_idf = math.log(1 + n) + 1
+    topic_scores = np.zeros((n, len(TOPIC_NAMES)))
+    # 所有標題都短於 n-gram（例如只有標點或單一字元）時沒有可比對的字串，主題相似度皆為 0
+    for t, (topic_codes, topic_tf) in enumerate(_TOPIC_GRAMS if size else []):
+        pos = np.minimum(np.searchsorted(vocab, topic_codes), size - 1)
+        found = vocab[pos] == topic_codes
+        topic_weights = (1 + np.log(topic_tf)) * np.where(found, idf[pos], unseen_idf)
+        dense = np.zeros(size)
+        dense[pos[found]] = topic_weights[found]
+        dot = np.bincount(pair_rows, weights * dense[pair_cols], minlength=n)
+        topic_scores[:, t] = dot / (norms * np.sqrt((topic_weights ** 2).sum()))
+
+    keywords = keyword_scores(titles)
+    cluster = np.log2(np.fromiter((max(cluster_sizes.get(title, 1), 1) for title in titles), dtype=float, count=n))
+    scores = SIMILARITY_WEIGHT * topic_scores.max(axis=1) + keywords + CLUSTER_WEIGHT * cluster
+
+    get_metrics().observe("prerank_seconds", time.perf_counter() - started)
+    return Ranking(list(titles), scores, topic_scores, keywords)
@@ -0,0 +1,132 @@
+# prompt_budget.py
+"""
+依 token 預算挑選送進提示詞的標題
+取代固定的 titles[:100] / titles[:50]：先以關鍵字、相似報導數量與新舊程度粗略評分，
+再依分數由高到低放入，直到用完 token 預算，並回報捨棄了幾則。
+"""
+
+import math
+import os
+import re
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# 標題區塊的預設 token 預算
+DEFAULT_TITLE_TOKEN_BUDGET = int(os.environ.get("PROMPT_TITLE_TOKEN_BUDGET", "4000"))
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# 編輯方針相關的關鍵字權重（政治、外交、經濟、對中政策、區域安全）
+KEYWORD_WEIGHTS: Dict[str, float] = {
+    "首相": 3.0, "政府": 2.0, "内閣": 2.0, "国会": 2.0, "選挙": 2.0, "自民": 1.5, "与党": 1.5, "野党": 1.5,
+    "外相": 3.0, "外交": 3.0, "首脳": 3.0, "会談": 2.0, "大使": 1.5, "条約": 2.0, "G7": 2.0,
+    "中国": 3.0, "台湾": 4.0, "習近平": 3.0, "尖閣": 3.5, "北朝鮮": 3.0, "韓国": 2.0, "ロシア": 2.0, "米国": 2.0,
+    "トランプ": 2.0, "防衛": 3.0, "安全保障": 3.5, "自衛隊": 2.5, "ミサイル": 3.0, "日米": 3.0, "日中": 3.5,
+    "経済": 2.0, "日銀": 2.5, "金利": 2.0, "関税": 2.5, "円安": 2.0, "円高": 2.0, "株価": 1.5, "貿易": 2.0,
+    "半導体": 2.5, "TSMC": 3.0, "サプライチェーン": 2.0, "エネルギー": 1.5,
+}
+CLUSTER_WEIGHT = 1.5
+RECENCY_WEIGHT = 1.0
+
+_CJK_RE = re.compile(r"[぀-ヿ㐀-鿿豈-﫿ｦ-ﾟ]")
+
+_encoder = None
+_encoder_loaded = False
+
+
+def _get_encoder(model: str = DEFAULT_MODEL):
+    """載入 tiktoken 編碼器；未安裝或無法載入時回傳 None"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+            try:
+                _encoder = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print(f"⚠️ 無法載入 tiktoken，改用估算 token 數：{e}")
+            _encoder = None
+    return _encoder
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """計算 token 數；沒有 tiktoken 時以「漢字假名一字一 token、其他四字元一 token」估算"""
+    encoder = _get_encoder(model)
+    if encoder is not None:
+        return len(encoder.encode(text))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def parse_pub_date(value: Optional[str]) -> Optional[datetime]:
+    """解析 RSS 的 pubDate（RFC 822）"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def score_title(title: str, cluster_size: int = 1, recency: float = 0.0) -> float:
+    """粗略評分：關鍵字權重 + 相似報導數量 + 新舊程度（0~1）"""
+    score = sum(weight for keyword, weight in KEYWORD_WEIGHTS.items() if keyword in title)
+    score += CLUSTER_WEIGHT * math.log2(max(cluster_size, 1))
+    score += RECENCY_WEIGHT * recency
+    return score
+
+
+class PackResult(NamedTuple):
+    titles: List[str]
+    dropped: int
+    used_tokens: int
+    budget: int
+
+
+def pack_titles(
+    titles: List[str],
+    budget_tokens: int = DEFAULT_TITLE_TOKEN_BUDGET,
+    render_line: Callable[[str], str] = lambda title: f"- {title}",
+    cluster_sizes: Optional[Dict[str, int]] = None,
+    published_at: Optional[Dict[str, datetime]] = None,
+    model: str = DEFAULT_MODEL,
+    scores: Optional[Dict[str, float]] = None,
+) -> PackResult:
+    """
+    依分數由高到低放入標題直到用完預算。
+    有 pubDate 時以發布時間計算新舊程度，否則以在清單中的位置（越後面越新）。
+    scores 為預先算好的相關性分數（prerank.rank_titles），提供時取代關鍵字與相似報導數量的評分。
+    """
+    cluster_sizes = cluster_sizes or {}
+    published_at = published_at or {}
+    if not titles:
+        return PackResult([], 0, 0, budget_tokens)
+
+    timestamps = [published_at[t].timestamp() for t in titles if published_at.get(t)]
+    oldest, newest = (min(timestamps), max(timestamps)) if timestamps else (0.0, 0.0)
+
+    def recency(index: int, title: str) -> float:
+        published = published_at.get(title)
+        if published and newest > oldest:
+            return (published.timestamp() - oldest) / (newest - oldest)
+        return index / max(len(titles) - 1, 1)
+
+    def score(i: int) -> float:
+        if scores is not None:
+            return scores.get(titles[i], 0.0) + RECENCY_WEIGHT * recency(i, titles[i])
+        return score_title(titles[i], cluster_sizes.get(titles[i], 1), recency(i, titles[i]))
+
+    ranked = sorted(range(len(titles)), key=score, reverse=True)
+
+    packed = []
+    used = 0
+    for i in ranked:
+        cost = count_tokens(render_line(titles[i]) + "\n", model)
+        if used + cost > budget_tokens:
+            continue
+        packed.append(titles[i])
+        used += cost
+
+    return PackResult(packed, len(titles) - len(packed), used, budget_tokens)
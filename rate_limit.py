@@ -0,0 +1,64 @@
+# rate_limit.py
+"""
+OpenAI 呼叫速率限制
+以權杖桶 (token bucket) 限制每分鐘請求數，多個執行緒共用同一個限制器。
+RateLimitedClient 包裝 OpenAI 客戶端，只有真正送出的請求會消耗額度（快取命中不受影響）。
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """每分鐘最多 rpm 次，允許瞬間使用 burst 次（執行緒安全）"""
+
+    def __init__(self, rpm: float, burst: int = 1):
+        if rpm <= 0:
+            raise ValueError("rpm 必須大於 0")
+        self.rate = rpm / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """取得一次額度，必要時等待；回傳等待秒數"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class _LimitedCompletions:
+    def __init__(self, completions, limiter: RateLimiter):
+        self._completions = completions
+        self._limiter = limiter
+
+    def create(self, **kwargs):
+        self._limiter.acquire()
+        return self._completions.create(**kwargs)
+
+
+class _LimitedChat:
+    def __init__(self, chat, limiter: RateLimiter):
+        self.completions = _LimitedCompletions(chat.completions, limiter)
+
+
+class RateLimitedClient:
+    """只包裝 client.chat.completions.create，其餘屬性直接轉給原本的客戶端"""
+
+    def __init__(self, client, limiter: RateLimiter):
+        self._client = client
+        self.limiter = limiter
+        self.chat = _LimitedChat(client.chat, limiter)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,378 @@
+# resilience.py
+"""
+外部呼叫的容錯層
+RSS、OpenAI 與 Supabase 共用：指數退避加隨機抖動的重試、每個相依服務的重試預算與斷路器，
+以及由 handler 執行時限傳遞下來的截止時間。
+截止時間存在 contextvars 中，同一個請求內的重試與逾時都不會超過剩餘時間；
+服務連續失敗時斷路器直接拒絕呼叫，不會把整個執行時限耗在已經掛掉的服務上。
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from metrics import get_metrics
+
+# 視為暫時性錯誤、可以重試的 HTTP 狀態碼
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# 第三方套件的暫時性錯誤（requests、httpx、openai），以類別名稱判斷，不必匯入這些套件
+_TRANSIENT_NAMES = frozenset({
+    "ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout", "ChunkedEncodingError",
+    "TransportError", "TimeoutException", "APIConnectionError", "APITimeoutError",
+    "RateLimitError", "InternalServerError",
+})
+# 從函數執行時限中保留給組裝回應的秒數
+DEFAULT_RESERVE = float(os.environ.get("DEADLINE_RESERVE_SECONDS", "1.5"))
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """剩餘時間不足以再發出請求"""
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，呼叫直接被拒絕"""
+
+
+class RetryableStatus(Exception):
+    """回應狀態碼代表暫時性錯誤（429、5xx 等）"""
+
+    def __init__(self, status_code: int, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    if code is None:
+        # postgrest 的 APIError 把 HTTP 狀態碼放在 code（可能是字串）
+        code = getattr(exc, "code", None)
+    if isinstance(code, str) and code.isdigit():
+        code = int(code)
+    return code if isinstance(code, int) else None
+
+
+def is_transient(exc: BaseException) -> bool:
+    """連線錯誤、逾時與 429 / 5xx 回應可以重試；其餘錯誤（格式錯誤、驗證失敗等）重試也無濟於事"""
+    if isinstance(exc, (DeadlineExceeded, CircuitOpenError)):
+        return False
+    if isinstance(exc, (ConnectionError, TimeoutError, RetryableStatus)):
+        return True
+    if any(cls.__name__ in _TRANSIENT_NAMES for cls in type(exc).__mro__):
+        return True
+    return _status_code(exc) in RETRYABLE_STATUSES
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """伺服器指定的等待秒數（Retry-After 標頭）"""
+    if isinstance(exc, RetryableStatus) and exc.retry_after is not None:
+        return exc.retry_after
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# --- 截止時間 ---
+
+def remaining() -> Optional[float]:
+    """目前截止時間的剩餘秒數；沒有設定截止時間時回傳 None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(dependency: str):
+    left = remaining()
+    if left is not None and left <= 0:
+        get_metrics().incr("deadline_exceeded", dependency=dependency)
+        raise DeadlineExceeded(f"{dependency}：已超過執行時限")
+
+
+def clamp_timeout(timeout):
+    """把逾時設定（秒數或 (連線, 讀取) tuple）限制在剩餘時間內"""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(left, 0.01)
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(left if t is None else min(t, left) for t in timeout)
+    return min(timeout, left)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """在區塊內設定截止時間；已有更早的截止時間時沿用較早者。seconds 為 None 時不設定"""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def handler_budget(context, reserve: float = DEFAULT_RESERVE) -> Optional[float]:
+    """
+    由函數 context 的剩餘執行時間推算可用秒數（扣掉組裝回應的保留時間）。
+    context 沒有 get_remaining_time_in_millis（例如本地測試）時改讀 FUNCTION_DEADLINE_SECONDS。
+    """
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if callable(get_remaining):
+        return max(get_remaining() / 1000 - reserve, 0.0)
+    configured = os.environ.get("FUNCTION_DEADLINE_SECONDS")
+    return float(configured) if configured else None
+
+
+# --- 重試策略與預算 ---
+
+class RetryPolicy:
+    """指數退避加完全隨機抖動（full jitter）：第 n 次重試等待 0 ~ min(max_delay, base * 2^(n-1)) 秒"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, exc: Optional[BaseException] = None) -> float:
+        retry_after = _retry_after(exc) if exc is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+DEFAULT_POLICY = RetryPolicy()
+# 只做斷路器與截止時間檢查，不重試（由呼叫端自行重試的情況）
+SINGLE_ATTEMPT = RetryPolicy(max_attempts=1)
+
+
+class RetryBudget:
+    """
+    重試預算（執行緒安全）：每次呼叫存入 ratio 個額度，每次重試取出 1 個，
+    服務大量失敗時重試次數最多約為呼叫數的 ratio 倍，不會放大對故障服務的流量。
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 10.0):
+        self.ratio = ratio
+        self.capacity = reserve
+        self._balance = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+# --- 斷路器 ---
+
+class CircuitBreaker:
+    """
+    連續失敗 failure_threshold 次後開啟，reset_timeout 秒內直接拒絕呼叫；
+    之後進入半開狀態只放行一個試探請求，成功即關閉，失敗則重新開啟。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def _transition(self, state: str):
+        self.state = state
+        get_metrics().incr("circuit_transitions", dependency=self.name, state=state)
+        if state == self.OPEN:
+            print(f"⚡ {self.name} 斷路器開啟，{self.reset_timeout:g} 秒內直接拒絕呼叫")
+
+    def before_call(self):
+        """呼叫前檢查；開啟中時拋出 CircuitOpenError"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    get_metrics().incr("circuit_rejections", dependency=self.name)
+                    raise CircuitOpenError(f"{self.name} 斷路器開啟中")
+                self._transition(self.HALF_OPEN)
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    get_metrics().incr("circuit_rejections", dependency=self.name)
+                    raise CircuitOpenError(f"{self.name} 斷路器半開，試探請求進行中")
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+
+# 每個相依服務一組斷路器與重試預算；暖機中的執行環境跨呼叫沿用
+_breakers: Dict[str, CircuitBreaker] = {}
+_budgets: Dict[str, RetryBudget] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(dependency: str) -> CircuitBreaker:
+    with _registry_lock:
+        if dependency not in _breakers:
+            _breakers[dependency] = CircuitBreaker(dependency)
+        return _breakers[dependency]
+
+
+def get_budget(dependency: str) -> RetryBudget:
+    with _registry_lock:
+        if dependency not in _budgets:
+            _budgets[dependency] = RetryBudget()
+        return _budgets[dependency]
+
+
+def circuit_states() -> Dict[str, str]:
+    with _registry_lock:
+        return {name: breaker.state for name, breaker in _breakers.items()}
+
+
+def reset():
+    """清除所有斷路器與重試預算（基準測試或本地測試用）"""
+    with _registry_lock:
+        _breakers.clear()
+        _budgets.clear()
+
+
+# --- 呼叫包裝 ---
+
+def _allow_retry(dependency: str, delay: float) -> bool:
+    """等待 delay 秒後重試是否仍在剩餘時間與重試預算之內"""
+    left = remaining()
+    if left is not None and delay >= left:
+        return False
+    if not get_budget(dependency).withdraw():
+        get_metrics().incr("retry_budget_exhausted", dependency=dependency)
+        return False
+    get_metrics().incr("retries", dependency=dependency)
+    return True
+
+
+def _next_delay(dependency: str, policy: RetryPolicy, attempt: int, exc: BaseException) -> Optional[float]:
+    """判斷是否再試一次並回傳等待秒數；不重試時回傳 None"""
+    if not is_transient(exc) or attempt >= policy.max_attempts:
+        return None
+    delay = policy.delay(attempt, exc)
+    return delay if _allow_retry(dependency, delay) else None
+
+
+def _record(breaker: CircuitBreaker, exc: BaseException):
+    # 服務有回應但內容有誤（例如 400）不代表服務故障
+    if is_transient(exc):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def call(dependency: str, fn: Callable, *args, policy: RetryPolicy = DEFAULT_POLICY, **kwargs):
+    """
+    以斷路器、截止時間與重試包裝同步呼叫。
+    需要逾時參數的呼叫請在 fn 內使用 clamp_timeout，每次重試都會依剩餘時間重新計算。
+    """
+    breaker = get_breaker(dependency)
+    get_budget(dependency).deposit()
+    attempt = 0
+    while True:
+        attempt += 1
+        check_deadline(dependency)
+        breaker.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            _record(breaker, e)
+            delay = _next_delay(dependency, policy, attempt, e)
+            if delay is None:
+                raise
+            print(f"🔁 {dependency} 第 {attempt} 次失敗（{e}），{delay:.1f} 秒後重試")
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+async def call_async(dependency: str, fn: Callable, *args, policy: RetryPolicy = DEFAULT_POLICY, **kwargs):
+    """call 的非同步版本，fn 回傳 awaitable"""
+    breaker = get_breaker(dependency)
+    get_budget(dependency).deposit()
+    attempt = 0
+    while True:
+        attempt += 1
+        check_deadline(dependency)
+        breaker.before_call()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            _record(breaker, e)
+            delay = _next_delay(dependency, policy, attempt, e)
+            if delay is None:
+                raise
+            print(f"🔁 {dependency} 第 {attempt} 次失敗（{e}），{delay:.1f} 秒後重試")
+            # asyncio 只有非同步流程需要，延遲匯入以免拖慢 Netlify Function 的冷啟動
+            import asyncio
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+def backoff(dependency: str, attempt: int, policy: RetryPolicy = DEFAULT_POLICY) -> bool:
+    """
+    自行控制重試迴圈時使用（例如 bulk_insert 只重送失敗的資料列）：
+    第 attempt 次重試前等待退避時間；剩餘時間或重試預算不足時回傳 False，不應再重試。
+    """
+    delay = policy.delay(attempt)
+    if not _allow_retry(dependency, delay):
+        return False
+    time.sleep(delay)
+    return True
+
+
+async def backoff_async(dependency: str, attempt: int, policy: RetryPolicy = DEFAULT_POLICY) -> bool:
+    """backoff 的非同步版本"""
+    delay = policy.delay(attempt)
+    if not _allow_retry(dependency, delay):
+        return False
+    import asyncio
+    await asyncio.sleep(delay)
+    return True
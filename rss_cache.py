@@ -0,0 +1,219 @@
+# rss_cache.py
+"""
+RSS 本地快取
+以日期為鍵、內容雜湊為檔名，保存 ETag / Last-Modified 以便送出條件式請求。
+已結束的日期（日本時間）內容不會再變動，視為永久有效；當天的內容在 TTL 內直接使用快取。
+超過容量或筆數上限時依最近使用時間 (LRU) 淘汰。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+JST = timezone(timedelta(hours=9))
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / ".rss_cache"
+# 當天（尚未結束）的 RSS 快取有效秒數
+DEFAULT_TTL = 600
+# 日期結束後再等幾小時才視為不會變動（上游可能延遲補登）
+DEFAULT_CLOSED_GRACE_HOURS = 6
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 400
+
+
+def is_closed_day(date_str: str, now: Optional[datetime] = None,
+                  grace_hours: float = DEFAULT_CLOSED_GRACE_HOURS) -> bool:
+    """判斷 YYYYMMDD 這一天（日本時間）是否已經結束"""
+    now = now or datetime.now(JST)
+    day_start = datetime.strptime(date_str, "%Y%m%d").replace(tzinfo=JST)
+    return now >= day_start + timedelta(days=1, hours=grace_hours)
+
+
+class RSSCache:
+    """以日期為鍵的 RSS 內容快取（執行緒安全）"""
+
+    def __init__(self, cache_dir=None, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 closed_grace_hours: float = DEFAULT_CLOSED_GRACE_HOURS):
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.closed_grace_hours = closed_grace_hours
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.cache_dir / "index.json"
+        self._index = self._load_index()
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = self._index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self._index_path)
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.cache_dir / f"{sha256}.xml"
+
+    def lookup(self, date_str: str) -> Optional[dict]:
+        """取得快取紀錄；內容檔遺失時視為不存在"""
+        with self._lock:
+            entry = self._index.get(date_str)
+            if entry and self._blob_path(entry["sha256"]).exists():
+                return dict(entry)
+            return None
+
+    def is_fresh(self, date_str: str, entry: dict) -> bool:
+        """已結束的日期永遠有效，否則依 TTL 判斷"""
+        if is_closed_day(date_str, grace_hours=self.closed_grace_hours):
+            return True
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[dict]) -> dict:
+        """組出條件式 GET 的標頭"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def path(self, date_str: str) -> Optional[Path]:
+        """回傳快取內容檔路徑，並更新最近使用時間"""
+        with self._lock:
+            entry = self._index.get(date_str)
+            if not entry:
+                return None
+            entry["last_access"] = time.time()
+            self._save_index()
+            return self._blob_path(entry["sha256"])
+
+    def read(self, date_str: str) -> Optional[str]:
+        """讀取快取內容"""
+        blob_path = self.path(date_str)
+        if blob_path is None:
+            return None
+        encoding = self._index.get(date_str, {}).get("encoding") or "utf-8"
+        return blob_path.read_bytes().decode(encoding, errors="replace")
+
+    def touch(self, date_str: str):
+        """收到 304 時刷新抓取時間"""
+        with self._lock:
+            entry = self._index.get(date_str)
+            if entry:
+                entry["fetched_at"] = time.time()
+                self._save_index()
+
+    def open_writer(self, date_str: str, etag: Optional[str] = None,
+                    last_modified: Optional[str] = None, encoding: Optional[str] = None) -> "CacheWriter":
+        """開啟逐段寫入器，邊下載邊寫入（不必整份放在記憶體）"""
+        return CacheWriter(self, date_str, etag, last_modified, encoding)
+
+    def store(self, date_str: str, chunks: Iterable[bytes], etag: Optional[str] = None,
+              last_modified: Optional[str] = None, encoding: Optional[str] = None) -> Path:
+        """逐段寫入內容，以 SHA-256 作為檔名"""
+        writer = self.open_writer(date_str, etag, last_modified, encoding)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def _commit(self, writer: "CacheWriter") -> Path:
+        sha256 = writer.digest.hexdigest()
+        blob_path = self._blob_path(sha256)
+        with self._lock:
+            if blob_path.exists():
+                writer.tmp_path.unlink()
+            else:
+                os.replace(writer.tmp_path, blob_path)
+            now = time.time()
+            self._index[writer.date_str] = {
+                "sha256": sha256,
+                "etag": writer.etag,
+                "last_modified": writer.last_modified,
+                "encoding": writer.encoding,
+                "size": writer.size,
+                "fetched_at": now,
+                "last_access": now,
+            }
+            self._evict()
+            self._save_index()
+        return blob_path
+
+    def put(self, date_str: str, body: Union[bytes, str], etag: Optional[str] = None,
+            last_modified: Optional[str] = None, encoding: Optional[str] = None) -> Path:
+        """寫入整份內容"""
+        if isinstance(body, str):
+            encoding = encoding or "utf-8"
+            body = body.encode(encoding)
+        return self.store(date_str, [body], etag, last_modified, encoding)
+
+    def _evict(self):
+        """依最近使用時間淘汰，直到符合容量與筆數上限（呼叫前需持有鎖）"""
+        by_access = sorted(self._index.items(), key=lambda kv: kv[1]["last_access"])
+        total_bytes = sum(e["size"] for _, e in by_access)
+        removed = []
+        while by_access and (len(by_access) > self.max_entries or total_bytes > self.max_bytes):
+            date_str, entry = by_access.pop(0)
+            total_bytes -= entry["size"]
+            removed.append(entry["sha256"])
+            del self._index[date_str]
+
+        # 同一份內容可能被多個日期共用，只刪除已無人引用的檔案
+        in_use = {e["sha256"] for e in self._index.values()}
+        for sha256 in set(removed) - in_use:
+            try:
+                self._blob_path(sha256).unlink()
+            except OSError:
+                pass
+
+
+class CacheWriter:
+    """RSSCache 的逐段寫入器；commit 前內容只存在暫存檔"""
+
+    def __init__(self, cache: RSSCache, date_str: str, etag: Optional[str],
+                 last_modified: Optional[str], encoding: Optional[str]):
+        self.cache = cache
+        self.date_str = date_str
+        self.etag = etag
+        self.last_modified = last_modified
+        self.encoding = encoding
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.tmp_path = cache.cache_dir / f".{date_str}.{threading.get_ident()}.part"
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> Path:
+        self._file.close()
+        return self.cache._commit(self)
+
+    def abort(self):
+        """放棄寫入（例如下載中斷）"""
+        self._file.close()
+        try:
+            self.tmp_path.unlink()
+        except OSError:
+            pass
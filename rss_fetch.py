@@ -0,0 +1,282 @@
+# rss_fetch.py
+"""
+RSS 抓取工具
+共用 keep-alive 連線池，一次並行抓取多個日期的新聞 RSS
+連線錯誤與 429 / 5xx 回應經由 resilience 重試，逾時不超過呼叫端的截止時間
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import get_metrics
+from resilience import RETRYABLE_STATUSES, RetryableStatus, call, call_async, clamp_timeout, remaining
+from rss_cache import RSSCache
+from rss_parse import CHUNK_SIZE, RSSItemParser, filter_items, iter_file_chunks, iter_rss_items
+
+RSS_URL = os.environ.get("RSS_URL", "https://japan-news-get.netlify.app/rss")
+# resilience 中的相依服務名稱（斷路器與重試預算以此區分）
+DEPENDENCY = "rss"
+
+# (連線逾時, 讀取逾時) 秒
+DEFAULT_TIMEOUT = (5, 30)
+# 整個抓取階段的總時限（秒）
+DEFAULT_DEADLINE = 90
+DEFAULT_MAX_WORKERS = 8
+# 連線池保留的主機數與每個主機的連線數（多來源時各主機共用同一個 Session）
+DEFAULT_POOL_SIZE = 32
+
+_session = None
+_cache = None
+_init_lock = threading.Lock()
+# 代表「使用預設快取」的標記
+_DEFAULT_CACHE = object()
+
+
+def get_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """取得共用的 keep-alive Session（整個程序只建立一次）"""
+    global _session
+    with _init_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def get_cache() -> Optional[RSSCache]:
+    """取得預設的 RSS 快取；設定 RSS_CACHE=off 可停用"""
+    global _cache
+    if os.environ.get("RSS_CACHE", "on").lower() in ("0", "off", "false"):
+        return None
+    with _init_lock:
+        if _cache is None:
+            _cache = RSSCache(os.environ.get("RSS_CACHE_DIR"))
+    return _cache
+
+
+def _status_error(res) -> RetryableStatus:
+    """暫時性錯誤的回應（429、5xx 等）轉成 RetryableStatus，交給 resilience 重試"""
+    retry_after = res.headers.get("Retry-After")
+    return RetryableStatus(res.status_code, f"RSS 錯誤：{res.status_code}",
+                           float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+
+def _get(session, url, timeout, headers, stream):
+    res = session.get(url, timeout=clamp_timeout(timeout), headers=headers, stream=stream)
+    get_metrics().incr("rss_requests", status=res.status_code)
+    if res.status_code in RETRYABLE_STATUSES:
+        res.close()
+        raise _status_error(res)
+    return res
+
+
+def feed_url(date_str: str) -> str:
+    return f"{RSS_URL}?date={date_str}"
+
+
+def fetch_rss(date_str, session=None, timeout=DEFAULT_TIMEOUT, cache=_DEFAULT_CACHE):
+    """抓取單一日期的 RSS XML（先查本地快取，過期時送出條件式請求）"""
+    session = session or get_session()
+    if cache is _DEFAULT_CACHE:
+        cache = get_cache()
+
+    entry = cache.lookup(date_str) if cache else None
+    if entry and cache.is_fresh(date_str, entry):
+        return cache.read(date_str)
+
+    url = feed_url(date_str)
+    res = call(DEPENDENCY, _get, session, url, timeout, RSSCache.conditional_headers(entry), False)
+    if res.status_code == 304 and entry:
+        cache.touch(date_str)
+        return cache.read(date_str)
+    if res.status_code != 200:
+        raise Exception(f"RSS 錯誤：{res.status_code}")
+
+    if cache:
+        cache.put(
+            date_str,
+            res.content,
+            etag=res.headers.get("ETag"),
+            last_modified=res.headers.get("Last-Modified"),
+            encoding=res.encoding,
+        )
+    return res.text
+
+
+def stream_rss_items(date_str, session=None, timeout=DEFAULT_TIMEOUT, cache=_DEFAULT_CACHE,
+                     url: Optional[str] = None, dependency: str = DEPENDENCY) -> Iterator[dict]:
+    """
+    串流下載並解析單一日期的 RSS，每解析完一個 item 就產出。
+    下載的內容同時逐段寫入快取，快取有效時直接從檔案串流解析。
+    url / dependency 預設為 RSS_URL 與 rss，其他來源（feed_sources）可指定自己的網址與斷路器名稱。
+    """
+    session = session or get_session()
+    if cache is _DEFAULT_CACHE:
+        cache = get_cache()
+
+    entry = cache.lookup(date_str) if cache else None
+    if entry and cache.is_fresh(date_str, entry):
+        get_metrics().incr("rss_cache_hits")
+        yield from iter_rss_items(iter_file_chunks(cache.path(date_str)), source="cache")
+        return
+
+    url = url or feed_url(date_str)
+    headers = RSSCache.conditional_headers(entry)
+    # 只重試建立連線到收到回應標頭為止；開始串流後中斷就直接失敗，避免重複產出項目
+    with call(dependency, _get, session, url, timeout, headers, True) as res:
+        if res.status_code == 304 and entry:
+            cache.touch(date_str)
+            yield from iter_rss_items(iter_file_chunks(cache.path(date_str)), source="cache")
+            return
+        if res.status_code != 200:
+            raise Exception(f"RSS 錯誤：{res.status_code}")
+
+        writer = None
+        if cache:
+            writer = cache.open_writer(
+                date_str,
+                etag=res.headers.get("ETag"),
+                last_modified=res.headers.get("Last-Modified"),
+                encoding=res.encoding,
+            )
+
+        def chunks():
+            for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                if writer:
+                    writer.write(chunk)
+                yield chunk
+
+        try:
+            yield from iter_rss_items(chunks(), source="network")
+        except BaseException:
+            # 下載或解析中斷（包含呼叫端提前停止），不寫入不完整的快取
+            if writer:
+                writer.abort()
+            raise
+        if writer:
+            writer.commit()
+
+
+def fetch_rss_items(date_str, session=None, timeout=DEFAULT_TIMEOUT, cache=_DEFAULT_CACHE,
+                    url: Optional[str] = None, dependency: str = DEPENDENCY) -> List[dict]:
+    """串流抓取並過濾單一日期的新聞項目（下載與解析同時進行）"""
+    return list(filter_items(stream_rss_items(date_str, session=session, timeout=timeout, cache=cache,
+                                              url=url, dependency=dependency)))
+
+
+async def fetch_rss_items_async(http, date_str, cache=_DEFAULT_CACHE, url: Optional[str] = None,
+                                dependency: str = DEPENDENCY) -> List[dict]:
+    """
+    fetch_rss_items 的非同步版本，http 為 httpx.AsyncClient（逾時設定由 client 決定，並受截止時間限制）。
+    每收到一段內容就交給增量解析器，並同步寫入快取。
+    """
+    if cache is _DEFAULT_CACHE:
+        cache = get_cache()
+
+    entry = cache.lookup(date_str) if cache else None
+    if entry and cache.is_fresh(date_str, entry):
+        get_metrics().incr("rss_cache_hits")
+        return list(filter_items(iter_rss_items(iter_file_chunks(cache.path(date_str)), source="cache")))
+
+    url = url or feed_url(date_str)
+    headers = RSSCache.conditional_headers(entry)
+
+    async def open_stream():
+        # 有截止時間時，單次請求的逾時不超過剩餘時間（否則沿用 client 的逾時設定）
+        left = remaining()
+        request = http.build_request("GET", url, headers=headers,
+                                     **({"timeout": max(left, 0.01)} if left is not None else {}))
+        res = await http.send(request, stream=True)
+        get_metrics().incr("rss_requests", status=res.status_code)
+        if res.status_code in RETRYABLE_STATUSES:
+            await res.aclose()
+            raise _status_error(res)
+        return res
+
+    res = await call_async(dependency, open_stream)
+    try:
+        if res.status_code == 304 and entry:
+            cache.touch(date_str)
+            return list(filter_items(iter_rss_items(iter_file_chunks(cache.path(date_str)), source="cache")))
+        if res.status_code != 200:
+            raise Exception(f"RSS 錯誤：{res.status_code}")
+
+        writer = None
+        if cache:
+            writer = cache.open_writer(
+                date_str,
+                etag=res.headers.get("ETag"),
+                last_modified=res.headers.get("Last-Modified"),
+                encoding=res.encoding,
+            )
+        parser = RSSItemParser()
+        items = []
+        try:
+            async for chunk in res.aiter_bytes(CHUNK_SIZE):
+                if writer:
+                    writer.write(chunk)
+                items.extend(parser.feed(chunk))
+            items.extend(parser.close())
+        except BaseException:
+            if writer:
+                writer.abort()
+            raise
+        if writer:
+            writer.commit()
+    finally:
+        await res.aclose()
+    parser.record_metrics("network")
+    return list(filter_items(items))
+
+
+def fetch_rss_many(
+    date_strs: List[str],
+    fetch: Optional[Callable] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    timeout=DEFAULT_TIMEOUT,
+    deadline: float = DEFAULT_DEADLINE,
+) -> Tuple[Dict[str, object], Dict[str, Exception]]:
+    """
+    並行抓取多個日期，回傳 (成功結果, 失敗原因)，兩者皆以日期為鍵並維持輸入順序。
+    fetch 預設為 fetch_rss，可替換成任何 fetch(date_str, session=..., timeout=...) 的函數。
+    超過 deadline（或呼叫端截止時間，取較早者）仍未完成的日期會被標記為逾時。
+    """
+    fetch = fetch or fetch_rss
+    if not date_strs:
+        return {}, {}
+    left = remaining()
+    if left is not None:
+        deadline = max(min(deadline, left), 0)
+
+    session = get_session()
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(date_strs))))
+    # 工作執行緒沿用呼叫端的 contextvars，截止時間才會傳到每個請求
+    futures = {
+        executor.submit(contextvars.copy_context().run, fetch, date_str, session=session, timeout=timeout): date_str
+        for date_str in date_strs
+    }
+    done, _ = wait(futures, timeout=deadline)
+    # 不等待逾時的工作，避免單一日期拖住整個流程
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = {}
+    errors = {}
+    for future, date_str in futures.items():
+        if future not in done:
+            errors[date_str] = TimeoutError(f"超過總時限 {deadline} 秒")
+        elif future.exception() is not None:
+            errors[date_str] = future.exception()
+        else:
+            results[date_str] = future.result()
+
+    ordered_results = {d: results[d] for d in date_strs if d in results}
+    ordered_errors = {d: errors[d] for d in date_strs if d in errors}
+    return ordered_results, ordered_errors
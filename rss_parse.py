@@ -0,0 +1,122 @@
+# rss_parse.py
+"""
+RSS 串流解析
+以 XMLPullParser 邊接收邊解析，每解析完一個 <item> 就交出並從樹上移除，
+記憶體用量不隨 RSS 大小成長。
+"""
+
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from metrics import get_metrics
+from title_filter import TitleFilter, get_title_filter
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _local_name(tag: str) -> str:
+    """去除 XML 命名空間前綴"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(item: ET.Element, name: str) -> Optional[str]:
+    for child in item:
+        if _local_name(child.tag) == name:
+            return child.text.strip() if child.text else None
+    return None
+
+
+class RSSItemParser:
+    """增量解析器：feed() 餵入一段內容，回傳這段內容中解析完成的 item"""
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack = []
+        # 累計的輸入位元組、解析耗時與項目數
+        self.bytes_fed = 0
+        self.parse_seconds = 0.0
+        self.item_count = 0
+
+    def feed(self, chunk: Union[bytes, str]) -> List[Dict[str, Optional[str]]]:
+        started = time.perf_counter()
+        self.bytes_fed += len(chunk)
+        self._parser.feed(chunk)
+        items = self._drain()
+        self.parse_seconds += time.perf_counter() - started
+        return items
+
+    def close(self) -> List[Dict[str, Optional[str]]]:
+        started = time.perf_counter()
+        self._parser.close()
+        items = self._drain()
+        self.parse_seconds += time.perf_counter() - started
+        return items
+
+    def record_metrics(self, source: str):
+        """把累計值寫入量測（source 為 network 或 cache）"""
+        metrics = get_metrics()
+        metrics.incr("rss_bytes", self.bytes_fed, source=source)
+        metrics.incr("rss_items", self.item_count, source=source)
+        metrics.incr("rss_parse_seconds", self.parse_seconds)
+
+    def _drain(self) -> List[Dict[str, Optional[str]]]:
+        items = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                continue
+            self._stack.pop()
+            if _local_name(elem.tag) != "item":
+                continue
+            items.append({
+                "title": _child_text(elem, "title"),
+                "link": _child_text(elem, "link"),
+                "pubDate": _child_text(elem, "pubDate"),
+            })
+            # 解析完就丟掉，避免整棵樹留在記憶體
+            if self._stack:
+                self._stack[-1].remove(elem)
+            elem.clear()
+        self.item_count += len(items)
+        return items
+
+
+def iter_rss_items(chunks: Iterable[Union[bytes, str]],
+                   source: Optional[str] = None) -> Iterator[Dict[str, Optional[str]]]:
+    """逐段餵入 XML，每完成一個 item 就產出 {title, link, pubDate}；指定 source 時完成後記錄量測"""
+    parser = RSSItemParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+    if source:
+        parser.record_metrics(source)
+
+
+def iter_file_chunks(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """分段讀取檔案"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def filter_items(items: Iterable[Dict[str, Optional[str]]],
+                 title_filter: Optional[TitleFilter] = None) -> Iterator[Dict[str, Optional[str]]]:
+    """略過沒有標題或符合排除規則的項目"""
+    title_filter = title_filter or get_title_filter()
+    for item in items:
+        title = item.get("title")
+        if not title:
+            continue
+        if not title_filter.allows(title):
+            continue
+        yield item
+
+
+def parse_rss_titles(rss_xml, title_filter: Optional[TitleFilter] = None) -> List[str]:
+    """解析整份 XML 字串中的標題"""
+    return [item["title"] for item in filter_items(iter_rss_items([rss_xml]), title_filter)]
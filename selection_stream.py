@@ -0,0 +1,252 @@
+# selection_stream.py
+"""
+串流選稿
+以串流接收 GPT 回應並邊收邊掃描 JSON：選稿陣列中的每個物件一完整就以 SelectedHeadline 驗證，
+通過後立即交給 on_item（例如先寫入本地紀錄），不必等整個回應結束。
+結構化輸出時請求與追問都附上正好所需數量的 JSON schema。
+回應格式錯誤、項目缺欄位或不足 5 則時，只針對缺少的數量補發一次追問：
+沿用原本的提示詞開頭（可命中 OpenAI 的提示詞快取），回應也只包含缺少的項目，不重跑整個選稿。
+標題不在提示詞中的項目一律捨棄。追問後仍不足 5 則時改以非串流的完整選稿補齊
+（已交給 on_item 的項目保留在前面），仍湊不齊才拋出 IncompleteSelectionError。
+"""
+
+import json
+import time
+from typing import Callable, List, Optional
+
+from pydantic import ValidationError
+
+from llm_cache import LLMCache, cached_chat_completion, get_llm_cache, stream_chat_completion
+from metrics import get_metrics
+from news_models import (EXPECTED_SELECTIONS, STRUCTURED_OUTPUTS, HeadlineSelection, SelectedHeadline,
+                         check_selection, selection_from_items, selection_response_format)
+from title_dedupe import normalize_title, strip_cluster_marker
+
+MODEL = "gpt-4o-mini"
+TEMPERATURE = 0.3
+EXPECTED_ITEMS = EXPECTED_SELECTIONS
+MAX_FOLLOW_UPS = 1
+
+# 代表「使用預設快取」的標記
+_DEFAULT_CACHE = object()
+
+ItemCallback = Callable[[SelectedHeadline], None]
+
+
+class IncompleteSelectionError(ValueError):
+    """追問與非串流補齊後仍湊不到所需數量的有效項目"""
+
+
+class SelectionScanner:
+    """
+    增量 JSON 掃描器：找出最外層物件中的第一個陣列，陣列中每個物件結束時就解析並回傳。
+    只追蹤字串、跳脫字元與括號深度，每個字元只看一次。
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.malformed = 0
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._array_depth: Optional[int] = None
+        self._array_closed = False
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.text += chunk
+        items = []
+        for i in range(self._pos, len(self.text)):
+            c = self.text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+            if c == '"':
+                self._in_string = True
+            elif c == "{" or c == "[":
+                self._depth += 1
+                if c == "[" and self._array_depth is None and self._depth == 2:
+                    self._array_depth = self._depth
+                elif (c == "{" and not self._array_closed and self._array_depth is not None
+                      and self._depth == self._array_depth + 1):
+                    self._item_start = i
+            elif c == "}" or c == "]":
+                if c == "}" and self._item_start is not None and self._depth == self._array_depth + 1:
+                    try:
+                        items.append(json.loads(self.text[self._item_start:i + 1]))
+                    except ValueError:
+                        self.malformed += 1
+                    self._item_start = None
+                elif c == "]" and self._depth == self._array_depth:
+                    self._array_closed = True
+                self._depth -= 1
+        self._pos = len(self.text)
+        return items
+
+
+def validate_item(raw) -> Optional[SelectedHeadline]:
+    """單一項目驗證：三個欄位都必須是非空字串（不套用 HeadlineSelection 的預設值）"""
+    if not isinstance(raw, dict):
+        return None
+    try:
+        item = SelectedHeadline.model_validate(raw)
+    except ValidationError:
+        return None
+    item.title = strip_cluster_marker(item.title.strip())
+    if not (item.title and item.reason.strip() and item.writing_direction.strip()):
+        return None
+    return item
+
+
+class _Collector:
+    """
+    收集通過驗證且不重複的項目，並記錄第一個結果出現的時間。
+    titles 為提示詞中的標題，指定時不在其中的項目（GPT 自行改寫或編造的標題）一律捨棄。
+    """
+
+    def __init__(self, expected: int, on_item: Optional[ItemCallback], started: float,
+                 titles: Optional[List[str]] = None):
+        self.expected = expected
+        self.on_item = on_item
+        self.started = started
+        self.items: List[SelectedHeadline] = []
+        self._seen = set()
+        self._allowed = None if titles is None else {normalize_title(strip_cluster_marker(t)) for t in titles}
+
+    def add(self, raw) -> bool:
+        metrics = get_metrics()
+        item = validate_item(raw)
+        if item is None:
+            metrics.incr("llm_invalid_items")
+            return False
+        key = normalize_title(item.title)
+        if self._allowed is not None and key not in self._allowed:
+            metrics.incr("llm_unknown_titles")
+            return False
+        if key in self._seen or len(self.items) >= self.expected:
+            return False
+        self._seen.add(key)
+        self.items.append(item)
+        if len(self.items) == 1:
+            metrics.observe("llm_first_item_seconds", time.perf_counter() - self.started)
+        metrics.incr("llm_stream_items")
+        if self.on_item is not None:
+            self.on_item(item)
+        return True
+
+    @property
+    def missing(self) -> int:
+        return self.expected - len(self.items)
+
+
+def _raw_items(data) -> list:
+    """回應中的第一個陣列（與 HeadlineSelection 一樣接受 selections 以外的鍵名）"""
+    if not isinstance(data, dict):
+        return []
+    if isinstance(data.get("selections"), list):
+        return data["selections"]
+    return next((value for value in data.values() if isinstance(value, list)), [])
+
+
+def _dump(items: List[SelectedHeadline]) -> str:
+    return json.dumps({"selections": [item.model_dump() for item in items]}, ensure_ascii=False)
+
+
+def follow_up_messages(messages: List[dict], items: List[SelectedHeadline], missing: int) -> List[dict]:
+    """在原本的對話後附上已通過的結果，只要求補上缺少的數量"""
+    return messages + [
+        {"role": "assistant", "content": _dump(items)},
+        {"role": "user", "content": (
+            f"上面的結果只有 {len(items)} 則有效。請從同一份新聞標題中再選出 {missing} 則，"
+            f"不可與已選的標題重複，每則都要有 title、reason、writing_direction。"
+            f"只回傳新增的 {missing} 則，格式為 {{\"selections\": [...]}}。"
+        )},
+    ]
+
+
+def stream_selection(client, messages: List[dict], titles: Optional[List[str]] = None,
+                     on_item: Optional[ItemCallback] = None, prompt_log: Optional[List[dict]] = None,
+                     expected: int = EXPECTED_ITEMS, model: str = MODEL,
+                     cache=_DEFAULT_CACHE) -> HeadlineSelection:
+    """
+    串流選稿並回傳 HeadlineSelection；titles 為提示詞中的標題（快取鍵的一部分）。
+    完整結果以與 cached_chat_completion 相同的鍵寫入快取，之後串流或一般呼叫都能直接命中。
+    """
+    if cache is _DEFAULT_CACHE:
+        cache = get_llm_cache()
+    metrics = get_metrics()
+    started = time.perf_counter()
+    collector = _Collector(expected, on_item, started, titles)
+
+    response_format = selection_response_format(expected)
+    key = LLMCache.make_key(model, messages, TEMPERATURE, response_format, titles)
+    content = cache.get(key) if cache is not None else None
+    if content is not None:
+        # 快取內容同樣要湊齊有效項目才採用，否則重新選稿
+        cached = _Collector(expected, None, started, titles)
+        for raw in _raw_items(json.loads(content)):
+            cached.add(raw)
+        if cached.missing <= 0:
+            metrics.incr("llm_cache_hits")
+            print("💾 使用 LLM 快取結果")
+            for item in cached.items:
+                collector.add(item.model_dump())
+            return selection_from_items(collector.items)
+
+    scanner = SelectionScanner()
+    try:
+        for delta in stream_chat_completion(client, model, messages, TEMPERATURE, response_format):
+            for raw in scanner.feed(delta):
+                collector.add(raw)
+    except Exception as e:
+        # 串流中斷：已通過驗證的項目保留，其餘由追問補齊
+        if not collector.items:
+            raise
+        print(f"⚠️ 串流中斷（{e}），保留已收到的 {len(collector.items)} 則")
+    if scanner.malformed:
+        metrics.incr("llm_invalid_items", scanner.malformed)
+    # 第一次回應就湊齊有效項目才算通過驗證（與非串流的 llm_validation_failures 同一指標）
+    mode = "json_schema" if STRUCTURED_OUTPUTS else "json_object"
+    metrics.incr("llm_validations", mode=mode)
+    if collector.missing > 0:
+        metrics.incr("llm_validation_failures", mode=mode)
+
+    for _ in range(MAX_FOLLOW_UPS):
+        if collector.missing <= 0:
+            break
+        print(f"🔁 有效結果 {len(collector.items)} 則，追問補上 {collector.missing} 則")
+        metrics.incr("llm_follow_ups")
+        follow_up = follow_up_messages(messages, collector.items, collector.missing)
+        if prompt_log is not None:
+            prompt_log.append({"model": model, "messages": follow_up})
+        try:
+            reply = cached_chat_completion(client, model=model, messages=follow_up, temperature=TEMPERATURE,
+                                           response_format=selection_response_format(collector.missing),
+                                           cache=cache)
+            extra = json.loads(reply)
+        except Exception as e:
+            print(f"⚠️ 追問失敗：{e}")
+            break
+        for raw in _raw_items(extra):
+            collector.add(raw)
+
+    if collector.missing > 0:
+        # 追問後仍不足：改用非串流的完整選稿補齊，已收到的項目保留在前面
+        print(f"🔁 有效結果 {len(collector.items)} 則，改用非串流選稿補齊")
+        metrics.incr("llm_stream_fallbacks")
+        reply = cached_chat_completion(client, model=model, messages=messages, temperature=TEMPERATURE,
+                                       response_format=response_format, validate=check_selection, cache=None)
+        for raw in _raw_items(json.loads(reply)):
+            collector.add(raw)
+
+    if collector.missing > 0:
+        raise IncompleteSelectionError(f"只取得 {len(collector.items)} 則有效結果（需要 {expected} 則）")
+    if cache is not None:
+        cache.put(key, _dump(collector.items), model)
+    return selection_from_items(collector.items)
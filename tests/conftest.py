@@ -0,0 +1,13 @@
+# tests/conftest.py
+"""共用設定：專案根目錄的模組可直接匯入，快取與本地紀錄都寫到暫存目錄"""
+
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("RSS_CACHE", "off")
+os.environ.setdefault("LLM_CACHE", "off")
+os.environ.setdefault("LOCAL_STORE", "off")
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+import async_pipeline
+import resilience
+from async_pipeline import run_pipeline
+from news_models import SelectedHeadline, selection_from_items
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    resilience.reset()
+    yield
+    resilience.reset()
+
+
+class FakeAsyncSupabase:
+    """記錄每批寫入與每次驗證查詢；fail_verify 時驗證查詢失敗"""
+
+    def __init__(self, fail_verify=False):
+        self.batches = []
+        self.selects = []
+        self.stored = {}
+        self.fail_verify = fail_verify
+
+    def table(self, name):
+        return FakeAsyncQuery(self)
+
+
+class FakeAsyncQuery:
+    def __init__(self, client):
+        self.client = client
+        self.rows = None
+        self.ids = None
+
+    def upsert(self, rows, **kwargs):
+        self.rows = rows
+        return self
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, ids):
+        self.ids = ids
+        return self
+
+    async def execute(self):
+        await asyncio.sleep(0)
+        if self.rows is not None:
+            self.client.batches.append([row["id"] for row in self.rows])
+            self.client.stored.update((row["id"], row) for row in self.rows)
+            return type("Response", (), {"data": self.rows})()
+        self.client.selects.append(self.ids)
+        if self.client.fail_verify:
+            raise ValueError("查詢失敗")
+        return type("Response", (), {"data": [self.client.stored[i] for i in self.ids]})()
+
+
+def _fake_feeds(monkeypatch, titles_by_date, failing=()):
+    async def fetch_feed_items_async(http, date_str, limiter=None, shared=None):
+        await asyncio.sleep(0)
+        if date_str in failing:
+            raise ConnectionError("down")
+        return [{"title": title, "pubDate": None} for title in titles_by_date.get(date_str, [])]
+
+    monkeypatch.setattr(async_pipeline, "fetch_feed_items_async", fetch_feed_items_async)
+
+
+def _select(calls):
+    async def select(unique_titles, cluster_sizes, published_at):
+        calls.append(list(unique_titles))
+        return selection_from_items([
+            SelectedHeadline(title=title, reason="r", writing_direction="w") for title in unique_titles
+        ])
+    return select
+
+
+def _run(*args, **kwargs):
+    return asyncio.run(run_pipeline(*args, log=lambda message: None, **kwargs))
+
+
+def test_rows_are_written_in_batches_and_read_back(monkeypatch):
+    titles = ["防衛相が会見", "台風が九州に接近", "日銀が金利を据え置き",
+              "新幹線が運転再開", "株価が最高値を更新", "大谷選手が本塁打", "猛暑で熱中症搬送"]
+    _fake_feeds(monkeypatch, {"20250701": titles[:3], "20250702": titles[3:]})
+    supabase = FakeAsyncSupabase()
+    calls = []
+
+    result = _run(["20250701", "20250702"], None, supabase, _select(calls), persist_batch_size=3)
+
+    assert result["errors"] == {}
+    assert sorted(result["titles"]) == sorted(titles)
+    assert len(calls) == 1
+    assert result["unique_titles"] == titles
+    assert [len(batch) for batch in supabase.batches] == [3, 3, 1]
+    assert supabase.selects == supabase.batches
+    assert all(status["ok"] for status in result["statuses"])
+    assert {record["id"] for record in result["records"]} == {status["id"] for status in result["statuses"]}
+    # 預設寫入最後一個目標日期
+    assert {record["date"] for record in result["records"]} == {"20250702"}
+
+
+def test_failed_date_is_reported_and_the_rest_still_runs(monkeypatch):
+    _fake_feeds(monkeypatch, {"20250702": ["台風接近"]}, failing={"20250701"})
+    supabase = FakeAsyncSupabase()
+
+    result = _run(["20250701", "20250702"], None, supabase, _select([]))
+
+    assert set(result["errors"]) == {"20250701"}
+    assert result["titles"] == ["台風接近"]
+    assert [status["ok"] for status in result["statuses"]] == [True]
+
+
+def test_no_titles_skips_selection_and_writes(monkeypatch):
+    _fake_feeds(monkeypatch, {})
+    supabase = FakeAsyncSupabase()
+    calls = []
+
+    result = _run(["20250701"], None, supabase, _select(calls))
+
+    assert result["selection"] is None
+    assert calls == []
+    assert supabase.batches == []
+
+
+def test_verify_failure_does_not_affect_write_statuses(monkeypatch):
+    _fake_feeds(monkeypatch, {"20250701": ["台風接近", "防衛相会見"]})
+    supabase = FakeAsyncSupabase(fail_verify=True)
+    monkeypatch.setattr(resilience, "_next_delay", lambda *args: None)
+
+    result = _run(["20250701"], None, supabase, _select([]))
+
+    assert [status["ok"] for status in result["statuses"]] == [True, True]
+    assert result["records"] == []
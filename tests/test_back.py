@@ -0,0 +1,57 @@
+import json
+import subprocess
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+FUNCTIONS = ROOT / "netlify" / "functions"
+HEAVY_MODULES = ("openai", "supabase", "pydantic", "numpy", "httpx")
+
+
+@pytest.fixture
+def back(monkeypatch):
+    monkeypatch.syspath_prepend(str(FUNCTIONS))
+    import back
+    monkeypatch.setattr(back, "_openai_client", None)
+    monkeypatch.setattr(back, "_supabase_client", None)
+    return back
+
+
+def test_health_check_does_not_import_the_pipeline():
+    # 在新的程序中量測，避免其他測試已匯入的模組影響結果
+    script = (
+        "import json, sys\n"
+        f"sys.path[:0] = [{str(FUNCTIONS)!r}, {str(ROOT)!r}]\n"
+        "import back\n"
+        "response = back.handler({'httpMethod': 'GET'}, None)\n"
+        f"print(json.dumps({{'status': response['statusCode'], 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            cwd=str(ROOT)).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    assert result == {"status": 200, "loaded": []}
+
+
+def test_clients_are_created_once_per_warm_instance(back, monkeypatch):
+    created = []
+
+    class OpenAI:
+        def __init__(self, **kwargs):
+            created.append("openai")
+
+    def create_client(url, key):
+        created.append("supabase")
+        return object()
+
+    monkeypatch.setitem(sys.modules, "openai", types.SimpleNamespace(OpenAI=OpenAI))
+    monkeypatch.setitem(sys.modules, "supabase", types.SimpleNamespace(create_client=create_client))
+    monkeypatch.setenv("SUPABASE_URL", "http://localhost")
+    monkeypatch.setenv("SUPABASE_KEY", "key")
+
+    first = back.get_clients()
+    second = back.get_clients()
+    assert first == second
+    assert created == ["openai", "supabase"]
@@ -0,0 +1,90 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import backfill
+from backfill import Checkpoint, date_range, run_backfill
+
+# backfill_day 由測試替換，OpenAI 客戶端只需要能被速率限制器包裝
+OPENAI = SimpleNamespace(chat=SimpleNamespace(completions=None))
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.sent = []
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.sent.extend(row["id"] for row in rows)
+        self._rows = rows
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self._rows})()
+
+
+def _fake_day(calls, interrupt_on=None, slow_after=None):
+    lock = threading.Lock()
+
+    def backfill_day(date_str, openai_client):
+        with lock:
+            calls.append(date_str)
+        if date_str == interrupt_on:
+            raise KeyboardInterrupt
+        if slow_after and date_str > slow_after:
+            time.sleep(0.05)
+        rows = [{"id": f"{date_str}-{i}", "date": date_str, "title": f"{date_str} 標題{i}", "reason": "r",
+                 "writing_direction": "w", "created_at": "2024-01-01T00:00:00+00:00"} for i in range(2)]
+        return {"titles": 10, "unique_titles": 8}, rows
+
+    return backfill_day
+
+
+def test_days_are_checkpointed_per_chunk(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(backfill, "backfill_day", _fake_day(calls))
+    checkpoint = Checkpoint(tmp_path / "cp.json")
+    supabase = FakeSupabase()
+    marked = []
+    original = checkpoint.mark_done
+
+    def mark_done(date_str, info):
+        # 記錄寫入檢查點當下已送出的資料列數
+        marked.append((date_str, len(supabase.sent)))
+        original(date_str, info)
+
+    monkeypatch.setattr(checkpoint, "mark_done", mark_done)
+    done, failed = run_backfill(date_range("20240101", "20240105"), workers=1, checkpoint=checkpoint,
+                                openai_client=OPENAI, supabase_client=supabase, sync_every=2)
+    assert failed == {}
+    assert sorted(done) == date_range("20240101", "20240105")
+    assert all(info["saved"] == 2 for info in done.values())
+    # 每兩天同步一次：第一批的日期在第二批送出前就已寫入檢查點
+    assert marked[:2] == [("20240101", 4), ("20240102", 4)]
+    assert len(supabase.sent) == 10
+
+
+def test_interrupted_run_resumes_from_the_checkpoint(monkeypatch, tmp_path):
+    dates = date_range("20240101", "20240106")
+    calls = []
+    monkeypatch.setattr(backfill, "backfill_day", _fake_day(calls, interrupt_on="20240104", slow_after="20240104"))
+    supabase = FakeSupabase()
+    with pytest.raises(KeyboardInterrupt):
+        run_backfill(dates, workers=1, checkpoint=Checkpoint(tmp_path / "cp.json"),
+                     openai_client=OPENAI, supabase_client=supabase, sync_every=2)
+    # 中斷前選好的日期都已同步並寫入檢查點；尚未開始的日期被取消
+    reopened = Checkpoint(tmp_path / "cp.json")
+    assert sorted(reopened.done) == ["20240101", "20240102", "20240103"]
+    assert "20240106" not in calls
+
+    calls.clear()
+    monkeypatch.setattr(backfill, "backfill_day", _fake_day(calls))
+    done, failed = run_backfill(dates, workers=1, checkpoint=reopened, openai_client=OPENAI,
+                                supabase_client=supabase, sync_every=2)
+    assert sorted(calls) == ["20240104", "20240105", "20240106"]
+    assert sorted(done) == ["20240104", "20240105", "20240106"] and failed == {}
+    assert sorted(Checkpoint(tmp_path / "cp.json").done) == dates
@@ -0,0 +1,45 @@
+import json
+from types import SimpleNamespace
+
+import batch_select
+from batch_select import collect, submit
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.uploaded = []
+        self.files = SimpleNamespace(create=self._upload, content=None)
+        self.batches = SimpleNamespace(create=lambda **kwargs: SimpleNamespace(id="batch_1"),
+                                       retrieve=lambda batch_id: SimpleNamespace(
+                                           id=batch_id, status="completed", output_file_id=None,
+                                           error_file_id=None))
+
+    def _upload(self, file, purpose):
+        self.uploaded.extend(json.loads(line) for line in file.read_text(encoding="utf-8").splitlines())
+        return SimpleNamespace(id="file_1")
+
+
+def _prepare(date_str):
+    if date_str == "20240102":
+        raise ConnectionError("RSS 逾時")
+    if date_str == "20240103":
+        return None
+    return {"date": date_str, "titles": ["標題"], "limited_titles": ["標題"],
+            "request": {"custom_id": batch_select.custom_id(date_str), "body": {"messages": []}}}
+
+
+def test_failed_day_is_recorded_and_the_rest_submitted(monkeypatch, tmp_path):
+    monkeypatch.setattr(batch_select, "prepare_day", _prepare)
+    client = FakeOpenAI()
+
+    manifest_path = submit(["20240101", "20240102", "20240103", "20240104"], client, tmp_path)
+
+    assert [request["custom_id"] for request in client.uploaded] == ["selection-20240101", "selection-20240104"]
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    assert sorted(manifest["days"]) == ["20240101", "20240104"]
+    assert list(manifest["failed"]) == ["20240102"]
+    assert "RSS 逾時" in manifest["failed"]["20240102"]
+
+    # collect 也把送出前失敗的日期列為失敗
+    _, failed = collect(manifest_path, client, supabase_client=object())
+    assert "RSS 逾時" in failed["20240102"]
@@ -0,0 +1,71 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from bench.stubs import StubServer, StubState, fake_selection, synthetic_titles
+from rss_parse import iter_rss_items
+
+
+@pytest.fixture
+def server():
+    with StubServer(StubState(items_per_feed=20, llm_latency=0, db_latency=0)) as server:
+        yield server
+
+
+def _request(url, data=None, headers=None):
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    request = urllib.request.Request(url, data=body, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as res:
+            return res.status, res.headers, res.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_synthetic_titles_are_reproducible_per_date():
+    assert synthetic_titles("20240101", 50) == synthetic_titles("20240101", 50)
+    assert synthetic_titles("20240101", 50) != synthetic_titles("20240102", 50)
+
+
+def test_rss_is_served_with_etag_and_counted(server):
+    status, headers, body = _request(f"{server.url}/rss?date=20240101")
+    assert status == 200
+    titles = [item["title"] for item in iter_rss_items([body])]
+    assert titles == synthetic_titles("20240101", 20)
+
+    status, _, body = _request(f"{server.url}/rss?date=20240101", headers={"If-None-Match": headers["ETag"]})
+    assert (status, body) == (304, b"")
+    assert server.state.requests["rss"] == 2
+
+
+def test_injected_failures_answer_503_then_recover(server):
+    server.state.inject_failures("rss", 1)
+    assert _request(f"{server.url}/rss?date=20240101")[0] == 503
+    assert _request(f"{server.url}/rss?date=20240101")[0] == 200
+    assert server.state.requests["rss_failed"] == 1
+
+
+def test_rest_insert_and_select(server):
+    rows = [{"id": "a", "date": "20240101"}, {"id": "b", "date": "20240102"}]
+    assert _request(f"{server.url}/rest/v1/selected_news", rows)[0] == 201
+    # 沒有 ignore-duplicates 時重複的 ID 回應 409；有的話略過已存在的資料列
+    assert _request(f"{server.url}/rest/v1/selected_news", rows[:1])[0] == 409
+    status, _, body = _request(f"{server.url}/rest/v1/selected_news", rows[:1],
+                               {"Prefer": "resolution=ignore-duplicates"})
+    assert (status, json.loads(body)) == (201, [])
+
+    status, _, body = _request(f"{server.url}/rest/v1/selected_news?select=*&id=in.(%22b%22)")
+    assert json.loads(body) == [rows[1]]
+    assert server.state.requests == {"supabase_write": 3, "supabase_read": 1}
+
+
+def test_fake_selection_picks_titles_from_the_prompt_and_follow_up():
+    messages = [{"role": "user", "content": "新聞標題：\n- 甲\n- 乙 ［相似報導 3 則］\n- 丙"}]
+    first = json.loads(fake_selection(messages, 2))["selections"]
+    assert [item["title"] for item in first] == ["甲", "乙"]
+
+    messages += [{"role": "assistant", "content": json.dumps({"selections": first}, ensure_ascii=False)},
+                 {"role": "user", "content": "還不夠，請再選出 1 則"}]
+    assert [item["title"] for item in json.loads(fake_selection(messages))["selections"]] == ["丙"]
@@ -0,0 +1,73 @@
+# tests/test_cascade.py
+import numpy as np
+import pytest
+
+import cascade
+from bench.stubs import synthetic_titles
+
+SUBJECTS = [
+    "尖閣諸島周辺で中国海警局の船が領海侵入", "防衛相が台湾有事の対応を説明", "日米首脳会談で半導体協力に合意",
+    "北朝鮮が弾道ミサイル発射、EEZ外に落下", "日銀総裁が利上げを示唆 円相場が急伸",
+    "中国外務省が日本産水産物の輸入停止を継続", "自民党総裁選の日程決まる",
+]
+
+
+@pytest.fixture(scope="module")
+def runs():
+    """每次執行都有 5 則明顯的重要新聞，其餘為合成標題"""
+    rng = np.random.default_rng(1)
+    result = []
+    for d in range(24):
+        picked = [f"{s}（{d}日）" for s in rng.choice(SUBJECTS, 5, replace=False)]
+        result.append((synthetic_titles(f"202401{d + 1:02d}", 150) + picked, picked))
+    return result
+
+
+@pytest.fixture(scope="module")
+def model(runs):
+    return cascade.train(runs[4:], epochs=150)
+
+
+def test_is_confident():
+    assert cascade.is_confident(np.array([0.9, 0.9, 0.9, 0.9, 0.8, 0.1]))
+    assert not cascade.is_confident(np.array([0.9, 0.9, 0.9, 0.9, 0.8, 0.7]))  # 與第 6 則差距太小
+    assert not cascade.is_confident(np.array([0.9, 0.9, 0.9, 0.9, 0.5, 0.0]))  # 第 5 則不夠有把握
+    assert not cascade.is_confident(np.array([0.9, 0.9]))
+
+
+def test_train_requires_positives():
+    assert cascade.train([(["a", "b"], ["存在しない"])]) is None
+
+
+def test_model_finds_clear_picks(runs, model):
+    raw_titles, picked = runs[0]
+    probabilities = model.predict(raw_titles)
+    top = {raw_titles[i] for i in np.argsort(-probabilities)[:5]}
+    assert top == set(picked)
+
+
+def test_save_and_load(tmp_path, runs, model):
+    loaded = cascade.LinearModel.load(model.save(tmp_path / "model.npz"))
+    titles = runs[0][0]
+    assert np.allclose(loaded.predict(titles), model.predict(titles))
+
+
+def test_cascade_tiers(runs, model):
+    titles = runs[0][0]
+    calls = []
+
+    def llm_select(candidates):
+        calls.append(candidates)
+        return "llm"
+
+    result = cascade.cascade_select(titles, llm_select, model=model)
+    assert result.tier == cascade.TIER_LOCAL and not calls
+    assert len(result.selection.selections) == 5
+    # 範本填寫的理由可由前綴辨識
+    assert all(item.reason.startswith(cascade.LOCAL_REASON_PREFIX) for item in result.selection.selections)
+
+    result = cascade.cascade_select(titles, llm_select, model=model, llm_text=True)
+    assert result.tier == cascade.TIER_LOCAL_TEXT and len(calls[-1]) == 5
+
+    result = cascade.cascade_select(titles, llm_select, model=model._replace(bias=model.bias - 20))
+    assert result.tier == cascade.TIER_LLM and calls[-1] == titles
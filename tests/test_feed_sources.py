@@ -0,0 +1,117 @@
+import asyncio
+import threading
+
+import pytest
+
+import feed_sources
+from feed_sources import FeedSource, HostLimiter, SharedFeeds, fetch_feed_items_async, fetch_feeds_many
+
+DATED = FeedSource("dated", "http://dated.example/{date}.xml")
+LATEST = FeedSource("latest", "http://latest.example/rss.xml")
+
+
+@pytest.fixture
+def fake_fetch(monkeypatch):
+    """依網址回傳固定項目，並記錄每個網址被抓取的次數"""
+    calls = {}
+    lock = threading.Lock()
+
+    def fetch_rss_items(date_str, session=None, timeout=None, cache=None, url=None, dependency=None):
+        with lock:
+            calls[url] = calls.get(url, 0) + 1
+        if url == LATEST.url:
+            return [{"title": "一日目", "pubDate": "Mon, 01 Jan 2024 12:00:00 +0900"},
+                    {"title": "二日目", "pubDate": "Tue, 02 Jan 2024 12:00:00 +0900"}]
+        return [{"title": f"{date_str} の記事", "pubDate": None}]
+
+    monkeypatch.setattr(feed_sources, "fetch_rss_items", fetch_rss_items)
+    return calls
+
+
+def test_undated_source_is_fetched_once_and_split_by_date(fake_fetch):
+    results, errors = fetch_feeds_many(["20240101", "20240102", "20240103"], [DATED, LATEST])
+    assert errors == {}
+    assert fake_fetch[LATEST.url] == 1
+    assert sum(count for url, count in fake_fetch.items() if url != LATEST.url) == 3
+    assert [item["title"] for item in results["20240101"] if item["feed"] == "latest"] == ["一日目"]
+    assert [item["title"] for item in results["20240102"] if item["feed"] == "latest"] == ["二日目"]
+    assert [item["title"] for item in results["20240103"]] == ["20240103 の記事"]
+
+
+def test_undated_source_failure_counts_for_every_date(monkeypatch):
+    def fetch_rss_items(date_str, url=None, **kwargs):
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(feed_sources, "fetch_rss_items", fetch_rss_items)
+    results, errors = fetch_feeds_many(["20240101", "20240102"], [LATEST])
+    assert results == {}
+    assert set(errors) == {"20240101", "20240102"}
+
+
+def test_async_fetch_propagates_cancellation(monkeypatch):
+    async def fetch_rss_items_async(http, date_str, cache=None, url=None, dependency=None):
+        if url == LATEST.url:
+            raise asyncio.CancelledError()
+        return [{"title": "記事", "pubDate": None}]
+
+    monkeypatch.setattr(feed_sources, "fetch_rss_items_async", fetch_rss_items_async)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(fetch_feed_items_async(None, "20240101", [DATED, LATEST]))
+
+
+def test_async_fetch_keeps_partial_results_on_ordinary_errors(monkeypatch):
+    async def fetch_rss_items_async(http, date_str, cache=None, url=None, dependency=None):
+        if url == LATEST.url:
+            raise ConnectionError("down")
+        return [{"title": "記事", "pubDate": None}]
+
+    monkeypatch.setattr(feed_sources, "fetch_rss_items_async", fetch_rss_items_async)
+    items = asyncio.run(fetch_feed_items_async(None, "20240101", [DATED, LATEST]))
+    assert [item["title"] for item in items] == ["記事"]
+
+
+def test_async_undated_source_is_fetched_once_per_run(monkeypatch):
+    calls = {}
+
+    async def fetch_rss_items_async(http, date_str, cache=None, url=None, dependency=None):
+        calls[url] = calls.get(url, 0) + 1
+        await asyncio.sleep(0.01)
+        if url == LATEST.url:
+            return [{"title": "一日目", "pubDate": "Mon, 01 Jan 2024 12:00:00 +0900"},
+                    {"title": "二日目", "pubDate": "Tue, 02 Jan 2024 12:00:00 +0900"}]
+        return [{"title": f"{date_str} の記事", "pubDate": None}]
+
+    monkeypatch.setattr(feed_sources, "fetch_rss_items_async", fetch_rss_items_async)
+    dates = ["20240101", "20240102", "20240103"]
+
+    async def run():
+        limiter, shared = HostLimiter(), SharedFeeds()
+        try:
+            return await asyncio.gather(*(fetch_feed_items_async(None, date_str, [DATED, LATEST], limiter, shared)
+                                          for date_str in dates))
+        finally:
+            await shared.aclose()
+
+    results = dict(zip(dates, asyncio.run(run())))
+    assert calls[LATEST.url] == 1
+    assert sum(count for url, count in calls.items() if url != LATEST.url) == 3
+    assert [item["title"] for item in results["20240101"] if item["feed"] == "latest"] == ["一日目"]
+    assert [item["title"] for item in results["20240102"] if item["feed"] == "latest"] == ["二日目"]
+    assert [item["title"] for item in results["20240103"]] == ["20240103 の記事"]
+
+
+def test_async_pipeline_fetches_undated_source_once(monkeypatch):
+    import async_pipeline
+
+    calls = []
+
+    async def fetch_rss_items_async(http, date_str, cache=None, url=None, dependency=None):
+        calls.append(url)
+        return [{"title": "記事", "pubDate": "Mon, 01 Jan 2024 12:00:00 +0900"}]
+
+    monkeypatch.setattr(feed_sources, "fetch_rss_items_async", fetch_rss_items_async)
+    monkeypatch.setattr(feed_sources, "_sources", [LATEST])
+    results, errors = asyncio.run(async_pipeline._collect(None, ["20240101", "20240102"], 4, 5, lambda _: None))
+    assert calls == [LATEST.url]
+    assert [item["title"] for item in results["20240101"]] == ["記事"]
+    assert results["20240102"] == []
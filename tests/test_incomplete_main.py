@@ -0,0 +1,109 @@
+import importlib.util
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+import resilience
+from bench.stubs import StubServer, StubState
+
+MAIN = Path(__file__).resolve().parent.parent / "in-complute" / "main.py"
+
+
+@pytest.fixture
+def main(monkeypatch):
+    resilience.reset()
+    spec = importlib.util.spec_from_file_location("incomplete_main", MAIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, "LOCAL_LLM_BASE_URL", None)
+    yield module
+    resilience.reset()
+
+
+@pytest.fixture
+def server(main, monkeypatch):
+    with StubServer(StubState(llm_latency=0)) as server:
+        monkeypatch.setattr(main, "OLLAMA_HOST", server.url)
+        yield server
+
+
+def test_present_model_is_not_pulled(main, server):
+    main.ensure_llama_model()
+    assert server.state.requests == {"ollama_tags": 1}
+
+
+def test_missing_model_is_pulled(main, server, monkeypatch):
+    monkeypatch.setattr(main, "LOCAL_MODEL", "qwen3:8b")
+    main.ensure_llama_model()
+    assert server.state.requests == {"ollama_tags": 1, "ollama_pull": 1}
+
+
+def test_chat_keeps_the_model_loaded(main, monkeypatch):
+    sent = []
+
+    class Response:
+        status_code = 200
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"message": {"content": "{}"}}
+
+    class Session:
+        def request(self, method, url, timeout=None, json=None):
+            sent.append(json)
+            return Response()
+
+    monkeypatch.setattr(main, "_session", Session())
+    monkeypatch.setattr(main, "KEEP_ALIVE", "1h")
+    assert main.chat("提示詞") == "{}"
+    assert sent[0]["keep_alive"] == "1h"
+    assert sent[0]["stream"] is False
+
+
+def test_select_maps_ids_back_to_titles(main, server):
+    titles = ["防衛相が会見", "台風が九州に接近", "日銀が金利を据え置き",
+              "新幹線が運転再開", "株価が最高値を更新", "猛暑で熱中症搬送"]
+    result = main.select(titles)
+    assert [item["title"] for item in result["selections"]] == titles[:5]
+    assert server.state.requests == {"ollama": 1}
+
+
+def test_invalid_or_duplicate_ids_are_dropped(main, monkeypatch):
+    monkeypatch.setattr(main, "chat", lambda prompt: json.dumps({"selections": [
+        {"id": 2, "reason": "r"}, {"id": "2"}, {"id": 9}, {"id": "x"}, "1",
+    ]}))
+    assert main.select(["甲", "乙"]) == {"selections": [{"title": "乙", "reason": "r", "writing_direction": ""}]}
+    monkeypatch.setattr(main, "chat", lambda prompt: json.dumps({"selections": [{"id": 9}]}))
+    with pytest.raises(ValueError):
+        main.select(["甲", "乙"])
+
+
+def test_long_lists_are_shortlisted_in_shards(main, monkeypatch):
+    monkeypatch.setattr(main, "SHARD_SIZE", 4)
+    monkeypatch.setattr(main, "SHORTLIST_SIZE", 2)
+    monkeypatch.setattr(main, "cluster_titles",
+                        lambda titles: [type("Cluster", (), {"representative": t}) for t in titles])
+    prompts = []
+
+    def chat(prompt):
+        prompts.append(prompt)
+        count = len(re.findall(r"^\d+ ", prompt, re.M))
+        if "防衛相" in prompt and '"ids"' in prompt:
+            raise ConnectionError("down")
+        if '"ids"' in prompt:
+            return json.dumps({"ids": [count, count - 1]})
+        return json.dumps({"selections": [{"id": i} for i in range(1, count + 1)]})
+
+    monkeypatch.setattr(main, "chat", chat)
+    titles = [f"記事{i}" for i in range(9)] + ["防衛相が会見"]
+
+    result = main.analyze_titles(titles)
+
+    # 10 則分成 3 組初選，每組選 2 則（失敗的組以前 2 則遞補），決選從 6 則中選出 5 則
+    assert len(prompts) == 4
+    assert len(re.findall(r"^\d+ ", prompts[-1], re.M)) == 6
+    assert len(result["selections"]) == 5
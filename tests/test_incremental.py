@@ -0,0 +1,60 @@
+import gpt
+import local_store
+from local_store import LocalStore
+from news_store import build_rows
+from news_models import SelectedHeadline
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.sent = []
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.sent.extend(rows)
+        self._rows = rows
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self._rows})()
+
+
+def _store(monkeypatch, tmp_path):
+    store = LocalStore(tmp_path / "log.db", seed=None)
+    monkeypatch.setenv("LOCAL_STORE", "on")
+    monkeypatch.setattr(local_store, "_default_store", store)
+    supabase = FakeSupabase()
+    monkeypatch.setattr(gpt, "get_supabase_client", lambda: supabase)
+    return store, supabase
+
+
+def _picks(prefix):
+    return [SelectedHeadline(title=f"{prefix}{i}", reason="r", writing_direction="w") for i in range(5)]
+
+
+def test_no_fresh_titles_carries_the_prior_picks(monkeypatch, tmp_path):
+    store, supabase = _store(monkeypatch, tmp_path)
+    store.record_run("20250701", build_rows("20250701", _picks("昨天")), model="gpt-4o-mini")
+
+    gpt.carry_prior_selection(store, "20250702", ["昨天0"])
+
+    assert [row["date"] for row in supabase.sent] == ["20250702"] * 5
+    assert sorted(row["title"] for row in store.history("20250702")) == [f"昨天{i}" for i in range(5)]
+
+
+def test_day_with_picks_is_left_alone(monkeypatch, tmp_path):
+    store, supabase = _store(monkeypatch, tmp_path)
+    store.record_run("20250702", build_rows("20250702", _picks("今天")), model="gpt-4o-mini")
+
+    gpt.carry_prior_selection(store, "20250702")
+
+    assert supabase.sent == []
+    assert store.stats()["runs"] == 1
+
+
+def test_nothing_to_carry(monkeypatch, tmp_path):
+    store, supabase = _store(monkeypatch, tmp_path)
+    assert gpt.carry_prior_selection(store, "20250702") is None
+    assert supabase.sent == []
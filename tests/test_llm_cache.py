@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import llm_cache
+from llm_cache import LLMCache, cached_chat_completion
+
+MESSAGES = [{"role": "user", "content": "選稿"}]
+
+
+class CountingClient:
+    def __init__(self, content='{"selections": []}'):
+        self.calls = 0
+        self.content = content
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_key_covers_every_part_of_the_prompt():
+    base = LLMCache.make_key("gpt-4o-mini", MESSAGES, 0.3, {"type": "json_object"}, ["a", "b"])
+    assert base == LLMCache.make_key("gpt-4o-mini", [dict(MESSAGES[0])], 0.3, {"type": "json_object"}, ["a", "b"])
+    assert base != LLMCache.make_key("gpt-4o", MESSAGES, 0.3, {"type": "json_object"}, ["a", "b"])
+    assert base != LLMCache.make_key("gpt-4o-mini", MESSAGES, 0.0, {"type": "json_object"}, ["a", "b"])
+    assert base != LLMCache.make_key("gpt-4o-mini", MESSAGES, 0.3, None, ["a", "b"])
+    assert base != LLMCache.make_key("gpt-4o-mini", MESSAGES, 0.3, {"type": "json_object"}, ["b", "a"])
+
+
+def test_entries_expire_and_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMCache(tmp_path / "cache.sqlite", ttl=100, max_entries=2)
+    cache.put("a", "A")
+    now[0] += 1
+    cache.put("b", "B")
+    now[0] += 1
+    assert cache.get("a") == "A"   # a 變成最近使用
+    now[0] += 1
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    now[0] += 200
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_cached_completion_calls_the_api_once(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite")
+    client = CountingClient()
+    first = cached_chat_completion(client, "gpt-4o-mini", MESSAGES, 0.3, cache=cache)
+    second = cached_chat_completion(client, "gpt-4o-mini", MESSAGES, 0.3, cache=cache)
+    assert first == second and client.calls == 1
+
+
+def test_invalid_response_is_not_cached(tmp_path):
+    cache = LLMCache(tmp_path / "cache.sqlite")
+    client = CountingClient("not json")
+
+    def validate(content):
+        raise ValueError("格式錯誤")
+
+    with pytest.raises(ValueError):
+        cached_chat_completion(client, "gpt-4o-mini", MESSAGES, cache=cache, validate=validate)
+    assert cache.stats()["entries"] == 0
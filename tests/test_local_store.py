@@ -0,0 +1,120 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import local_store
+from local_store import LocalStore
+
+
+class FakeSupabase:
+    """記錄每次寫入送出的資料列（bulk_insert 只用到 table().upsert().execute()）"""
+
+    def __init__(self, delay=0.0):
+        self.sent = []
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, **kwargs):
+        return FakeQuery(self, rows)
+
+
+class FakeQuery:
+    def __init__(self, client, rows):
+        self.client = client
+        self.rows = rows
+
+    def execute(self):
+        time.sleep(self.client.delay)
+        with self.client._lock:
+            self.client.sent.extend(row["id"] for row in self.rows)
+        return type("Response", (), {"data": self.rows})()
+
+
+def _rows(date_str, count):
+    return [{"id": f"{date_str}-{i}", "date": date_str, "title": f"{date_str} 標題{i}", "reason": "r",
+             "writing_direction": "w", "created_at": f"2024-01-01T00:00:0{i}+00:00"} for i in range(count)]
+
+
+def test_sync_with_ids_only_sends_those_rows(tmp_path):
+    store = LocalStore(tmp_path / "log.db")
+    store.record_run("20240101", _rows("20240101", 3))
+    store.record_run("20240102", _rows("20240102", 2))
+    client = FakeSupabase()
+    statuses = store.sync(client, ids=[f"20240102-{i}" for i in range(2)])
+    assert sorted(s["id"] for s in statuses) == ["20240102-0", "20240102-1"]
+    assert sorted(client.sent) == ["20240102-0", "20240102-1"]
+    assert store.stats()["pending"] == 3
+    store.sync(client)
+    assert store.stats()["pending"] == 0
+    assert len(client.sent) == 5
+
+
+def test_concurrent_full_syncs_send_each_row_once(tmp_path):
+    store = LocalStore(tmp_path / "log.db")
+    for day in range(4):
+        store.record_run(f"2024010{day}", _rows(f"2024010{day}", 5))
+    client = FakeSupabase(delay=0.01)
+    threads = [threading.Thread(target=store.sync, args=(client, 5)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(client.sent) == len(set(client.sent)) == 20
+
+
+def test_default_path_is_outside_the_repository(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path))
+    assert local_store._default_db_path() == tmp_path / "auto_pick_news" / "news_selection_log.db"
+    monkeypatch.delenv("XDG_STATE_HOME")
+    assert Path(local_store.__file__).resolve().parent not in local_store._default_db_path().parents
+
+
+def _legacy_db(path):
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE selection_log (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, "
+                 "local_fallback INTEGER, fetched_at TEXT, selected_json TEXT)")
+    selected = {
+        "選出的標題": ["首相が訪米", "日銀が利上げ"],
+        "選擇理由": ["理由一", "理由二"],
+        "建議寫作方向與角度": [{"標題": "日銀が利上げ", "寫作方向": "方向二"}],
+    }
+    conn.execute("INSERT INTO selection_log (date, local_fallback, fetched_at, selected_json) VALUES (?, ?, ?, ?)",
+                 ("20250702", 0, "2025-07-02T15:51:41+00:00",
+                  "```json\n" + json.dumps(selected, ensure_ascii=False) + "\n```"))
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_seed_is_migrated_once_and_left_untouched(tmp_path):
+    seed = tmp_path / "seed.db"
+    _legacy_db(seed)
+    before = seed.read_bytes()
+    store = LocalStore(tmp_path / "log.db", seed=seed)
+    rows = store.history("20250702")
+    assert sorted((row["title"], row["reason"]) for row in rows) == [("日銀が利上げ", "理由二"), ("首相が訪米", "理由一")]
+    assert all(row["synced_at"] for row in rows)
+    assert store.stats() == {"runs": 1, "rows": 2, "pending": 0, "seen_titles": 0}
+    assert seed.read_bytes() == before
+    # 已轉入後不再讀取 seed
+    seed.unlink()
+    assert LocalStore(tmp_path / "log.db", seed=seed).stats()["rows"] == 2
+
+
+def test_legacy_table_in_the_same_file_is_migrated(tmp_path):
+    path = tmp_path / "news_selection_log.db"
+    _legacy_db(path)
+    store = LocalStore(path, seed=None)
+    assert [row["title"] for row in store.history("20250702", title="日銀")] == ["日銀が利上げ"]
+
+
+def test_shipped_legacy_log_parses():
+    conn = sqlite3.connect(f"{local_store.LEGACY_DB_PATH.as_uri()}?mode=ro", uri=True)
+    (selected_json,) = conn.execute("SELECT selected_json FROM selection_log WHERE date = '20250702'").fetchone()
+    conn.close()
+    items = local_store.parse_legacy_selection(selected_json)
+    assert len(items) == 5 and all(item["reason"] and item["writing_direction"] for item in items)
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import metrics
+from metrics import Metrics, export_from_env
+
+
+def test_counters_are_keyed_by_sorted_labels():
+    m = Metrics()
+    m.incr("db_requests")
+    m.incr("db_requests", 2)
+    m.incr("rss_items", 5, source="nhk", date="20240101")
+    assert m.counters == {"db_requests": 3, 'rss_items{date="20240101",source="nhk"}': 5}
+
+
+def test_histogram_keeps_totals_beyond_the_sample_window(monkeypatch):
+    monkeypatch.setattr(metrics, "MAX_SAMPLES", 3)
+    m = Metrics()
+    for value in (1, 2, 3, 4, 5):
+        m.observe("latency", value)
+    hist = m.snapshot()["histograms"]["latency"]
+    # 百分位數只看最近的樣本，count 與 sum 涵蓋全部
+    assert (hist["count"], hist["sum"], hist["min"], hist["max"], hist["p50"]) == (5, 15, 3, 5, 4)
+
+
+def test_span_records_attributes_errors_and_duration_histogram():
+    m = Metrics()
+    with m.span("fetch", dates=2) as attributes:
+        attributes["items"] = 10
+    with pytest.raises(KeyError):
+        with m.span("parse"):
+            raise KeyError("title")
+
+    spans = m.snapshot()["spans"]
+    assert [span["name"] for span in spans] == ["fetch", "parse"]
+    assert spans[0]["attributes"] == {"dates": 2, "items": 10}
+    assert spans[1]["error"] == "KeyError"
+    assert set(m.histograms) == {'span_seconds{span="fetch"}', 'span_seconds{span="parse"}'}
+
+
+def test_prometheus_format():
+    m = Metrics()
+    m.incr("db_requests", table="selected_news")
+    m.incr("db_requests", table="other")
+    m.observe("latency", 0.5)
+    lines = m.to_prometheus().splitlines()
+    assert lines.count("# TYPE auto_pick_news_db_requests_total counter") == 1
+    assert 'auto_pick_news_db_requests_total{table="selected_news"} 1' in lines
+    assert 'auto_pick_news_latency{quantile="0.95"} 0.5' in lines
+    assert "auto_pick_news_latency_count 1" in lines
+
+
+def test_export_from_env_appends_json_lines(monkeypatch, tmp_path):
+    out = tmp_path / "metrics.jsonl"
+    monkeypatch.setenv("METRICS_EXPORT", "jsonl")
+    monkeypatch.setenv("METRICS_OUT", str(out))
+    m = Metrics()
+    with m.span("llm"):
+        m.incr("llm_calls")
+
+    export_from_env(m)
+    export_from_env(m)
+
+    records = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [record["type"] for record in records] == ["span", "counter", "histogram"] * 2
+    assert records[1] == {"type": "counter", "name": "llm_calls", "value": 1}
+
+
+def test_export_without_env_or_with_unknown_format(monkeypatch, capsys):
+    monkeypatch.delenv("METRICS_EXPORT", raising=False)
+    export_from_env(Metrics())
+    assert capsys.readouterr().out == ""
+    with pytest.raises(ValueError):
+        Metrics().export("csv")
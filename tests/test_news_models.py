@@ -0,0 +1,50 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from news_models import HeadlineSelection, load_selection, parse_strict_selection
+
+
+def _item(i):
+    return {"title": f"標題{i}", "reason": f"理由{i}", "writing_direction": f"方向{i}"}
+
+
+def _content(items, key="selections"):
+    return json.dumps({key: items}, ensure_ascii=False)
+
+
+def test_strict_accepts_exact_schema():
+    parsed = parse_strict_selection(_content([_item(i) for i in range(5)]))
+    assert isinstance(parsed, HeadlineSelection)
+    assert [item.title for item in parsed.selections] == [f"標題{i}" for i in range(5)]
+
+
+@pytest.mark.parametrize("content", [
+    None,
+    "",
+    _content([_item(i) for i in range(4)]),
+    _content([_item(i) for i in range(5)], key="articles"),
+    _content([{**_item(0), "reason": "  "}] + [_item(i) for i in range(1, 5)]),
+    _content([{"title": "只有標題"}] + [_item(i) for i in range(1, 5)]),
+    _content([{**_item(0), "extra": "x"}] + [_item(i) for i in range(1, 5)]),
+    _content([{**_item(0), "title": 1}] + [_item(i) for i in range(1, 5)]),
+])
+def test_strict_rejects_what_lenient_would_repair(content):
+    with pytest.raises((ValueError, ValidationError)):
+        parse_strict_selection(content)
+
+
+def test_json_mode_keeps_lenient_parsing():
+    parsed = load_selection(_content([{"title": "只有標題"}], key="articles"), structured=False, record=False)
+    assert parsed.selections[0].reason == "未提供理由"
+    with pytest.raises((ValueError, ValidationError)):
+        load_selection(_content([{"title": "只有標題"}], key="articles"), structured=True, record=False)
+
+
+def test_lenient_parsing_falls_back_to_any_list_of_items():
+    parsed = load_selection(_content([_item(i) for i in range(5)], key="top_stories"), structured=False, record=False)
+    assert [item.title for item in parsed.selections] == [f"標題{i}" for i in range(5)]
+    # 不像新聞項目的陣列不採用
+    with pytest.raises((ValueError, ValidationError)):
+        load_selection(json.dumps({"tags": ["a", "b"]}), structured=False, record=False)
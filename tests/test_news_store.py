@@ -0,0 +1,113 @@
+import pytest
+
+import news_store
+import resilience
+from news_store import bulk_insert
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(monkeypatch):
+    resilience.reset()
+    # 重試之間不等待
+    monkeypatch.setattr(news_store, "backoff", lambda dependency, attempt: True)
+    yield
+    resilience.reset()
+
+
+class FakeSupabase:
+    """
+    記錄每次請求的資料列；bad 中的 ID 讓整批請求失敗（資料錯誤），
+    transient 次數內的請求以連線錯誤失敗。existing 中的 ID 在 upsert 時被略過（不出現在回應中）。
+    """
+
+    def __init__(self, bad=(), transient=0, existing=()):
+        self.requests = []
+        self.bad = set(bad)
+        self.transient = transient
+        self.existing = set(existing)
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, **kwargs):
+        return FakeQuery(self, rows)
+
+    insert = upsert
+
+
+class FakeQuery:
+    def __init__(self, client, rows):
+        self.client = client
+        self.rows = rows
+
+    def execute(self):
+        self.client.requests.append([row["id"] for row in self.rows])
+        if self.client.transient:
+            self.client.transient -= 1
+            raise ConnectionError("連線中斷")
+        if any(row["id"] in self.client.bad for row in self.rows):
+            raise ValueError("欄位格式錯誤")
+        data = [row for row in self.rows if row["id"] not in self.client.existing]
+        self.client.existing.update(row["id"] for row in data)
+        return type("Response", (), {"data": data})()
+
+
+def _rows(count):
+    return [{"id": f"id{i}", "title": f"標題{i}"} for i in range(count)]
+
+
+def test_one_request_for_the_whole_batch():
+    client = FakeSupabase()
+    statuses = bulk_insert(client, _rows(5))
+    assert client.requests == [[f"id{i}" for i in range(5)]]
+    assert all(status["ok"] and not status["existed"] for status in statuses)
+
+
+def test_bad_row_is_isolated_by_bisection():
+    client = FakeSupabase(bad={"id2"})
+    statuses = bulk_insert(client, _rows(5))
+    assert [status["id"] for status in statuses] == [f"id{i}" for i in range(5)]
+    assert [status["ok"] for status in statuses] == [True, True, False, True, True]
+    assert "欄位格式錯誤" in statuses[2]["error"]
+    # 資料錯誤不重試
+    assert statuses[2]["attempts"] == 1
+
+
+def test_transient_failure_retries_the_whole_batch_without_splitting():
+    client = FakeSupabase(transient=1)
+    statuses = bulk_insert(client, _rows(4))
+    assert client.requests == [[f"id{i}" for i in range(4)]] * 2
+    assert all(status["ok"] and status["attempts"] == 2 for status in statuses)
+
+
+def test_ids_are_deterministic_per_date_and_normalized_title():
+    assert news_store.selection_id("20240101", "日銀が利上げ") == news_store.selection_id("20240101", "日銀が利上げ")
+    # 標籤、媒體名稱與全半形不同仍是同一則新聞
+    assert (news_store.selection_id("20240101", "【速報】日銀が利上げ（共同通信）")
+            == news_store.selection_id("20240101", "日銀が利上げ"))
+    assert news_store.selection_id("20240102", "日銀が利上げ") != news_store.selection_id("20240101", "日銀が利上げ")
+
+
+def test_build_rows_keeps_the_first_of_duplicate_titles():
+    items = [type("Item", (), {"title": t, "reason": "r", "writing_direction": "w"})()
+             for t in ("日銀が利上げ", "【速報】日銀が利上げ", "首相が会見")]
+    rows = news_store.build_rows("20240101", items)
+    assert [row["title"] for row in rows] == ["日銀が利上げ", "首相が会見"]
+    assert rows[0]["id"] == news_store.selection_id("20240101", "日銀が利上げ")
+
+
+def test_rerun_upserts_without_duplicates():
+    client = FakeSupabase()
+    rows = news_store.build_rows("20240101", [type("Item", (), {"title": "首相が会見", "reason": "r",
+                                                                 "writing_direction": "w"})()])
+    first = bulk_insert(client, rows)
+    second = bulk_insert(client, rows)
+    assert first[0]["ok"] and not first[0]["existed"]
+    assert second[0]["ok"] and second[0]["existed"]
+    assert client.existing == {rows[0]["id"]}
+
+
+def test_insert_mode_reports_rows_missing_from_the_response():
+    client = FakeSupabase(existing={"id0"})
+    statuses = bulk_insert(client, _rows(2), mode="insert")
+    assert [status["ok"] for status in statuses] == [False, True]
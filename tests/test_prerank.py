@@ -0,0 +1,46 @@
+# tests/test_prerank.py
+import numpy as np
+
+from prerank import TOPIC_NAMES, rank_titles
+
+
+def test_empty_list():
+    ranking = rank_titles([])
+    assert ranking.titles == []
+    assert ranking.topic_scores.shape == (0, len(TOPIC_NAMES))
+
+
+def test_titles_without_ngrams_keep_original_order():
+    """所有標題都短於 n-gram 或只有標點時不應拋出例外，主題相似度皆為 0"""
+    for titles in (["A"], ["!!!", "?"], ["a", "日"]):
+        ranking = rank_titles(titles)
+        assert ranking.top(len(titles)) == titles
+        assert not ranking.topic_scores.any()
+
+
+def test_short_title_mixed_with_normal_titles():
+    title = "岸田首相が訪米、日米首脳会談で台湾海峡の平和を確認"
+    ranking = rank_titles(["!", title])
+    assert ranking.top(1) == [title]
+    assert ranking.topic_scores[0].sum() == 0
+
+
+def test_relevant_titles_rank_first():
+    titles = ["大谷翔平が40号本塁打", "北朝鮮がミサイル発射 防衛省発表", "人気アイドルが結婚発表", "日銀が金利据え置き 円安進む"]
+    top = rank_titles(titles).top(2)
+    assert set(top) == {"北朝鮮がミサイル発射 防衛省発表", "日銀が金利据え置き 円安進む"}
+
+
+def test_cluster_size_breaks_ties():
+    titles = ["今日の天気は晴れ", "明日の天気は雨"]
+    ranking = rank_titles(titles, {"明日の天気は雨": 8})
+    assert ranking.top(1) == ["明日の天気は雨"]
+
+
+def test_vector_breakdown():
+    ranking = rank_titles(["台湾外相が来日", "天気"])
+    detail = ranking.vector("台湾外相が来日")
+    assert set(detail) == {"score", "keyword", *TOPIC_NAMES}
+    assert detail["keyword"] > 0
+    assert ranking.vector("存在しない") is None
+    assert np.isclose(ranking.score_map()["台湾外相が来日"], detail["score"], atol=1e-3)
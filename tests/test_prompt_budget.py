@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+
+from prompt_budget import count_tokens, pack_titles, parse_pub_date, score_title
+
+
+def test_estimate_counts_cjk_characters_individually():
+    # 沒有 tiktoken 時的估算：漢字假名一字一 token，其他四字元一 token
+    assert count_tokens("") == 0
+    assert count_tokens("台湾") >= 2
+
+
+def test_keywords_and_cluster_size_raise_the_score():
+    assert score_title("台湾有事で首相が会見") > score_title("芸能ニュース")
+    assert score_title("芸能ニュース", cluster_size=4) > score_title("芸能ニュース")
+
+
+def test_packing_keeps_the_best_titles_within_budget():
+    titles = [f"芸能ニュース{i}" for i in range(50)] + ["台湾海峡で中国軍が演習"]
+    line_cost = count_tokens("- 芸能ニュース10\n")
+    result = pack_titles(titles, budget_tokens=line_cost * 5)
+    assert result.used_tokens <= result.budget
+    assert "台湾海峡で中国軍が演習" in result.titles
+    assert result.dropped == len(titles) - len(result.titles)
+    assert 0 < len(result.titles) <= 6
+
+
+def test_recency_breaks_ties_by_pub_date():
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    titles = ["古い記事", "新しい記事"]
+    published = {"古い記事": now, "新しい記事": now + timedelta(hours=5)}
+    budget = count_tokens("- 新しい記事\n")
+    assert pack_titles(titles, budget_tokens=budget, published_at=published).titles == ["新しい記事"]
+    assert pack_titles(list(reversed(titles)), budget_tokens=budget).titles == ["古い記事"]
+
+
+def test_precomputed_scores_replace_keyword_scoring():
+    titles = ["台湾有事", "芸能ニュース"]
+    budget = count_tokens("- 芸能ニュース\n")
+    assert pack_titles(titles, budget_tokens=budget, scores={"芸能ニュース": 10.0}).titles == ["芸能ニュース"]
+
+
+def test_empty_and_unparseable_input():
+    assert pack_titles([]).titles == []
+    assert parse_pub_date(None) is None
+    assert parse_pub_date("not a date") is None
+    assert parse_pub_date("Mon, 01 Jan 2024 09:00:00 +0900").hour == 9
@@ -0,0 +1,133 @@
+import pytest
+
+import resilience
+from resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceeded, RetryBudget, RetryPolicy,
+                        RetryableStatus, call, clamp_timeout, deadline_scope, is_transient)
+
+NO_WAIT = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    resilience.reset()
+    yield
+    resilience.reset()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+
+    def advance(seconds):
+        now[0] += seconds
+
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return advance
+
+
+def _fail(breaker, times):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=3, reset_timeout=30)
+    _fail(breaker, 2)
+    breaker.before_call()
+    breaker.record_success()
+    _fail(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED
+    _fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_allows_one_probe_and_closes_on_success(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_timeout=30)
+    _fail(breaker, 1)
+    clock(29.9)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock(0.2)
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_for_a_full_timeout(clock):
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_timeout=30)
+    _fail(breaker, 1)
+    clock(31)
+    _fail(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock(29)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, reserve=2)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_call_retries_transient_errors_only():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RetryableStatus(503)
+        return "ok"
+
+    assert call("flaky", flaky, policy=NO_WAIT) == "ok"
+    assert len(attempts) == 3
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    attempts.clear()
+    with pytest.raises(ValueError):
+        call("broken", broken, policy=NO_WAIT)
+    assert len(attempts) == 1
+    # 非暫時性錯誤不代表服務故障，斷路器維持關閉
+    assert resilience.circuit_states()["broken"] == CircuitBreaker.CLOSED
+
+
+def test_call_rejects_while_circuit_is_open():
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise ConnectionError("down")
+
+    for _ in range(5):
+        with pytest.raises(ConnectionError):
+            call("down", down, policy=RetryPolicy(max_attempts=1))
+    assert resilience.circuit_states()["down"] == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        call("down", down)
+    assert len(calls) == 5
+
+
+def test_deadline_stops_calls_and_clamps_timeouts(clock):
+    with deadline_scope(5):
+        assert clamp_timeout((10, 3)) == (5, 3)
+        with deadline_scope(60):
+            assert clamp_timeout(30) == 5
+        clock(6)
+        with pytest.raises(DeadlineExceeded):
+            call("slow", lambda: "never")
+    assert clamp_timeout(30) == 30
+    assert not is_transient(DeadlineExceeded("x"))
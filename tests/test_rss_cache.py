@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+import rss_cache
+from rss_cache import JST, RSSCache, is_closed_day
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可控制的 time.time()，讓最近使用時間有明確的先後"""
+    now = [1_000_000.0]
+
+    def advance(seconds=1.0):
+        now[0] += seconds
+        return now[0]
+
+    monkeypatch.setattr(rss_cache.time, "time", lambda: now[0])
+    return advance
+
+
+def test_closed_day_waits_for_the_grace_period():
+    assert not is_closed_day("20240101", now=datetime(2024, 1, 1, 23, 0, tzinfo=JST))
+    assert not is_closed_day("20240101", now=datetime(2024, 1, 2, 5, 59, tzinfo=JST))
+    assert is_closed_day("20240101", now=datetime(2024, 1, 2, 6, 0, tzinfo=JST))
+    assert is_closed_day("20240101", now=datetime(2024, 1, 2, 0, 0, tzinfo=JST), grace_hours=0)
+
+
+def test_closed_day_is_fresh_forever_and_today_follows_ttl(tmp_path, clock):
+    cache = RSSCache(tmp_path, ttl=600)
+    cache.put("20200101", "<rss/>")
+    clock(10 * 24 * 3600)
+    assert cache.is_fresh("20200101", cache.lookup("20200101"))
+
+    today = datetime.now(JST).strftime("%Y%m%d")
+    cache.put(today, "<rss/>")
+    clock(599)
+    assert cache.is_fresh(today, cache.lookup(today))
+    clock(2)
+    assert not cache.is_fresh(today, cache.lookup(today))
+    cache.touch(today)
+    assert cache.is_fresh(today, cache.lookup(today))
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = RSSCache(tmp_path, max_entries=2)
+    cache.put("20240101", "a")
+    clock()
+    cache.put("20240102", "b")
+    clock()
+    assert cache.read("20240101") == "a"
+    clock()
+    cache.put("20240103", "c")
+    assert cache.lookup("20240102") is None
+    assert cache.read("20240101") == "a"
+    assert cache.read("20240103") == "c"
+    assert sorted(p.name for p in tmp_path.glob("*.xml")) == sorted(
+        f"{cache.lookup(d)['sha256']}.xml" for d in ("20240101", "20240103"))
+
+
+def test_byte_limit_evicts_but_keeps_shared_content(tmp_path, clock):
+    cache = RSSCache(tmp_path, max_bytes=10)
+    cache.put("20240101", "same")
+    clock()
+    cache.put("20240102", "same")
+    clock()
+    cache.put("20240103", "other")
+    # 超過 10 bytes，淘汰最舊的 20240101；內容仍被 20240102 使用，檔案保留
+    assert cache.lookup("20240101") is None
+    assert cache.read("20240102") == "same"
+    assert cache.read("20240103") == "other"
+
+
+def test_index_survives_reopening(tmp_path, clock):
+    RSSCache(tmp_path).put("20240101", "內容", etag='"v1"')
+    reopened = RSSCache(tmp_path)
+    assert reopened.read("20240101") == "內容"
+    assert reopened.conditional_headers(reopened.lookup("20240101")) == {"If-None-Match": '"v1"'}
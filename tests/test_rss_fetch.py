@@ -0,0 +1,58 @@
+import threading
+import time
+
+from resilience import deadline_scope
+from rss_fetch import fetch_rss_many
+
+
+def test_dates_are_fetched_concurrently_and_keep_input_order():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fetch(date_str, session=None, timeout=None):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return f"<rss>{date_str}</rss>"
+
+    dates = ["20240103", "20240101", "20240102"]
+    results, errors = fetch_rss_many(dates, fetch=fetch)
+    assert errors == {}
+    assert list(results) == dates
+    assert results["20240101"] == "<rss>20240101</rss>"
+    assert peak[0] == 3
+
+
+def test_each_date_fails_on_its_own():
+    def fetch(date_str, session=None, timeout=None):
+        if date_str == "20240102":
+            raise ConnectionError("down")
+        return date_str
+
+    results, errors = fetch_rss_many(["20240101", "20240102", "20240103"], fetch=fetch)
+    assert list(results) == ["20240101", "20240103"]
+    assert isinstance(errors["20240102"], ConnectionError)
+
+
+def test_slow_dates_time_out_without_blocking_the_rest():
+    release = threading.Event()
+
+    def fetch(date_str, session=None, timeout=None):
+        if date_str == "20240102":
+            release.wait(5)
+        return date_str
+
+    started = time.perf_counter()
+    with deadline_scope(0.2):
+        results, errors = fetch_rss_many(["20240101", "20240102"], fetch=fetch, deadline=30)
+    release.set()
+    assert time.perf_counter() - started < 2
+    assert list(results) == ["20240101"]
+    assert isinstance(errors["20240102"], TimeoutError)
+
+
+def test_no_dates():
+    assert fetch_rss_many([]) == ({}, {})
@@ -0,0 +1,36 @@
+from rss_parse import RSSItemParser, iter_rss_items, parse_rss_titles
+from title_filter import TitleFilter
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>ニュース</title>
+<item><title> 首相が会見 </title><link>https://example.jp/1</link><pubDate>Mon, 01 Jan 2024 09:00:00 +0900</pubDate></item>
+<item><title>Yahoo Japan トップ</title><link>https://example.jp/2</link></item>
+<item><link>https://example.jp/3</link></item>
+<item><title>日銀が利上げ &amp; 円高</title></item>
+</channel></rss>"""
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = RSSItemParser()
+    data = FEED.encode("utf-8")
+    cut = data.index(b"</item>") + len(b"</item>")
+    first = parser.feed(data[:cut])
+    assert [item["title"] for item in first] == ["首相が会見"]
+    rest = parser.feed(data[cut:]) + parser.close()
+    assert len(rest) == 3
+    assert parser.item_count == 4 and parser.bytes_fed == len(data)
+
+
+def test_any_chunk_boundary_gives_the_same_items():
+    data = FEED.encode("utf-8")
+    expected = list(iter_rss_items([data]))
+    for size in (1, 3, 17, 64):
+        assert list(iter_rss_items(data[i:i + size] for i in range(0, len(data), size))) == expected
+    assert expected[0] == {"title": "首相が会見", "link": "https://example.jp/1",
+                           "pubDate": "Mon, 01 Jan 2024 09:00:00 +0900"}
+
+
+def test_parse_titles_skips_empty_and_filtered_items():
+    rules = TitleFilter([{"name": "yahoo", "type": "substring", "pattern": "Yahoo Japan"}])
+    assert parse_rss_titles(FEED, rules) == ["首相が会見", "日銀が利上げ & 円高"]
+    assert rules.report() == {"yahoo": 1}
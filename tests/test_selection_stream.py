@@ -0,0 +1,150 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import get_metrics
+from selection_stream import IncompleteSelectionError, SelectionScanner, _Collector, stream_selection
+
+
+def _item(i, **overrides):
+    return {"title": f"標題{i}", "reason": f"理由{i}", "writing_direction": f"方向{i}", **overrides}
+
+
+def _feed_all(scanner, chunks):
+    return [item for chunk in chunks for item in scanner.feed(chunk)]
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    scanner = SelectionScanner()
+    text = json.dumps({"selections": [_item(0), _item(1)]}, ensure_ascii=False)
+    cut = text.index("}") + 1
+    assert scanner.feed(text[:cut]) == [_item(0)]
+    assert scanner.feed(text[cut:]) == [_item(1)]
+
+
+def test_any_chunk_boundary_gives_the_same_items():
+    items = [_item(0, reason='含有 "引號"、{大括號} 與 [方括號]'), _item(1, title="反斜線 \\ 結尾\\")]
+    text = json.dumps({"selections": items}, ensure_ascii=False)
+    for size in (1, 2, 3, 7, len(text)):
+        scanner = SelectionScanner()
+        assert _feed_all(scanner, [text[i:i + size] for i in range(0, len(text), size)]) == items
+
+
+def test_truncated_item_is_not_emitted():
+    scanner = SelectionScanner()
+    text = json.dumps({"selections": [_item(0), _item(1)]}, ensure_ascii=False)
+    assert _feed_all(scanner, [text[:-20]]) == [_item(0)]
+    assert scanner.malformed == 0
+
+
+def test_only_the_first_array_is_scanned():
+    scanner = SelectionScanner()
+    text = json.dumps({"articles": [_item(0)], "extra": [_item(1)]}, ensure_ascii=False)
+    assert scanner.feed(text) == [_item(0)]
+
+
+def test_malformed_item_is_counted_and_skipped():
+    scanner = SelectionScanner()
+    text = '{"selections": [{"title": "a", "reason": }, ' + json.dumps(_item(1), ensure_ascii=False) + "]}"
+    assert scanner.feed(text) == [_item(1)]
+    assert scanner.malformed == 1
+
+
+def test_collector_skips_duplicates_invalid_items_and_extras():
+    seen = []
+    collector = _Collector(expected=2, on_item=seen.append, started=time.perf_counter())
+    assert collector.add(_item(0))
+    # 正規化後相同（全形、空白、相似報導標記）視為重複
+    assert not collector.add(_item(0, title="標題０ ［相似報導 3 則］"))
+    assert not collector.add(_item(1, reason="  "))
+    assert not collector.add({"title": "只有標題"})
+    assert not collector.add("不是物件")
+    assert collector.missing == 1
+    assert collector.add(_item(2, title="標題2［相似報導 2 則］"))
+    assert not collector.add(_item(3))
+    assert [item.title for item in collector.items] == ["標題0", "標題2"]
+    assert [item.title for item in seen] == ["標題0", "標題2"]
+    assert collector.missing == 0
+
+
+class ScriptedClient:
+    """依序回傳預先準備的回應內容；串流請求逐字產出"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, stream=False, **kwargs):
+        self.requests.append({"stream": stream, "messages": messages})
+        content = self.replies.pop(0)
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+        return iter([SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=c))])
+                     for c in content])
+
+
+def _reply(items):
+    return json.dumps({"selections": items}, ensure_ascii=False)
+
+
+TITLES = [f"標題{i}" for i in range(10)]
+MESSAGES = [{"role": "user", "content": "選稿"}]
+
+
+def test_titles_outside_the_prompt_are_rejected():
+    collector = _Collector(expected=2, on_item=None, started=time.perf_counter(), titles=TITLES)
+    assert not collector.add(_item(0, title="編造的標題"))
+    assert collector.add(_item(1, title="標題1［相似報導 2 則］"))
+    assert collector.missing == 1
+
+
+def test_short_stream_is_completed_by_the_follow_up():
+    client = ScriptedClient(_reply([_item(0), _item(1, title="編造"), _item(2)]), _reply([_item(3), _item(4), _item(5)]))
+    seen = []
+    result = stream_selection(client, MESSAGES, TITLES, on_item=seen.append, cache=None)
+    assert [item.title for item in result.selections] == ["標題0", "標題2", "標題3", "標題4", "標題5"]
+    assert [item.title for item in seen] == ["標題0", "標題2", "標題3", "標題4", "標題5"]
+    assert [request["stream"] for request in client.requests] == [True, False]
+
+
+def test_still_short_after_follow_up_falls_back_to_a_full_selection():
+    metrics = get_metrics()
+    metrics.reset()
+    client = ScriptedClient(_reply([_item(0)]), _reply([_item(0), _item(8, title="編造")]),
+                            _reply([_item(i) for i in (0, 5, 6, 7, 9)]))
+    seen = []
+    result = stream_selection(client, MESSAGES, TITLES, on_item=seen.append, cache=None)
+    # 已交給 on_item 的項目保留在前面
+    assert [item.title for item in result.selections] == ["標題0", "標題5", "標題6", "標題7", "標題9"]
+    assert [item.title for item in seen] == [item.title for item in result.selections]
+    assert client.requests[-1] == {"stream": False, "messages": MESSAGES}
+    assert metrics.counters["llm_stream_fallbacks"] == 1
+
+
+def test_raises_when_no_path_gives_enough_items():
+    client = ScriptedClient(_reply([_item(0)]), _reply([_item(1)]), _reply([_item(1), _item(2, title="編造")]))
+    with pytest.raises(IncompleteSelectionError):
+        stream_selection(client, MESSAGES, TITLES, cache=None)
+
+
+class DictCache:
+    def __init__(self, content=None):
+        self.content = content
+        self.stored = None
+
+    def get(self, key):
+        return self.content
+
+    def put(self, key, content, model):
+        self.stored = content
+
+
+def test_short_cached_result_is_not_used():
+    cache = DictCache(_reply([_item(0), _item(1, title="編造")]))
+    client = ScriptedClient(_reply([_item(i) for i in range(5)]))
+    result = stream_selection(client, MESSAGES, TITLES, cache=cache)
+    assert len(result.selections) == 5 and len(client.requests) == 1
+    assert [item["title"] for item in json.loads(cache.stored)["selections"]] == TITLES[:5]
@@ -0,0 +1,63 @@
+import pytest
+
+from title_dedupe import cluster_titles, format_title_line, normalize_title, normalize_titles, strip_cluster_marker
+
+TRICKY_TITLES = [
+    "【速報】岸田首相が会見（共同通信）",
+    "［独自］防衛費増額へ - 日本経済新聞",
+    "ＡＢＣ　全角英数と全角スペース ｜ NHK",
+    "  前後の空白  ",
+    "改行を\n含む\r\nタイトル",
+    "【】空のタグ",
+    "【長すぎるタグは残る見出しです】本文",
+    "(株)トヨタが増産 (ロイター)",
+    "末尾だけ - ",
+    "途中-ハイフン-のある見出し",
+    "絵文字🗾と_下線_",
+    "",
+    "   ",
+    "①丸数字とｶﾀｶﾅ",
+    "Ｕ．Ｓ．とＥＵ―協議",
+    "行区切り\u2028文字\x85入り",
+    "タブ\tと\u3000全角空白（時事）",
+    "（）",
+    "【速報】",
+]
+
+
+@pytest.mark.parametrize("title", TRICKY_TITLES)
+def test_batch_normalization_matches_single(title):
+    assert normalize_titles([title]) == [normalize_title(title)]
+
+
+def test_batch_normalization_matches_single_for_the_whole_list():
+    assert normalize_titles(TRICKY_TITLES) == [normalize_title(title) for title in TRICKY_TITLES]
+    assert normalize_titles([]) == []
+
+
+def test_cluster_merges_same_story_from_different_outlets():
+    clusters = cluster_titles(["【速報】岸田首相が衆院解散を表明（共同通信）", "岸田首相が衆院解散を表明 - 日本経済新聞",
+                               "日銀が利上げを決定"])
+    assert [cluster.size for cluster in clusters] == [2, 1]
+
+
+def test_clusters_keep_first_seen_order_and_exact_duplicates_collapse():
+    titles = ["日銀が利上げを決定", "岸田首相が衆院解散を表明", "日銀が利上げを決定", "【速報】日銀が利上げを決定（時事）",
+              "岸田首相が衆院解散を表明へ"]
+    clusters = cluster_titles(titles)
+    assert [cluster.representative for cluster in clusters] == ["日銀が利上げを決定", "岸田首相が衆院解散を表明"]
+    assert clusters[0].members == ["日銀が利上げを決定", "【速報】日銀が利上げを決定（時事）"]
+    assert clusters[1].size == 2
+
+
+def test_unrelated_titles_stay_apart():
+    titles = [f"{topic}について{i}" for i, topic in enumerate(["防衛費", "半導体", "円相場", "少子化", "観光"])]
+    assert [cluster.size for cluster in cluster_titles(titles)] == [1] * 5
+    assert cluster_titles([]) == []
+
+
+def test_cluster_marker_round_trip():
+    line = format_title_line("日銀が利上げを決定", 3)
+    assert line == "- 日銀が利上げを決定 ［相似報導 3 則］"
+    assert format_title_line("単独の記事", 1) == "- 単独の記事"
+    assert strip_cluster_marker(line[2:]) == "日銀が利上げを決定"
@@ -0,0 +1,64 @@
+import pytest
+
+import gpt
+import title_filter
+from title_filter import TitleFilter
+
+
+def test_substring_and_regex_rules_are_attributed():
+    rules = TitleFilter([
+        {"name": "yahoo", "type": "substring", "pattern": "Yahoo Japan"},
+        {"name": "quake", "type": "category", "substrings": ["地震情報", "震度速報"], "regexes": [r"震度\d"]},
+        {"name": "weather", "type": "regex", "pattern": r"(天気|気象)予報"},
+    ])
+    assert rules.match("Yahoo Japanニュース") == "yahoo"
+    assert rules.match("震度速報 関東") == "quake"
+    assert rules.match("東京で震度3") == "quake"
+    assert rules.match("明日の天気予報") == "weather"
+    assert rules.match("首相が会見") is None
+
+
+def test_capture_groups_and_inline_flags_keep_attribution():
+    rules = TitleFilter([
+        {"name": "first", "type": "regex", "pattern": r"(?P<kind>PR|広告)記事"},
+        {"name": "second", "type": "regex", "pattern": r"(?i)sponsored(content)?"},
+        {"name": "third", "type": "regex", "pattern": r"(?is)live.(配信)"},
+    ])
+    assert rules.match("PR記事です") == "first"
+    assert rules.match("SPONSORED Content") == "second"
+    assert rules.match("Live\n配信中") == "third"
+    # 旗標只作用於宣告的規則
+    assert TitleFilter([{"name": "a", "type": "regex", "pattern": "abc"},
+                        {"name": "b", "type": "regex", "pattern": "(?i)xyz"}]).match("ABC") is None
+
+
+@pytest.mark.parametrize("pattern", [
+    r"(",                      # 無效樣式
+    r"(ab)\1",                 # 編號反向參照
+    r"(?P<_literal>x)",        # 內部保留名稱
+    r"(?P<_rule0>x)",
+])
+def test_unsafe_regex_rules_are_rejected_on_load(pattern):
+    with pytest.raises(ValueError):
+        TitleFilter([{"name": "bad", "type": "regex", "pattern": pattern}])
+
+
+def test_escaped_backslash_before_digit_is_not_a_backreference():
+    rules = TitleFilter([{"name": "path", "type": "regex", "pattern": r"(a)\\1"}])
+    assert rules.match("a\\1") == "path"
+
+
+def test_stats_are_reset_at_the_start_of_each_run(monkeypatch):
+    rules = TitleFilter(title_filter.BUILTIN_RULES)
+    monkeypatch.setattr(gpt, "get_title_filter", lambda: rules)
+    monkeypatch.setattr(gpt, "get_target_dates", lambda: ["20240101"])
+
+    def fetch_feeds_many(dates):
+        # 每次執行排除一則標題，沒有剩下的標題時在選稿前結束
+        rules.filter(["Yahoo Japan トップ"])
+        return {"20240101": []}, {}
+
+    monkeypatch.setattr(gpt, "fetch_feeds_many", fetch_feeds_many)
+    gpt._run(gpt.get_metrics())
+    gpt._run(gpt.get_metrics())
+    assert rules.report() == {"yahoo_japan": 1}
@@ -0,0 +1,67 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import get_metrics
+from resilience import deadline_scope, remaining
+from tournament import tournament_select
+
+
+class FakeClient:
+    """每組回傳前兩則標題，並記錄呼叫時看到的剩餘時間"""
+
+    def __init__(self):
+        self.remaining = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        with self._lock:
+            self.remaining.append(remaining())
+        titles = [line[2:] for line in messages[-1]["content"].split("新聞標題：\n", 1)[1].splitlines()]
+        content = json.dumps({"shortlist": titles[:2]}, ensure_ascii=False)
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_shard_workers_inherit_the_callers_deadline():
+    titles = [f"標題{i}" for i in range(12)]
+    client = FakeClient()
+    with deadline_scope(30):
+        finalists = tournament_select(titles, client, reduce_fn=list, shard_size=6, shortlist_size=2)
+    assert len(client.remaining) == 2
+    assert all(left is not None and 0 < left <= 30 for left in client.remaining)
+    assert finalists == ["標題0", "標題2", "標題1", "標題3"]
+
+
+class FailingClient(FakeClient):
+    """含有 fail_marker 的分組回傳無效的候選清單"""
+
+    def __init__(self, fail_marker):
+        super().__init__()
+        self.fail_marker = fail_marker
+
+    def create(self, messages, **kwargs):
+        if self.fail_marker in messages[-1]["content"]:
+            message = SimpleNamespace(content=json.dumps({"shortlist": ["不在分組中"]}, ensure_ascii=False))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+        return super().create(messages, **kwargs)
+
+
+def test_failed_shard_falls_back_to_the_prerank_order():
+    metrics = get_metrics()
+    metrics.reset()
+    # 第二組（奇數）含有最相關的標題，但排在組內最後
+    titles = [f"芸能ニュース{i}" for i in range(11)] + ["防衛相が台湾有事の対応を説明"]
+    finalists = tournament_select(titles, FailingClient("防衛相"), reduce_fn=list,
+                                  shard_size=6, shortlist_size=2)
+    assert "防衛相が台湾有事の対応を説明" in finalists
+    assert metrics.counters["tournament_shard_fallbacks"] == 1
+
+
+def test_too_many_failed_shards_abort_the_tournament():
+    titles = [f"標題{i}" for i in range(12)]
+    with pytest.raises(RuntimeError):
+        tournament_select(titles, FailingClient("標題"), reduce_fn=list, shard_size=6, shortlist_size=2)
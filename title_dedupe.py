@@ -0,0 +1,162 @@
+# title_dedupe.py
+"""
+相似標題分群
+不同媒體對同一事件的標題常只差幾個字，完全比對去重無法合併。
+這裡以字元 n-gram（適合不分詞的日文）計算 MinHash，再用 LSH 分桶找出候選，
+只對候選計算實際 Jaccard 相似度，標題數量上萬時也不需要兩兩比較。
+"""
+
+import hashlib
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+NGRAM = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.5
+# 每則標題最多與幾個候選比對，避免大量相同樣板的標題造成平方級比較
+MAX_CANDIDATES = 50
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240701)
+_PERM_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.int64)
+_PERM_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.int64)
+
+# 標題開頭的【速報】等標籤、結尾的（共同通信）或「 - 媒體名」
+_TAG_RE = re.compile(r"^[【\[][^】\]]{1,10}[】\]]")
+_SOURCE_RE = re.compile(r"(?:[（(][^（）()]{1,15}[）)]|\s[-－|｜]\s?[^-－|｜]{1,20})$")
+_PUNCT_RE = re.compile(r"[\s\W_]+")
+# normalize_titles 一次處理以換行分隔的多則標題：同樣的樣式改為逐行比對，且不跨越換行
+_TAG_LINE_RE = re.compile(r"^[【\[][^】\]\n]{1,10}[】\]]", re.M)
+_SOURCE_LINE_RE = re.compile(r"(?:[（(][^（）()\n]{1,15}[）)]|[^\S\n][-－|｜][^\S\n]?[^-－|｜\n]{1,20})$", re.M)
+_PUNCT_LINE_RE = re.compile(r"(?:[^\w\n]|_)+")
+
+CLUSTER_MARKER = "［相似報導 {size} 則］"
+_CLUSTER_MARKER_RE = re.compile(r"\s*［相似報導 \d+ 則］\s*")
+
+
+class TitleCluster(NamedTuple):
+    representative: str
+    members: List[str]
+
+    @property
+    def size(self) -> int:
+        return len(self.members)
+
+
+def normalize_title(title: str) -> str:
+    """統一全半形、去除標籤、媒體名稱與標點"""
+    text = unicodedata.normalize("NFKC", title).strip()
+    text = _TAG_RE.sub("", text)
+    text = _SOURCE_RE.sub("", text)
+    return _PUNCT_RE.sub("", text).lower()
+
+
+def normalize_titles(titles: List[str]) -> List[str]:
+    """與逐則呼叫 normalize_title 的結果相同，但整批只呼叫一次 NFKC 與各正規表示式"""
+    if not titles:
+        return []
+    text = unicodedata.normalize("NFKC", "\n".join(title.replace("\n", " ") for title in titles))
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    text = _TAG_LINE_RE.sub("", text)
+    text = _SOURCE_LINE_RE.sub("", text)
+    return _PUNCT_LINE_RE.sub("", text).lower().split("\n")
+
+
+def title_hash(title: str) -> str:
+    """正規化後標題的雜湊（同一則新聞換了標籤或媒體名稱仍視為相同）"""
+    return hashlib.sha256(normalize_title(title).encode("utf-8")).hexdigest()[:32]
+
+
+def shingles(text: str, n: int = NGRAM) -> Set[str]:
+    """字元 n-gram 集合"""
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def _minhash(grams: Set[str]) -> np.ndarray:
+    hashes = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.int64, count=len(grams))
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def cluster_titles(titles: List[str], threshold: float = DEFAULT_THRESHOLD) -> List[TitleCluster]:
+    """
+    將相似標題分群，依第一次出現的順序回傳；每群以最早出現的標題為代表。
+    """
+    parent: List[int] = []
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    unique_titles: List[str] = []
+    gram_sets: List[Set[str]] = []
+    seen_normalized: Dict[str, int] = {}
+    members_of: Dict[int, List[str]] = {}
+    buckets: Dict[tuple, List[int]] = {}
+
+    for title in titles:
+        normalized = normalize_title(title)
+        # 正規化後完全相同，直接併入
+        if normalized in seen_normalized:
+            idx = seen_normalized[normalized]
+            if title not in members_of[idx]:
+                members_of[idx].append(title)
+            continue
+
+        idx = len(unique_titles)
+        seen_normalized[normalized] = idx
+        unique_titles.append(title)
+        members_of[idx] = [title]
+        parent.append(idx)
+        grams = shingles(normalized)
+        gram_sets.append(grams)
+
+        signature = _minhash(grams)
+        candidates: Dict[int, None] = {}
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS:(band + 1) * ROWS].tobytes())
+            bucket = buckets.setdefault(key, [])
+            # 同桶內最近出現的標題優先
+            for other in reversed(bucket):
+                if len(candidates) >= MAX_CANDIDATES:
+                    break
+                candidates[other] = None
+            bucket.append(idx)
+
+        for other in candidates:
+            if find(other) == find(idx):
+                continue
+            if _jaccard(grams, gram_sets[other]) >= threshold:
+                root_a, root_b = find(other), find(idx)
+                # 以較早出現的標題為根
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters: Dict[int, List[str]] = {}
+    for idx in range(len(unique_titles)):
+        clusters.setdefault(find(idx), []).extend(members_of[idx])
+    return [TitleCluster(unique_titles[root], members) for root, members in sorted(clusters.items())]
+
+
+def format_title_line(title: str, cluster_size: Optional[int] = None) -> str:
+    """提示詞中的一行標題；多家報導的事件加上相似報導數量"""
+    if cluster_size and cluster_size > 1:
+        return f"- {title} {CLUSTER_MARKER.format(size=cluster_size)}"
+    return f"- {title}"
+
+
+def strip_cluster_marker(title: str) -> str:
+    """移除模型回傳標題中誤帶的相似報導標記"""
+    return _CLUSTER_MARKER_RE.sub("", title).strip()
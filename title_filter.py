@@ -0,0 +1,178 @@
+# title_filter.py
+"""
+新聞標題排除規則
+支援「子字串」、「正規表示式」與「分類」三種規則，全部編譯成單一正規表示式：
+子字串先組成字典樹 (trie) 形式的樣式，比對成本不隨規則數量線性成長。
+正規表示式規則在載入時逐條驗證，各自包在具名群組中，開頭的全域旗標（如 (?i)）改為只作用於該規則；
+無法安全組合的規則（無效樣式、編號反向參照、與內部群組同名）在載入時就以 ValueError 拒絕。
+同時記錄每條規則排除了幾則標題。
+"""
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parent / "title_filters.json"
+
+# 找不到規則檔時使用
+BUILTIN_RULES = [
+    {"name": "yahoo_japan", "type": "substring", "pattern": "Yahoo Japan"},
+    {"name": "earthquake_info", "type": "substring", "pattern": "地震情報"},
+]
+
+_LITERAL_GROUP = "_literal"
+# 正規表示式規則的群組名稱前綴（使用者樣式中的群組名稱不可以此開頭）
+_REGEX_GROUP_PREFIX = "_rule"
+# 樣式開頭的全域旗標，例如 (?i) 或 (?is)
+_GLOBAL_FLAGS_RE = re.compile(r"\(\?([aiLmsux]+)\)")
+# 以編號參照的反向參照（\1 ~ \99）；組合後群組編號會改變
+_NUMERIC_BACKREF_RE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]")
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """把大量子字串組成字典樹樣式，例如 ab、ac → a(?:b|c)"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        if "" in node and len(node) == 1:
+            return ""
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # 較短的字串也是完整規則時，後段改為可選
+        if "" in node:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+def _rule_pattern(name: str, pattern: str) -> str:
+    """驗證單一正規表示式規則，轉成可嵌入組合樣式的非捕獲群組"""
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"規則 {name} 的正規表示式無效：{e}") from e
+    if compiled.groups and _NUMERIC_BACKREF_RE.search(pattern):
+        raise ValueError(f"規則 {name} 使用編號反向參照，組合後編號會改變，請改用 (?P<名稱>...) 與 (?P=名稱)")
+    reserved = [group for group in compiled.groupindex
+                if group == _LITERAL_GROUP or group.startswith(_REGEX_GROUP_PREFIX)]
+    if reserved:
+        raise ValueError(f"規則 {name} 的群組名稱 {reserved} 為內部保留名稱")
+    # 組合後全域旗標不在樣式開頭會無法編譯，改為只作用於這條規則的 (?i:...)
+    flags = ""
+    while True:
+        m = _GLOBAL_FLAGS_RE.match(pattern)
+        if m is None:
+            break
+        flags += m.group(1)
+        pattern = pattern[m.end():]
+    return f"(?{flags}:{pattern})"
+
+
+class TitleFilter:
+    """編譯後的標題排除規則"""
+
+    def __init__(self, rules: List[dict]):
+        self.rules = rules
+        self._literal_rules: Dict[str, str] = {}
+        self._regex_rules: Dict[str, str] = {}
+        regex_parts = []
+
+        for rule in rules:
+            name = rule["name"]
+            rule_type = rule.get("type", "substring")
+            if rule_type == "substring":
+                substrings, regexes = [rule["pattern"]], []
+            elif rule_type == "regex":
+                substrings, regexes = [], [rule["pattern"]]
+            elif rule_type == "category":
+                substrings, regexes = rule.get("substrings", []), rule.get("regexes", [])
+            else:
+                raise ValueError(f"未知的規則類型：{rule_type}")
+
+            for substring in substrings:
+                # 同一字串出現在多條規則時，以先定義者為準
+                self._literal_rules.setdefault(substring, name)
+            for pattern in regexes:
+                group = f"{_REGEX_GROUP_PREFIX}{len(self._regex_rules)}"
+                regex_parts.append(f"(?P<{group}>{_rule_pattern(name, pattern)})")
+                self._regex_rules[group] = name
+
+        parts = []
+        if self._literal_rules:
+            parts.append(f"(?P<{_LITERAL_GROUP}>{_trie_pattern(self._literal_rules)})")
+        parts.extend(regex_parts)
+        try:
+            self._pattern = re.compile("|".join(parts)) if parts else None
+        except re.error as e:
+            # 例如兩條規則使用相同的群組名稱
+            raise ValueError(f"排除規則無法組合：{e}") from e
+
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path) -> "TitleFilter":
+        """從 JSON 規則檔建立"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f)["rules"])
+
+    def match(self, title: str) -> Optional[str]:
+        """回傳命中的規則名稱，未命中回傳 None（不計入統計）"""
+        if self._pattern is None:
+            return None
+        m = self._pattern.search(title)
+        if m is None:
+            return None
+        # 規則內的捕獲群組會改變 lastgroup，改為找出實際命中的規則群組
+        groups = m.groupdict()
+        if groups.get(_LITERAL_GROUP) is not None:
+            return self._literal_rules[groups[_LITERAL_GROUP]]
+        return next(name for group, name in self._regex_rules.items() if groups[group] is not None)
+
+    def allows(self, title: str) -> bool:
+        """標題是否保留；被排除時記錄命中的規則"""
+        rule_name = self.match(title)
+        if rule_name is None:
+            return True
+        with self._lock:
+            self.stats[rule_name] += 1
+        return False
+
+    def filter(self, titles: Iterable[str]) -> List[str]:
+        return [title for title in titles if self.allows(title)]
+
+    def report(self) -> Dict[str, int]:
+        """各規則排除的標題數量"""
+        with self._lock:
+            return dict(self.stats.most_common())
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats.clear()
+
+
+_default_filter = None
+_default_filter_lock = threading.Lock()
+
+
+def get_title_filter() -> TitleFilter:
+    """取得預設規則（TITLE_FILTER_RULES 指定的檔案 → title_filters.json → 內建規則）"""
+    global _default_filter
+    with _default_filter_lock:
+        if _default_filter is None:
+            path = Path(os.environ.get("TITLE_FILTER_RULES", DEFAULT_RULES_PATH))
+            if path.exists():
+                _default_filter = TitleFilter.from_file(path)
+            else:
+                _default_filter = TitleFilter(BUILTIN_RULES)
+    return _default_filter
@@ -0,0 +1,134 @@
+# tournament.py
+"""
+大量標題的淘汰賽選稿
+標題太多、一次呼叫放不下時，先把標題分成多個分組，平行請 GPT 從每組挑出候選，
+候選仍太多就再進行下一輪，最後由 reduce_fn（通常是 call_gpt_format_selection）選出 5 則。
+每一輪分組的呼叫都經過 LLM 回應快取，重新執行時不會重複呼叫。
+單組失敗時以本地預排序（prerank）的前幾名遞補並記錄 tournament_shard_fallbacks 指標；
+同一輪失敗的分組超過 MAX_FAILED_SHARD_RATIO 時結果已不可信，直接中止。
+"""
+
+import contextvars
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from llm_cache import cached_chat_completion
+from metrics import get_metrics
+from prerank import rank_titles
+from title_dedupe import format_title_line, strip_cluster_marker
+
+DEFAULT_SHARD_SIZE = 150
+DEFAULT_SHORTLIST_SIZE = 10
+DEFAULT_MAX_CONCURRENCY = 4
+MODEL = "gpt-4o-mini"
+# 同一輪失敗（改用預排序遞補）的分組比例超過此值時中止
+MAX_FAILED_SHARD_RATIO = float(os.environ.get("TOURNAMENT_MAX_FAILED_RATIO", "0.5"))
+
+SHORTLIST_PROMPT = """
+你是台灣的國際新聞編輯，以下是日本新聞標題的其中一部分。
+請從中選出最值得向台灣讀者報導的 {k} 則，優先考慮：
+1. 有助台灣理解日本政治、外交、經濟、文化
+2. 能作為對中政策或區域安全參考
+
+只回傳 JSON：{{"shortlist": ["標題1", "標題2", ...]}}
+標題必須與下列原文完全相同，不要加上「相似報導」標記。
+"""
+
+
+def _shard(titles: List[str], shard_size: int) -> List[List[str]]:
+    """輪流分配到各組，讓每組都混有前段與後段的標題"""
+    shard_count = max(1, -(-len(titles) // shard_size))
+    return [titles[i::shard_count] for i in range(shard_count)]
+
+
+def _parse_shortlist(content: str, shard: List[str], shortlist_size: int) -> List[str]:
+    """只保留確實出現在該組的標題；一則都沒有時視為無效回應"""
+    data = json.loads(content)
+    picked = data.get("shortlist", []) if isinstance(data, dict) else []
+
+    in_shard = set(shard)
+    shortlist = []
+    for title in picked:
+        title = strip_cluster_marker(str(title))
+        if title in in_shard and title not in shortlist:
+            shortlist.append(title)
+    if not shortlist:
+        raise ValueError("候選清單中沒有任何有效標題")
+    return shortlist[:shortlist_size]
+
+
+def shortlist_shard(shard: List[str], client, shortlist_size: int = DEFAULT_SHORTLIST_SIZE,
+                    cluster_sizes: Optional[Dict[str, int]] = None, model: str = MODEL) -> List[str]:
+    """請 GPT 從一組標題中挑出候選"""
+    cluster_sizes = cluster_sizes or {}
+    messages = [
+        {"role": "system", "content": "你是專業的新聞編輯。請嚴格按照JSON格式回傳結果。"},
+        {
+            "role": "user",
+            "content": SHORTLIST_PROMPT.format(k=shortlist_size) + "\n新聞標題：\n"
+            + "\n".join(format_title_line(title, cluster_sizes.get(title)) for title in shard),
+        },
+    ]
+    content = cached_chat_completion(
+        client,
+        model=model,
+        messages=messages,
+        response_format={"type": "json_object"},
+        temperature=0.3,
+        titles=shard,
+        validate=lambda c: _parse_shortlist(c, shard, shortlist_size),
+    )
+    return _parse_shortlist(content, shard, shortlist_size)
+
+
+def tournament_select(
+    titles: List[str],
+    client,
+    reduce_fn: Callable[[List[str]], object],
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    shortlist_size: int = DEFAULT_SHORTLIST_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    cluster_sizes: Optional[Dict[str, int]] = None,
+    model: str = MODEL,
+    max_failed_ratio: float = MAX_FAILED_SHARD_RATIO,
+):
+    """逐輪淘汰直到候選數量放得進一次呼叫，再交給 reduce_fn 選出最終結果"""
+    metrics = get_metrics()
+    candidates = list(titles)
+    round_no = 0
+
+    while len(candidates) > shard_size:
+        round_no += 1
+        shards = _shard(candidates, shard_size)
+        print(f"🏆 第 {round_no} 輪：{len(candidates)} 則標題分成 {len(shards)} 組，每組選出 {shortlist_size} 則")
+
+        def run(shard: List[str]) -> Tuple[List[str], bool]:
+            try:
+                return shortlist_shard(shard, client, shortlist_size, cluster_sizes, model), False
+            except Exception as e:
+                # 單組失敗不中斷整場，改用本地預排序的前幾名遞補
+                print(f"   ⚠️ 分組選稿失敗，以預排序前 {shortlist_size} 則遞補：{e}")
+                return rank_titles(shard, cluster_sizes).top(shortlist_size), True
+
+        # 工作執行緒沿用呼叫端的 contextvars，截止時間才會傳到每個分組的請求
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, run, shard) for shard in shards]
+            results = [future.result() for future in futures]
+
+        shortlists = [shortlist for shortlist, _ in results]
+        failed = sum(1 for _, fallback in results if fallback)
+        if failed:
+            metrics.incr("tournament_shard_fallbacks", failed)
+            if failed / len(shards) > max_failed_ratio:
+                raise RuntimeError(f"第 {round_no} 輪 {len(shards)} 組中有 {failed} 組選稿失敗，中止淘汰賽")
+
+        next_candidates = list(dict.fromkeys(t for shortlist in shortlists for t in shortlist))
+        if len(next_candidates) >= len(candidates):
+            # 沒有縮減（例如每組都很小），避免無窮迴圈
+            break
+        candidates = next_candidates
+
+    print(f"🏁 決賽：{len(candidates)} 則候選")
+    return reduce_fn(candidates)